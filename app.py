@@ -3,33 +3,54 @@ Tech & Ethics Club — main Flask application.
 
 Sections worth knowing:
   • Gallery / projects: routes under /gallery, admin upload at /admin/gallery/add,
-    data in Google Cloud Storage via cloud_storage (see cloud_storage.py).
+    data in Google Cloud Storage via cloud_storage (see cloud_storage.py). Listings
+    are cursor-paginated from the gallery index; /gallery/page feeds infinite scroll.
+    The add form PUTs images straight to the bucket (/admin/uploads/sessions hands out
+    resumable upload URLs; set_bucket_cors.py allows the origin) and a process_uploads
+    job optimizes them into uploads/ after the item is saved.
   • GalleryItem (below): view-model dict → attributes for templates.
-  • PDF: GalleryPDFGenerator for single-item and full-gallery exports.
-  • Video thumbnails: VideoThumbnailExtractor when saving gallery items with video URLs.
+  • PDF: GalleryPDFGenerator for single-item and full-gallery exports, built by a
+    background job (job_runner.py) and cached under exports/ until the item/gallery changes.
+  • Video thumbnails: VideoThumbnailExtractor, run as a background job after a gallery
+    item with video URLs is saved; pages show a "processing" placeholder meanwhile.
   • Blog: separate blog_storage module; routes under /blog.
   • CIS news: cis_news_storage (GCS cis_news.json); any logged-in user may post;
     delete own posts or any if admin / CIS_NEWS_EDITOR_EMAILS.
 
-Config: SECRET_KEY, STORAGE_BUCKET, optional GAE_ENV. Local GCS often uses
+Config: SECRET_KEY, STORAGE_BUCKET, optional GAE_ENV, optional METRICS_TOKEN for /metrics,
+optional MEMORY_TRACKING / MEMORY_TRACKED_ENDPOINTS / MEMORY_LOG_THRESHOLD_MB (memory_tracking.py),
+GMAIL_APP_PASSWORD / SMTP_HOST / SMTP_PORT for contact mail (mail_queue.py). Local GCS often uses
 tech-ethics-club-sa-key.json (see CloudStorageManager).
 """
 
-from flask import Flask, render_template, request, flash, redirect, url_for, send_from_directory, jsonify
+from flask import Flask, render_template, request, flash, redirect, url_for, send_from_directory, jsonify, g
+from flask import before_render_template, template_rendered
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from google.api_core.exceptions import PreconditionFailed
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug.utils import secure_filename
 import os
+import io
+import hmac
+import json
 import logging
+import time
 from datetime import datetime
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from cloud_storage import cloud_storage
+from cloud_storage import INCOMING_PREFIX, cloud_storage
 from cloud_user import CloudUser
 from image_optimizer import ImageOptimizer
-from blog_storage import blog_storage
+from blog_storage import BLOG_PAGE_SIZE, blog_storage
+from blog_search import SEARCH_FIELD_WEIGHTS
 from cis_news_storage import cis_news_storage
+from storage_backend import gcs_pool_stats
 from video_thumbnail_extractor import VideoThumbnailExtractor
 from pdf_generator import GalleryPDFGenerator
+import memory_tracking
+from job_runner import JobQueueFull, JobRunner, register_metrics as register_job_metrics
+from mail_queue import MailQueue, register_metrics as register_mail_queue_metrics
+import metrics
+import request_profiler
+import storage_metrics
 
 
 app = Flask(__name__)
@@ -83,11 +104,24 @@ def is_admin_email(email):
 
 
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
-app.config['MAX_CONTENT_LENGTH'] = 15 * 1024 * 1024  # 15MB, matches client-side validation
+app.config['MAX_CONTENT_LENGTH'] = 15 * 1024 * 1024  # 15MB, matches client-side validation; direct uploads bypass it
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_PATH'] = None
 
 
+REQUEST_SECONDS = metrics.Histogram('http_request_seconds', 'Request latency by Flask endpoint.',
+                                    ('endpoint', 'method'))
+REQUESTS = metrics.Counter('http_requests_total', 'Requests by Flask endpoint and status code.',
+                           ('endpoint', 'method', 'status'))
+REQUEST_STORAGE_CALLS = metrics.Histogram('http_request_storage_calls', 'Storage operations made per request.',
+                                          ('endpoint',), buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 5000))
+IN_FLIGHT = metrics.Gauge('http_requests_in_flight', 'Requests currently being served.')
+
+
+GALLERY_PAGE_SIZE = 24
+GALLERY_MAX_PAGE_SIZE = 100
+
+
 image_optimizer = ImageOptimizer()
 
 
@@ -97,6 +131,216 @@ video_thumbnail_extractor = VideoThumbnailExtractor()
 pdf_generator = GalleryPDFGenerator()
 
 
+CONTACT_SENDER_EMAIL = "techandethicsclub@gmail.com"
+CONTACT_RECIPIENT_EMAIL = "techandethicsclub@gmail.com"
+# Contact form mail waits in the bucket under mail_queue/ until the sender thread delivers it.
+contact_mail_queue = MailQueue(cloud_storage.backend, CONTACT_SENDER_EMAIL, os.environ.get('GMAIL_APP_PASSWORD'))
+register_mail_queue_metrics(contact_mail_queue)
+
+
+# Slow media work (video thumbnails, PDF exports, blob cleanup) runs here, off the request.
+job_runner = JobRunner(cloud_storage.backend)
+register_job_metrics(job_runner)
+PDF_EXPORT_PREFIX = 'exports/'
+
+
+# The gallery form sends originals straight to the bucket and posts back signed tokens
+# naming the incoming/ objects; a process_uploads job optimizes them into uploads/.
+DIRECT_UPLOAD_MAX_BYTES = 15 * 1024 * 1024  # same per-file limit the form has always had
+DIRECT_UPLOAD_MAX_FILES = 40
+DIRECT_UPLOAD_TOKEN_MAX_AGE = 6 * 60 * 60
+direct_upload_signer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='direct-upload')
+
+
+@app.before_request
+def start_background_workers():
+    # Started from the first request (not at import) so they run in the gunicorn worker
+    # and pick up mail and jobs left queued by a previous instance.
+    if contact_mail_queue.is_configured():
+        contact_mail_queue.start()
+    job_runner.start()
+
+
+def run_video_thumbnail_job(payload):
+    """Extract, optimize and upload one auto-generated video thumbnail, then attach it to the item."""
+    index = payload['video_index']
+    thumbnail_data = video_thumbnail_extractor.extract_thumbnail_from_url(payload['video_url'])
+    if not thumbnail_data:
+        raise RuntimeError(f"No thumbnail could be generated for {payload['video_url']}")
+    optimized_thumbnail = image_optimizer.optimize_image(thumbnail_data, f"video_{index + 1}_thumbnail.jpg")
+    thumbnail_url = cloud_storage.upload_file(optimized_thumbnail, f"auto_video_{index + 1}_thumbnail.jpg", 'uploads')
+    if not thumbnail_url:
+        raise RuntimeError("Thumbnail upload failed")
+    
+    def attach(item_data):
+        videos = item_data.get('videos') or []
+        if index >= len(videos) or videos[index].get('url') != payload['video_url']:
+            return False  # edited meanwhile; the upload becomes an orphan for the sweep
+        videos[index]['thumbnail_url'] = thumbnail_url
+        videos[index].pop('thumbnail_status', None)
+        return True
+    
+    if not cloud_storage.modify_gallery_item(payload['item_id'], attach):
+        cloud_storage.delete_blobs([cloud_storage.blob_path_from_url(thumbnail_url)])
+        return {'attached': False}
+    print(f"Auto-generated video thumbnail uploaded: {thumbnail_url}")
+    return {'attached': True, 'thumbnail_url': thumbnail_url}
+
+
+def clear_video_thumbnail_status(payload, error):
+    """After the last failed attempt, drop the placeholder; the page falls back to the item image."""
+    def clear(item_data):
+        videos = item_data.get('videos') or []
+        index = payload['video_index']
+        if index < len(videos) and videos[index].pop('thumbnail_status', None):
+            return True
+        return False
+    cloud_storage.modify_gallery_item(payload['item_id'], clear)
+
+
+def pdf_export_paths(item_id=None):
+    name = f"items/{item_id}" if item_id else 'gallery'
+    return f"{PDF_EXPORT_PREFIX}{name}.pdf", f"{PDF_EXPORT_PREFIX}{name}.json"
+
+
+def gallery_pdf_items_data():
+    items_data = []
+    for item in (GalleryItem(item) for item in cloud_storage.get_all_gallery_items()):
+        items_data.append({
+            'title': item.title,
+            'description': item.description,
+            'image_url': item.image_url,
+            'additional_images': item.additional_images,
+            'videos': item.videos,
+            'creators': item.creators,
+            'tags': item.tags,
+            'project_link': item.project_link,  # Backward compatibility
+            'project_links': item.project_links  # New: multiple project links
+        })
+    return items_data
+
+
+def run_pdf_export_job(payload):
+    """Build the gallery (or one item's) PDF and store it under exports/ with the version it reflects."""
+    import tempfile
+    item_id = payload.get('item_id')
+    if item_id:
+        item_data = cloud_storage.get_gallery_item_by_id(item_id)
+        if not item_data:
+            return {'built': False}
+        version = item_data.get('updated_at') or item_data.get('created_at')
+        download_name = f"{item_data['title']}_project.pdf"
+    else:
+        version = cloud_storage.gallery_version()
+        download_name = "Tech_Ethics_Club_Gallery.pdf"
+    
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as temp_file:
+        if item_id:
+            success = pdf_generator.generate_gallery_item_pdf(item_data, temp_file.name)
+        else:
+            success = pdf_generator.generate_gallery_pdf(gallery_pdf_items_data(), temp_file.name)
+        if not success:
+            raise RuntimeError('PDF generation failed')
+        pdf_path, meta_path = pdf_export_paths(item_id)
+        with open(temp_file.name, 'rb') as pdf_file:
+            cloud_storage.backend.upload_stream(pdf_path, pdf_file, 'application/pdf')
+    cloud_storage.backend.put(meta_path, json.dumps({
+        'version': version,
+        'download_name': download_name,
+        'generated_at': datetime.utcnow().isoformat(),
+    }).encode('utf-8'), content_type='application/json')
+    return {'built': True, 'version': version}
+
+
+def run_delete_media_job(payload):
+    return {'deleted': cloud_storage.delete_blobs(payload['paths'])}
+
+
+def run_sweep_orphans_job(payload):
+    from sweep_orphan_blobs import sweep_orphan_blobs
+    return sweep_orphan_blobs(dry_run=payload.get('dry_run', True), cloud_storage=cloud_storage)
+
+
+def load_direct_upload(token):
+    """The {'name', 'filename', 'size'} a token was issued for, or None if it is forged or expired."""
+    try:
+        upload = direct_upload_signer.loads(token, max_age=DIRECT_UPLOAD_TOKEN_MAX_AGE)
+    except BadSignature:
+        return None
+    return upload if str(upload.get('name', '')).startswith(INCOMING_PREFIX) else None
+
+
+def run_process_uploads_job(payload):
+    """Optimize browser-uploaded originals into uploads/ and attach them to the item in one write."""
+    processed = []
+    for upload in payload['uploads']:
+        found = cloud_storage.backend.get(upload['name'])
+        if not found:
+            print(f"Uploaded original {upload['name']} is missing; skipping it")
+            continue
+        optimized = image_optimizer.optimize_image(io.BytesIO(found[0]), upload['filename'])
+        optimized_filename = image_optimizer.get_optimized_filename(upload['filename'])
+        url = cloud_storage.upload_file(optimized, optimized_filename, 'uploads')
+        if not url:
+            raise RuntimeError(f"Upload of optimized {upload['filename']} failed")
+        processed.append((upload, url, optimized_filename))
+
+    def attach(item_data):
+        if not item_data.get('pending_uploads'):
+            return False  # attached by an earlier attempt
+        for upload, url, filename in processed:
+            field = upload['field']
+            if field == 'image':
+                item_data['image_url'] = url
+                item_data['image_filename'] = filename
+            elif field == 'project_poster':
+                item_data['project_poster_url'] = url
+                item_data['project_poster_filename'] = filename
+            elif field in ('additional_images', 'slideshow_images'):
+                prefix = field.split('_')[0]
+                item_data[field] = (item_data.get(field) or []) + [url]
+                item_data[f"{prefix}_filenames"] = (item_data.get(f"{prefix}_filenames") or []) + [filename]
+                item_data[f"{prefix}_image_links"] = (item_data.get(f"{prefix}_image_links") or []) + [upload.get('link')]
+            elif field == 'video_thumbnail':
+                videos = item_data.get('videos') or []
+                if upload['index'] < len(videos):
+                    videos[upload['index']]['thumbnail_url'] = url
+                    videos[upload['index']].pop('thumbnail_status', None)
+        item_data.pop('pending_uploads', None)
+        item_data.pop('media_status', None)
+        return True
+
+    attached = cloud_storage.modify_gallery_item(payload['item_id'], attach)
+    if not attached:
+        # Item deleted meanwhile, or this is a retry of work already attached.
+        cloud_storage.delete_blobs([cloud_storage.blob_path_from_url(url) for _, url, _ in processed])
+    cloud_storage.delete_blobs([upload['name'] for upload in payload['uploads']])
+    print(f"Processed {len(processed)} uploaded image(s) for gallery item {payload['item_id']}")
+    return {'attached': len(processed) if attached else 0}
+
+
+def clear_pending_uploads(payload, error):
+    """After the last failed attempt, drop the placeholders; the originals are left for the orphan sweep."""
+    def clear(item_data):
+        if not item_data.get('pending_uploads'):
+            return False
+        videos = item_data.get('videos') or []
+        for upload in payload['uploads']:
+            if upload['field'] == 'video_thumbnail' and upload['index'] < len(videos):
+                videos[upload['index']].pop('thumbnail_status', None)
+        item_data.pop('pending_uploads', None)
+        item_data.pop('media_status', None)
+        return True
+    cloud_storage.modify_gallery_item(payload['item_id'], clear)
+
+
+job_runner.register('video_thumbnail', run_video_thumbnail_job, on_failure=clear_video_thumbnail_status)
+job_runner.register('pdf_export', run_pdf_export_job)
+job_runner.register('delete_media', run_delete_media_job)
+job_runner.register('sweep_orphans', run_sweep_orphans_job, max_attempts=1)
+job_runner.register('process_uploads', run_process_uploads_job, on_failure=clear_pending_uploads)
+
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -105,6 +349,107 @@ login_manager.login_view = 'login'
 def load_user(user_id):
     return CloudUser.get(user_id)
 
+@app.before_request
+def start_storage_accounting():
+    g.request_started = time.perf_counter()
+    g.storage_token = storage_metrics.begin_request()
+    g.in_flight = True
+    IN_FLIGHT.inc()
+    if memory_tracking.should_track(request.endpoint):
+        g.memory_tracker = memory_tracking.start_tracking()
+
+@app.before_request
+def start_profiler_if_requested():
+    """Admins can profile any request with ?_profile=1 or an X-Profile: 1 header."""
+    if not request_profiler.profile_requested(request):
+        return
+    if not (current_user.is_authenticated and current_user.is_admin):
+        return
+    sampler = request_profiler.try_start_profile()
+    if sampler is None:
+        g.profile_status = 'skipped'  # another profile is running or one ran too recently
+        return
+    g.profiler = sampler
+    g.profile_storage_stats = storage_metrics.current_request_stats()
+    g.profile_templates = []
+
+@before_render_template.connect_via(app)
+def _profile_template_started(sender, template, context, **extra):
+    if 'profiler' in g:
+        g.profile_template_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def _profile_template_finished(sender, template, context, **extra):
+    if 'profiler' in g and 'profile_template_started' in g:
+        g.profile_templates.append((template.name, time.perf_counter() - g.pop('profile_template_started')))
+
+@app.after_request
+def store_profile_report(response):
+    sampler = g.pop('profiler', None)
+    if sampler is None:
+        if 'profile_status' in g:
+            response.headers['X-Profile-Status'] = g.profile_status
+        return response
+    request_profiler.finish_profile(sampler)
+    try:
+        report = request_profiler.build_report(
+            sampler,
+            {'method': request.method, 'path': request.full_path, 'endpoint': request.endpoint,
+             'status': response.status_code},
+            g.get('profile_storage_stats'),
+            g.get('profile_templates', ()),
+        )
+        response.headers['X-Profile-Report'] = request_profiler.save_report(cloud_storage.backend, report)
+        response.headers['X-Profile-Status'] = 'stored'
+    except Exception as e:
+        logging.error(f"Failed to store profile report: {e}")
+        response.headers['X-Profile-Status'] = 'error'
+    return response
+
+@app.after_request
+def finish_memory_tracking(response):
+    tracker = g.pop('memory_tracker', None)
+    if tracker is not None:
+        summary = tracker.finish(request.endpoint, request.path)
+        response.headers['X-Memory-Peak-Heap'] = str(summary['peak_heap_bytes'])
+    return response
+
+@app.after_request
+def add_storage_timing(response):
+    """Server-Timing header and one structured log line with this request's storage calls."""
+    token = g.pop('storage_token', None)
+    if token is None:
+        return response
+    stats = storage_metrics.end_request(token, request.endpoint)
+    duration = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_SECONDS.observe(duration, endpoint=endpoint, method=request.method)
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    REQUEST_STORAGE_CALLS.observe(stats.total_calls, endpoint=endpoint)
+    timing = f'{storage_metrics.server_timing_header(stats)}, app;dur={duration * 1000:.1f}'
+    existing = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+    if request.endpoint not in ('serve_static', 'favicon'):
+        storage_metrics.log_request(request.method, request.path, request.endpoint,
+                                    response.status_code, duration, stats)
+    return response
+
+@app.teardown_request
+def finish_storage_accounting(exc):
+    # after_request is skipped when a view raises; still close the request's stats.
+    token = g.pop('storage_token', None)
+    if token is not None:
+        storage_metrics.end_request(token, request.endpoint)
+    if g.pop('in_flight', False):
+        IN_FLIGHT.dec()
+    sampler = g.pop('profiler', None)
+    if sampler is not None:
+        # The view raised before store_profile_report ran; just release the profiler.
+        request_profiler.finish_profile(sampler)
+    tracker = g.pop('memory_tracker', None)
+    if tracker is not None:
+        tracker.finish(request.endpoint, request.path)
+
 @app.after_request
 def add_header(response):
     if request.path.startswith('/static/'):
@@ -129,29 +474,76 @@ def favicon():
     """Serve a persistent tab icon for all pages."""
     return send_from_directory('static/imgs', 'tech_and_ethics_logo.jpg')
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint. Bearer METRICS_TOKEN if set, otherwise admins only."""
+    metrics_token = os.environ.get('METRICS_TOKEN')
+    if metrics_token:
+        provided = request.headers.get('Authorization', '').encode('utf-8')
+        if not hmac.compare_digest(provided, f'Bearer {metrics_token}'.encode('utf-8')):
+            return 'Unauthorized', 401
+    elif not (current_user.is_authenticated and getattr(current_user, 'is_admin', False)):
+        return 'Forbidden', 403
+    return app.response_class(metrics.render_all(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiles')
+@login_required
+def list_profile_reports():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify({'reports': request_profiler.list_reports(cloud_storage.backend)})
+
+@app.route('/admin/profiles/<path:name>')
+@login_required
+def view_profile_report(name):
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    report = request_profiler.load_report(cloud_storage.backend, name)
+    if report is None:
+        return jsonify({'error': 'Report not found'}), 404
+    return jsonify(report)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def _gallery_page_args():
+    """Read ?course=, ?tag=, ?school=, ?country=, ?q=, ?cursor= and ?limit= for paginated gallery listings."""
+    try:
+        limit = int(request.args.get('limit', GALLERY_PAGE_SIZE))
+    except ValueError:
+        limit = GALLERY_PAGE_SIZE
+    return {
+        'course_id': request.args.get('course', '').strip() or None,
+        'tag': request.args.get('tag', '').strip() or None,
+        'school': request.args.get('school', '').strip() or None,
+        'country': request.args.get('country', '').strip() or None,
+        'query': request.args.get('q', '').strip() or None,
+        'cursor': request.args.get('cursor', '').strip() or None,
+        'limit': max(1, min(limit, GALLERY_MAX_PAGE_SIZE)),
+    }
+
 @app.route('/gallery')
 def gallery():
-    """List all gallery items; optional ?course=<id> filters to one course."""
-    course_filter = request.args.get('course', '').strip()
+    """First page of gallery cards; ?course=, ?tag=, ?school=, ?country= and ?q= filter via the gallery index."""
+    page_args = _gallery_page_args()
+    course_filter = page_args['course_id'] or ''
 
     if not cloud_storage._storage_available:
         flash('Storage is currently unavailable. Gallery items cannot be loaded.', 'error')
 
     try:
-        gallery_items_data = cloud_storage.get_all_gallery_items()
+        page = cloud_storage.get_gallery_page(**page_args)
+        course_counts = cloud_storage.get_gallery_course_counts()
+        tag_counts = cloud_storage.get_gallery_index_counts('by_tag')
+        school_counts = cloud_storage.get_gallery_index_counts('by_school')
     except Exception as e:
         logging.error(f"Failed to load gallery items: {e}")
         flash('Could not load gallery items. Please try again later.', 'error')
-        gallery_items_data = []
-
-    if course_filter:
-        gallery_items_data = [item for item in gallery_items_data if item.get('course_id') == course_filter]
+        page = {'items': [], 'next_cursor': None, 'total': 0}
+        course_counts, tag_counts, school_counts = {}, {}, {}
 
-    gallery_items = [GalleryItem(item) for item in gallery_items_data]
+    gallery_items = [GalleryItem(item) for item in page['items']]
 
     try:
         courses = cloud_storage.get_all_courses()
@@ -159,7 +551,77 @@ def gallery():
         logging.error(f"Failed to load courses: {e}")
         courses = []
 
-    return render_template('gallery.html', gallery_items=gallery_items, courses=courses, selected_course=course_filter)
+    return render_template('gallery.html', gallery_items=gallery_items, courses=courses, selected_course=course_filter,
+                           next_cursor=page['next_cursor'], course_counts=course_counts,
+                           tag_counts=dict(sorted(tag_counts.items())),
+                           school_counts=dict(sorted(school_counts.items())))
+
+@app.route('/gallery/page')
+def gallery_page():
+    """Infinite-scroll JSON: next page of card data plus pre-rendered card HTML."""
+    try:
+        page = cloud_storage.get_gallery_page(**_gallery_page_args())
+    except Exception as e:
+        logging.error(f"Failed to load gallery page: {e}")
+        return jsonify({'error': 'Could not load gallery items.'}), 500
+
+    cards = [GalleryItem(item) for item in page['items']]
+    return jsonify({
+        'items': page['items'],
+        'html': [render_template('gallery_card.html', item=card) for card in cards],
+        'next_cursor': page['next_cursor'],
+        'total': page['total'],
+    })
+
+# Default projections for the read-only gallery API, trimmed like the blog's META_FIELDS.
+GALLERY_API_LIST_FIELDS = ('id', 'title', 'image_url', 'course_id', 'tags', 'creators',
+                           'created_at', 'has_images', 'has_videos')
+# List responses come from index card summaries, so only these fields can be projected there.
+GALLERY_API_LIST_ALLOWED = GALLERY_API_LIST_FIELDS + (
+    'description', 'additional_images', 'videos', 'creator_name', 'creator_school',
+    'creator_city', 'creator_state', 'creator_country', 'created_by',
+    'is_mixed_media', 'has_multiple_creators'
+)
+
+
+def _api_fields(default_fields, allowed=None):
+    """Parse ?fields=a,b into a tuple; unknown names are dropped, empty falls back to default."""
+    requested = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    if allowed is not None:
+        requested = [f for f in requested if f in allowed]
+    return tuple(requested) or default_fields
+
+
+def _conditional_json(payload):
+    """JSON response with a strong ETag; answers If-None-Match with 304."""
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/gallery')
+def api_gallery():
+    """Read-only gallery listing: ?fields=, ?course=, ?tag=, ?school=, ?country=, ?q=, ?cursor=, ?limit=."""
+    fields = _api_fields(GALLERY_API_LIST_FIELDS, GALLERY_API_LIST_ALLOWED)
+    try:
+        page = cloud_storage.get_gallery_page(**_gallery_page_args())
+    except Exception as e:
+        logging.error(f"Failed to load gallery API page: {e}")
+        return jsonify({'error': 'Could not load gallery items.'}), 500
+
+    return _conditional_json({
+        'items': [GalleryItem(item).to_dict(fields) for item in page['items']],
+        'next_cursor': page['next_cursor'],
+        'total': page['total'],
+    })
+
+@app.route('/api/gallery/<item_id>')
+def api_gallery_item(item_id):
+    """Read-only single item, normalized like GalleryItem; ?fields= narrows the payload."""
+    fields = _api_fields(None)
+    item_data = cloud_storage.get_gallery_item_by_id(item_id)
+    if not item_data:
+        return jsonify({'error': 'Gallery item not found.'}), 404
+    return _conditional_json(GalleryItem(item_data).to_dict(fields))
 
 @app.route('/gallery/<item_id>')
 def gallery_item(item_id):
@@ -352,6 +814,71 @@ def logout():
     flash('You have been logged out.', 'info')
     return redirect(url_for('index'))
 
+@app.route('/admin/uploads/sessions', methods=['POST'])
+@login_required
+def create_upload_sessions():
+    """Admin JSON: one upload URL + token per image the gallery form will send straight to storage."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'You do not have permission to upload files.'}), 403
+
+    files = (request.get_json(silent=True) or {}).get('files') or []
+    if not isinstance(files, list) or not files or len(files) > DIRECT_UPLOAD_MAX_FILES:
+        return jsonify({'error': f'Send between 1 and {DIRECT_UPLOAD_MAX_FILES} files.'}), 400
+
+    # The browser PUTs from this origin; GCS only answers cross-origin PUTs for it.
+    origin = request.headers.get('Origin') or request.host_url.rstrip('/')
+    uploads = []
+    for entry in files:
+        entry = entry if isinstance(entry, dict) else {}
+        filename = secure_filename(str(entry.get('filename') or '')) or 'upload'
+        content_type = str(entry.get('content_type') or '')
+        size = entry.get('size')
+        if not content_type.startswith('image/'):
+            return jsonify({'error': f'"{filename}" is not an image.'}), 400
+        if not isinstance(size, int) or size <= 0 or size > DIRECT_UPLOAD_MAX_BYTES:
+            return jsonify({'error': f'File "{filename}" is too large. Maximum file size is 15MB.'}), 400
+        try:
+            session = cloud_storage.create_upload_session(filename, content_type, size, origin)
+        except Exception as e:
+            print(f"Error creating upload session for {filename}: {str(e)}")
+            session = None
+        if not session:
+            return jsonify({'error': 'Could not start the upload.'}), 503
+        token = direct_upload_signer.dumps({'name': session['name'], 'filename': filename, 'size': size})
+        uploads.append({
+            'token': token,
+            'upload_url': session['upload_url'] or url_for('receive_direct_upload', token=token),
+        })
+    return jsonify({'uploads': uploads})
+
+@app.route('/admin/uploads/direct/<token>', methods=['PUT'])
+@login_required
+def receive_direct_upload(token):
+    """Stands in for the bucket's upload URL when the backend cannot take uploads itself (memory/local)."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'You do not have permission to upload files.'}), 403
+    upload = load_direct_upload(token)
+    if upload is None:
+        return jsonify({'error': 'Upload link is invalid or has expired.'}), 400
+    if request.content_length != upload['size']:
+        return jsonify({'error': 'Upload size does not match the announced size.'}), 400
+    try:
+        cloud_storage.backend.put(upload['name'], request.get_data(), request.content_type, if_generation_match=0)
+    except PreconditionFailed:
+        return jsonify({'error': 'This upload link has already been used.'}), 409
+    return '', 200
+
+def direct_uploads_from_form(field, multiple=False):
+    """Uploads the form already sent to storage for field, aligned with its file inputs (None for empty ones)."""
+    tokens = request.form.getlist(f"{field}_tokens[]") if multiple else [request.form.get(f"{field}_token", '')]
+    uploads = []
+    for token in tokens:
+        upload = load_direct_upload(token) if token else None
+        if token and upload is None:
+            print(f"Ignoring invalid or expired upload token for {field}")
+        uploads.append(upload)
+    return uploads
+
 @app.route('/admin/gallery/add', methods=['GET', 'POST'])
 @login_required
 def add_gallery_item():
@@ -421,6 +948,14 @@ def add_gallery_item():
         slideshow_image_links = request.form.getlist('slideshow_image_links[]')
         slideshow_title = request.form.get('slideshow_title', '').strip()
         
+        # Originals the form already sent straight to storage (see create_upload_sessions).
+        poster_upload = direct_uploads_from_form('project_poster')[0]
+        thumbnail_upload = direct_uploads_from_form('thumbnail_image')[0]
+        additional_uploads = direct_uploads_from_form('additional_images', multiple=True)
+        slideshow_uploads = direct_uploads_from_form('slideshow_images', multiple=True)
+        video_thumbnail_uploads = direct_uploads_from_form('video_thumbnails', multiple=True)
+        pending_uploads = []
+        
         print(f"Form data received:")
         print(f"  Title: '{title}'")
         print(f"  Creator: '{creator_name}'")
@@ -439,7 +974,7 @@ def add_gallery_item():
             else:
                 print(f"      File object exists: {f is not None}, but no filename")
         
-        has_images = bool(thumbnail_file and thumbnail_file.filename)
+        has_images = bool(thumbnail_file and thumbnail_file.filename) or thumbnail_upload is not None
         has_videos = any(url.strip() for url in video_urls)
         
         print(f"Validation checks:")
@@ -487,7 +1022,12 @@ def add_gallery_item():
             project_poster_url = None
             project_poster_link_value = None
             project_poster_filename = None
-            if project_poster_file and project_poster_file.filename:
+            if poster_upload:
+                print(f"Queuing uploaded project poster for processing: {poster_upload['name']}")
+                pending_uploads.append({'field': 'project_poster', 'name': poster_upload['name'],
+                                        'filename': poster_upload['filename']})
+                project_poster_link_value = project_poster_link if project_poster_link else None
+            elif project_poster_file and project_poster_file.filename:
                 print(f"Processing project poster: {project_poster_file.filename}")
                 try:
                     optimized_poster = image_optimizer.optimize_image(project_poster_file, project_poster_file.filename)
@@ -510,7 +1050,12 @@ def add_gallery_item():
             thumbnail_url = None
             thumbnail_image_link_value = None
             optimized_filename = None
-            if has_images:
+            if thumbnail_upload:
+                print(f"Queuing uploaded thumbnail for processing: {thumbnail_upload['name']}")
+                pending_uploads.append({'field': 'image', 'name': thumbnail_upload['name'],
+                                        'filename': thumbnail_upload['filename']})
+                thumbnail_image_link_value = thumbnail_image_link if thumbnail_image_link else None
+            elif has_images:
                 if not thumbnail_file or not thumbnail_file.filename:
                     print("Thumbnail file is missing or has no filename")
                     flash('Thumbnail file is missing. Please try again.', 'error')
@@ -537,6 +1082,7 @@ def add_gallery_item():
                     print(f"Thumbnail image link: {thumbnail_image_link_value}")
             
             videos_list = []
+            auto_thumbnail_indices = []
             if has_videos:
                 print(f"Processing {len(video_urls)} videos")
                 for i, video_url in enumerate(video_urls):
@@ -544,7 +1090,13 @@ def add_gallery_item():
                         video_title = video_titles[i].strip() if i < len(video_titles) and video_titles[i].strip() else f"Video {i+1}"
                         
                         video_thumbnail_url = None
-                        if i < len(video_thumbnail_files) and video_thumbnail_files[i] and video_thumbnail_files[i].filename:
+                        video_thumbnail_upload = video_thumbnail_uploads[i] if i < len(video_thumbnail_uploads) else None
+                        if video_thumbnail_upload:
+                            print(f"Queuing uploaded custom thumbnail for video {i+1}: {video_thumbnail_upload['name']}")
+                            pending_uploads.append({'field': 'video_thumbnail', 'index': len(videos_list),
+                                                    'name': video_thumbnail_upload['name'],
+                                                    'filename': video_thumbnail_upload['filename']})
+                        elif i < len(video_thumbnail_files) and video_thumbnail_files[i] and video_thumbnail_files[i].filename:
                             try:
                                 print(f"Processing custom video thumbnail for video {i+1}")
                                 optimized_video_thumbnail = image_optimizer.optimize_image(video_thumbnail_files[i], video_thumbnail_files[i].filename)
@@ -554,26 +1106,20 @@ def add_gallery_item():
                                 print(f"Custom video thumbnail uploaded: {video_thumbnail_url}")
                             except Exception as e:
                                 print(f"Error uploading custom video thumbnail: {e}")
-                        else:
-                            try:
-                                print(f"Auto-generating thumbnail for video {i+1}: {video_url}")
-                                thumbnail_data = video_thumbnail_extractor.extract_thumbnail_from_url(video_url)
-                                if thumbnail_data:
-                                    optimized_thumbnail = image_optimizer.optimize_image(thumbnail_data, f"video_{i+1}_thumbnail.jpg")
-                                    thumbnail_filename = f"auto_video_{i+1}_thumbnail.jpg"
-                                    
-                                    video_thumbnail_url = cloud_storage.upload_file(optimized_thumbnail, thumbnail_filename, 'uploads')
-                                    print(f"Auto-generated video thumbnail uploaded: {video_thumbnail_url}")
-                                else:
-                                    print(f"Could not generate thumbnail for video {i+1}")
-                            except Exception as e:
-                                print(f"Error auto-generating video thumbnail: {e}")
                         
-                        videos_list.append({
+                        video_entry = {
                             'url': video_url.strip(),
                             'title': video_title,
                             'thumbnail_url': video_thumbnail_url
-                        })
+                        }
+                        if video_thumbnail_upload:
+                            video_entry['thumbnail_status'] = 'processing'
+                        elif not video_thumbnail_url:
+                            # Generated by a video_thumbnail job once the item exists.
+                            print(f"Queuing thumbnail generation for video {i+1}: {video_url}")
+                            video_entry['thumbnail_status'] = 'processing'
+                            auto_thumbnail_indices.append(len(videos_list))
+                        videos_list.append(video_entry)
                         print(f"Added video {i+1}: {video_title} - {video_url}")
             
             additional_urls = []
@@ -630,6 +1176,15 @@ def add_gallery_item():
                     traceback.print_exc()
                     flash(f'Warning: Error uploading "{additional_file.filename}": {str(upload_error)}. Continuing with other files.', 'warning')
             
+            # Uploaded straight to storage: attached (with their links) by the process_uploads job.
+            additional_slots = 4 - len(additional_urls)
+            for original_index, upload in enumerate(additional_uploads):
+                if upload and additional_slots > 0:
+                    additional_slots -= 1
+                    link_value = additional_image_links[original_index] if original_index < len(additional_image_links) else ''
+                    pending_uploads.append({'field': 'additional_images', 'name': upload['name'],
+                                            'filename': upload['filename'], 'link': link_value.strip() or None})
+            
             print(f"Final additional URLs: {additional_urls}")
             print(f"Final additional URLs count: {len(additional_urls)}")
             print(f"Final additional filenames: {additional_filenames}")
@@ -695,6 +1250,12 @@ def add_gallery_item():
                     traceback.print_exc()
                     flash(f'Warning: Error uploading slideshow image "{slideshow_file.filename}": {str(upload_error)}. Continuing with other files.', 'warning')
             
+            for original_index, upload in enumerate(slideshow_uploads):
+                if upload:
+                    link_value = slideshow_image_links[original_index] if original_index < len(slideshow_image_links) else ''
+                    pending_uploads.append({'field': 'slideshow_images', 'name': upload['name'],
+                                            'filename': upload['filename'], 'link': link_value.strip() or None})
+            
             print(f"Final slideshow URLs: {slideshow_urls}")
             print(f"Final slideshow URLs count: {len(slideshow_urls)}")
             
@@ -730,10 +1291,34 @@ def add_gallery_item():
             tags=tag_list,  # Empty if course_id is set
             videos=videos_list,
             course_id=course_id,
-            created_by=current_user.id
+            created_by=current_user.id,
+            pending_uploads=[upload['name'] for upload in pending_uploads]
         )
             
             print(f"Gallery item created successfully with ID: {gallery_item.get('id')}")
+            if pending_uploads:
+                payload = {'item_id': gallery_item['id'], 'uploads': pending_uploads}
+                try:
+                    job_runner.submit('process_uploads', payload,
+                                      dedup_key=f"process_uploads:{gallery_item['id']}",
+                                      subject=f"gallery:{gallery_item['id']}")
+                except Exception as e:
+                    print(f"Error queuing upload processing job, processing inline: {e}")
+                    try:
+                        run_process_uploads_job(payload)
+                    except Exception as inline_error:
+                        print(f"Error processing uploads: {inline_error}")
+                        clear_pending_uploads(payload, inline_error)
+            for video_index in auto_thumbnail_indices:
+                video = videos_list[video_index]
+                try:
+                    job_runner.submit('video_thumbnail',
+                                      {'item_id': gallery_item['id'], 'video_index': video_index, 'video_url': video['url']},
+                                      dedup_key=f"video_thumbnail:{gallery_item['id']}:{video_index}",
+                                      subject=f"gallery:{gallery_item['id']}")
+                except Exception as e:
+                    print(f"Error queuing video thumbnail job: {e}")
+                    clear_video_thumbnail_status({'item_id': gallery_item['id'], 'video_index': video_index}, e)
             flash('Gallery item added successfully!', 'success')
             return redirect(url_for('gallery'))
             
@@ -777,9 +1362,15 @@ def delete_gallery_item(item_id):
             flash('Gallery item not found.', 'error')
             return redirect(url_for('gallery'))
         
-        success = cloud_storage.delete_gallery_item(item_id)
+        success = cloud_storage.delete_gallery_item(item_id, delete_media=False)
         
         if success:
+            media_paths = cloud_storage.gallery_item_media_paths(item)
+            if media_paths:
+                try:
+                    job_runner.submit('delete_media', {'paths': media_paths}, subject=f"gallery:{item_id}")
+                except JobQueueFull:
+                    cloud_storage.delete_blobs(media_paths)
             flash('Gallery item deleted successfully!', 'success')
         else:
             flash('Failed to delete gallery item.', 'error')
@@ -846,78 +1437,90 @@ def move_gallery_item_to_course():
     
     return redirect(url_for('gallery'))
 
+def serve_pdf_export(item_id, version, failed_redirect):
+    """Send the stored export if it matches version; otherwise queue a build and show a waiting page."""
+    pdf_path, meta_path = pdf_export_paths(item_id)
+    meta = cloud_storage.backend.get(meta_path)
+    if meta:
+        meta = json.loads(meta[0])
+        if meta.get('version') == version:
+            found = cloud_storage.backend.get(pdf_path)
+            if found:
+                from flask import send_file
+                return send_file(io.BytesIO(found[0]), as_attachment=True,
+                                 download_name=meta['download_name'], mimetype='application/pdf')
+    
+    previous_job = request.args.get('job')
+    if previous_job:
+        status = job_runner.get(previous_job)
+        if status and status['status'] == 'failed':
+            flash('Error generating PDF.', 'error')
+            return failed_redirect
+    
+    job = job_runner.submit('pdf_export', {'item_id': item_id},
+                            dedup_key=f"pdf_export:{item_id or 'gallery'}:{version}",
+                            subject=f"gallery:{item_id}" if item_id else 'gallery')
+    return render_template('pdf_processing.html', job=job,
+                           refresh_url=url_for(request.endpoint, job=job['id'], **request.view_args))
+
 @app.route('/gallery/<item_id>/pdf')
 def generate_gallery_item_pdf(item_id):
-    """Download one project as PDF (reportlab via pdf_generator)."""
+    """Download one project as PDF; built in the background (pdf_export job) and cached under exports/."""
     try:
         item_data = cloud_storage.get_gallery_item_by_id(item_id)
         if not item_data:
             flash('Gallery item not found.', 'error')
             return redirect(url_for('gallery'))
         
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_path = temp_file.name
-        
-        success = pdf_generator.generate_gallery_item_pdf(item_data, temp_path)
-        
-        if success:
-            from flask import send_file
-            return send_file(temp_path, as_attachment=True, 
-                           download_name=f"{item_data['title']}_project.pdf",
-                           mimetype='application/pdf')
-        else:
-            flash('Error generating PDF.', 'error')
-            return redirect(url_for('gallery_item', item_id=item_id))
+        return serve_pdf_export(item_id, item_data.get('updated_at') or item_data.get('created_at'),
+                                redirect(url_for('gallery_item', item_id=item_id)))
             
+    except JobQueueFull:
+        flash('PDF exports are busy right now. Please try again in a minute.', 'error')
+        return redirect(url_for('gallery_item', item_id=item_id))
     except Exception as e:
         flash(f'Error generating PDF: {str(e)}', 'error')
         return redirect(url_for('gallery_item', item_id=item_id))
 
 @app.route('/gallery/pdf')
 def generate_gallery_pdf():
-    """Download combined PDF of all gallery items."""
+    """Download combined PDF of all gallery items; rebuilt in the background when the gallery changes."""
     try:
-        gallery_items_data = cloud_storage.get_all_gallery_items()
-        gallery_items = [GalleryItem(item) for item in gallery_items_data]
-        
-        if not gallery_items:
+        if not cloud_storage.get_gallery_page(limit=1)['items']:
             flash('No gallery items found.', 'error')
             return redirect(url_for('gallery'))
         
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_path = temp_file.name
-        
-        items_data = []
-        for item in gallery_items:
-            items_data.append({
-                'title': item.title,
-                'description': item.description,
-                'image_url': item.image_url,
-                'additional_images': item.additional_images,
-                'videos': item.videos,
-                'creators': item.creators,
-                'tags': item.tags,
-                'project_link': item.project_link,  # Backward compatibility
-                'project_links': item.project_links  # New: multiple project links
-            })
-        
-        success = pdf_generator.generate_gallery_pdf(items_data, temp_path)
-        
-        if success:
-            from flask import send_file
-            return send_file(temp_path, as_attachment=True, 
-                           download_name="Tech_Ethics_Club_Gallery.pdf",
-                           mimetype='application/pdf')
-        else:
-            flash('Error generating PDF.', 'error')
-            return redirect(url_for('gallery'))
+        return serve_pdf_export(None, cloud_storage.gallery_version(), redirect(url_for('gallery')))
             
+    except JobQueueFull:
+        flash('PDF exports are busy right now. Please try again in a minute.', 'error')
+        return redirect(url_for('gallery'))
     except Exception as e:
         flash(f'Error generating PDF: {str(e)}', 'error')
         return redirect(url_for('gallery'))
 
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Status of a background job (no payload): queued, running, succeeded or failed."""
+    job = job_runner.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found.'}), 404
+    return jsonify(job)
+
+@app.route('/admin/maintenance/sweep-orphans', methods=['POST'])
+@login_required
+def sweep_orphans():
+    """Admin: queue an orphaned-blob sweep (dry run unless delete=1); poll /api/jobs/<id> for the report."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied.'}), 403
+    dry_run = request.form.get('delete') != '1'
+    try:
+        job = job_runner.submit('sweep_orphans', {'dry_run': dry_run},
+                                dedup_key=f"sweep_orphans:{'dry' if dry_run else 'delete'}")
+    except JobQueueFull:
+        return jsonify({'error': 'Job queue is full.'}), 503
+    return jsonify(job), 202
+
 @app.route('/check-permissions')
 @login_required
 def check_permissions():
@@ -1008,11 +1611,11 @@ def debug_cloud_storage():
     
     test_result = "Not tested"
     try:
-        if cloud_storage.client and cloud_storage.bucket:
-            blobs = list(cloud_storage.bucket.list_blobs(max_results=3))
+        if cloud_storage.backend:
+            blobs = list(cloud_storage.backend.list(max_results=3))
             test_result = f"✅ Successfully listed {len(blobs)} blobs"
         else:
-            test_result = "❌ Client or bucket not available"
+            test_result = "❌ Storage backend not available"
     except Exception as e:
         test_result = f"❌ Test failed: {str(e)}"
     
@@ -1020,8 +1623,8 @@ def debug_cloud_storage():
     <h2>Cloud Storage Debug Info</h2>
     <p><strong>Current User:</strong> {current_user.email} (Admin: {current_user.is_admin})</p>
     <p><strong>Bucket Name:</strong> {cloud_storage.bucket_name}</p>
-    <p><strong>Client Available:</strong> {cloud_storage.client is not None}</p>
-    <p><strong>Bucket Available:</strong> {cloud_storage.bucket is not None}</p>
+    <p><strong>Storage Backend:</strong> {cloud_storage.backend.kind if cloud_storage.backend else 'None'}</p>
+    <p><strong>Storage Available:</strong> {cloud_storage._storage_available}</p>
     <p><strong>Auth Error:</strong> {cloud_storage.auth_error or 'None'}</p>
     <p><strong>Service Account Key Exists:</strong> {os.path.exists('tech-ethics-club-sa-key.json')}</p>
     <p><strong>Environment:</strong> {'Production (App Engine)' if os.environ.get('GAE_ENV') else 'Local Development'}</p>
@@ -1031,91 +1634,75 @@ def debug_cloud_storage():
     <p><strong>Test Operation:</strong> {test_result}</p>
     """
     
-    if cloud_storage.client and cloud_storage.bucket:
+    if cloud_storage.backend:
         try:
-            test_blobs = list(cloud_storage.bucket.list_blobs(max_results=1))
+            test_blobs = list(cloud_storage.backend.list(max_results=1))
             debug_info += f"<p><strong>Bucket Access Test:</strong> ✅ Success (found {len(test_blobs)} blobs)</p>"
         except Exception as e:
             debug_info += f"<p><strong>Bucket Access Test:</strong> ❌ Failed - {str(e)}</p>"
     else:
-        debug_info += "<p><strong>Bucket Access Test:</strong> ❌ Cannot test - client/bucket not available</p>"
+        debug_info += "<p><strong>Bucket Access Test:</strong> ❌ Cannot test - storage backend not available</p>"
+    
+    for pool in gcs_pool_stats():
+        debug_info += (f"<p><strong>Connection Pool ({pool['host']}):</strong> {pool['in_use']} in use, "
+                       f"{pool['idle']} idle of {pool['max_size']}; {pool['connections_opened']} opened, "
+                       f"{pool['reused']} of {pool['requests']} requests reused a connection</p>")
     
     return debug_info
 
-@app.route('/blog')
-def blog():
+# Fields sent to the live-search JS; listing cards need nothing else.
+BLOG_API_FIELDS = ('id', 'title', 'slug', 'author_name', 'author_city', 'author_state',
+                   'author_country', 'author_school', 'tags', 'created_at', 'excerpt')
+
+
+def _blog_listing():
+    """
+    Posts for /blog and /api/blog from ?search=, ?author_filter=, ?tag_filter=,
+    ?search_content=1, ?exact_match=1 and ?page=. Summaries only, never bodies:
+    searches return a page of ranked hits with snippets, everything else one
+    manifest page; either way 'total' counts every match.
+    """
     search_query = request.args.get('search', '').strip()
     author_filter = request.args.get('author_filter', '').strip()
     tag_filter = request.args.get('tag_filter', '').strip()
     search_content = request.args.get('search_content') == '1'
     exact_match = request.args.get('exact_match') == '1'
+    page = request.args.get('page', 1, type=int)
     
-    all_posts = blog_storage.get_all_blog_posts()
-    
-    all_authors = list(set(post.get('author_name', '') for post in all_posts if post.get('author_name')))
-    all_authors.sort()
-    
-    all_tags = set()
-    for post in all_posts:
-        if post.get('tags'):
-            all_tags.update(post.get('tags'))
-    all_tags = sorted(list(all_tags))
+    if search_query:
+        # Ranked over the precomputed search index; hits carry snippets instead of bodies.
+        # Without "Include content" the body is not scored (exact phrases always check it).
+        weights = None if search_content or exact_match else dict(SEARCH_FIELD_WEIGHTS, body=0.0)
+        return blog_storage.search_blog_posts(search_query, page, BLOG_PAGE_SIZE, weights=weights,
+                                              author=author_filter or None,
+                                              tag=tag_filter or None, exact=exact_match)
     
-    if search_query or author_filter or tag_filter:
-        filtered_posts = []
-        
-        for post in all_posts:
-            matches = True
-            
-            if search_query:
-                post_title = post.get('title', '').lower()
-                post_content = post.get('content', '').lower()
-                post_author = post.get('author_name', '').lower()
-                post_tags = [tag.lower() for tag in post.get('tags', [])]
-                
-                search_terms = search_query.lower().split()
-                
-                if exact_match:
-                    if not (search_query.lower() in post_title or 
-                           search_query.lower() in post_content or 
-                           search_query.lower() in post_author or 
-                           search_query.lower() in ' '.join(post_tags)):
-                        matches = False
-                else:
-                    if not any(word in post_title or 
-                              (search_content and word in post_content) or 
-                              word in post_author or 
-                              any(word in tag for tag in post_tags) 
-                              for word in search_terms):
-                        matches = False
-            
-            if author_filter and matches:
-                if post.get('author_name', '') != author_filter:
-                    matches = False
-            
-            if tag_filter and matches:
-                post_tags = post.get('tags', [])
-                if tag_filter not in post_tags:
-                    matches = False
-            
-            if matches:
-                filtered_posts.append(post)
-        
-        blog_posts = filtered_posts
-    else:
-        blog_posts = all_posts
+    return blog_storage.get_blog_post_page(page, BLOG_PAGE_SIZE, author=author_filter or None,
+                                           tag=tag_filter or None)
+
+@app.route('/blog')
+def blog():
+    listing = _blog_listing()
+    facets = blog_storage.get_blog_facets()
     
-    # Task 69: strip full content before serialising into the page JS payload.
-    # The initial HTML render (above) still uses full blog_posts for previews.
-    # Client-side search only needs metadata; content search falls back to the
-    # server-side form submission.
-    META_FIELDS = ('id', 'title', 'slug', 'author_name', 'author_city',
-                   'author_state', 'author_country', 'author_school', 'tags', 'created_at')
-    blog_posts_meta = [{k: p.get(k) for k in META_FIELDS} for p in blog_posts]
-
-    return render_template('blog.html', blog_posts=blog_posts,
-                           blog_posts_meta=blog_posts_meta,
-                           all_authors=all_authors, all_tags=all_tags)
+    page_args = {key: value for key, value in request.args.items() if key != 'page'}
+    return render_template('blog.html', blog_posts=listing['posts'], page=listing['page'],
+                           pages=listing['pages'], total=listing['total'], page_args=page_args,
+                           all_authors=list(facets['authors']), all_tags=list(facets['tags']),
+                           author_counts=facets['authors'], tag_counts=facets['tags'])
+
+@app.route('/api/blog')
+def api_blog():
+    """Live-search JSON for blog.html: the same listing as /blog, as card metadata."""
+    listing = _blog_listing()
+    items = []
+    for post in listing['posts']:
+        item = {field: post.get(field) for field in BLOG_API_FIELDS}
+        if 'snippet' in post:
+            item['snippet'] = str(post['snippet'])
+        items.append(item)
+    return jsonify({'items': items, 'page': listing['page'], 'pages': listing['pages'],
+                    'total': listing['total']})
 
 @app.route('/blog/<post_id>')
 def blog_post(post_id):
@@ -1137,19 +1724,13 @@ def blog_post_by_slug(slug):
         if not post:
             flash('Blog post not found.', 'error')
             return redirect(url_for('blog'))
+        if post.get('slug') and post['slug'] != slug:
+            # Link to a title the post has since been renamed from.
+            return redirect(url_for('blog_post_by_slug', slug=post['slug']), code=301)
         
-        all_posts = blog_storage.get_all_blog_posts()
-        all_authors = list(set(p.get('author_name', '') for p in all_posts if p.get('author_name')))
-        all_authors.sort()
-        
-        all_tags = set()
-        for p in all_posts:
-            if p.get('tags'):
-                all_tags.update(p.get('tags'))
-        all_tags = sorted(list(all_tags))
-        
-        return render_template('blog_post.html', post=post, 
-                             all_authors=all_authors, all_tags=all_tags)
+        facets = blog_storage.get_blog_facets()
+        return render_template('blog_post.html', post=post,
+                             all_authors=list(facets['authors']), all_tags=list(facets['tags']))
     except Exception as e:
         flash(f'Error loading blog post: {str(e)}', 'error')
         return redirect(url_for('blog'))
@@ -1172,7 +1753,7 @@ def debug_blog_storage():
         <h2>Blog Storage Debug Info</h2>
         <p><strong>Total posts found:</strong> {len(posts)}</p>
         <p><strong>Storage bucket:</strong> {blog_storage.bucket_name}</p>
-        <p><strong>Blog file:</strong> {blog_storage.blog_blob_name}</p>
+        <p><strong>Blog manifest:</strong> {blog_storage.manifest_blob_name}</p>
         <p><strong>Environment:</strong> {'Production' if os.environ.get('GAE_ENV') else 'Local Development'}</p>
         <p><strong>Project ID:</strong> {os.environ.get('GOOGLE_CLOUD_PROJECT', 'Not set')}</p>
         <p><strong>Storage bucket env var:</strong> {os.environ.get('STORAGE_BUCKET', 'Not set')}</p>
@@ -1499,22 +2080,7 @@ Message:
 This message was sent from the Tech & Ethics Club contact form.
         """
         
-        sender_email = "techandethicsclub@gmail.com"
-        recipient_email = "techandethicsclub@gmail.com"
-        
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        msg['Subject'] = f"Contact Form: {subject} - {name}"
-        
-        msg.attach(MIMEText(email_body, 'plain'))
-        
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-        
-        email_password = os.environ.get('GMAIL_APP_PASSWORD')
-        
-        if not email_password:
+        if not contact_mail_queue.is_configured():
             print("=" * 50)
             print("CONTACT FORM SUBMISSION")
             print("=" * 50)
@@ -1522,7 +2088,7 @@ This message was sent from the Tech & Ethics Club contact form.
             print(f"Subject: {subject}")
             print(f"Message: {message}")
             print("=" * 50)
-            print("Email would be sent to:", recipient_email)
+            print("Email would be sent to:", CONTACT_RECIPIENT_EMAIL)
             print("=" * 50)
             print("⚠️  GMAIL_APP_PASSWORD not set - email not sent")
             print("=" * 50)
@@ -1530,29 +2096,15 @@ This message was sent from the Tech & Ethics Club contact form.
             flash('Thank you for your message! We will get back to you soon.', 'success')
             return redirect(url_for('contact'))
         
-        try:
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(sender_email, email_password)
-            server.send_message(msg)
-            server.quit()
-            
-            print(f"✅ Contact form email sent successfully to {recipient_email}")
-            
-        except smtplib.SMTPAuthenticationError:
-            print("❌ SMTP Authentication failed - check Gmail App Password")
-            flash('There was an error sending your message. Please try again or contact us directly.', 'error')
-            return redirect(url_for('contact'))
-        except Exception as e:
-            print(f"❌ SMTP Error: {str(e)}")
-            flash('There was an error sending your message. Please try again or contact us directly.', 'error')
-            return redirect(url_for('contact'))
+        # Delivery (SMTP login, retries) happens on the mail queue's sender thread.
+        message_id = contact_mail_queue.enqueue(CONTACT_RECIPIENT_EMAIL, f"Contact Form: {subject} - {name}", email_body)
+        print(f"✅ Contact form email queued ({message_id}) for {CONTACT_RECIPIENT_EMAIL}")
         
         flash('Thank you for your message! We will get back to you soon.', 'success')
         return redirect(url_for('contact'))
         
     except Exception as e:
-        print(f"Error sending contact form email: {str(e)}")
+        print(f"Error queuing contact form email: {str(e)}")
         flash('There was an error sending your message. Please try again or contact us directly.', 'error')
         return redirect(url_for('contact'))
 
@@ -1639,6 +2191,7 @@ class GalleryItem:
         self.has_slideshow = len(self.slideshow_images) > 0
         self.slideshow_title = item_data.get('slideshow_title')
         
+        self.media_status = item_data.get('media_status')  # 'processing' while uploaded images are optimized
         self.course_id = item_data.get('course_id')
         self.created_by = item_data.get('created_by')
         self.created_at = item_data.get('created_at')
@@ -1681,5 +2234,12 @@ class GalleryItem:
         self.is_mixed_media = self.has_videos and self.has_images
         self.has_multiple_creators = len(self.creators) > 1
 
+    def to_dict(self, fields=None):
+        """Normalized attributes as a JSON-safe dict, optionally limited to fields."""
+        data = vars(self)
+        if fields is None:
+            return dict(data)
+        return {field: data.get(field) for field in fields if field in data}
+
 if __name__ == '__main__':
     app.run(debug=False, port=5000) 
\ No newline at end of file
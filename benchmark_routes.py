@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot routes against synthetic data at realistic corpus sizes.
+
+Seeds an in-memory storage backend (see storage_backend.py) with gallery items,
+courses, users and blog posts, drives the Flask app through its test client and
+reports, per route and corpus size: p50/p95 latency, storage calls per request
+(by kind) and the peak Python memory allocated while serving one request.
+Nothing touches GCS or needs credentials. Each route stops after --budget-seconds
+of timed runs, so pathological routes at 10k report fewer iterations, not hang.
+
+Run from repo root:
+    python benchmark_routes.py                          # sizes 100, 1000, 10000
+    python benchmark_routes.py --sizes 100,1000 --iterations 50
+    python benchmark_routes.py --latency-ms 30          # simulate GCS round trips
+    python benchmark_routes.py --output bench.json --compare baseline.json
+
+Results are written as JSON (one record per size and route) so runs from two
+commits can be diffed with --compare. Synthetic items have no image URLs, so the
+PDF timings exclude image downloads.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Must be set before the app's storage singletons are created on import.
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+
+from werkzeug.security import generate_password_hash
+
+import storage_metrics
+from storage_backend import LatencyBackend, MemoryBackend
+
+DEFAULT_SIZES = (100, 1000, 10000)
+DEFAULT_ITERATIONS = 20
+# Stop timing a route once it has used this much wall time (pathological routes at 10k).
+DEFAULT_ROUTE_BUDGET_SECONDS = 60
+BENCH_PASSWORD = 'benchmark-password'
+# A regression is reported when p95 grows by more than this fraction.
+REGRESSION_THRESHOLD = 0.10
+
+TAG_POOL = ['ai', 'privacy', 'robotics', 'ethics', 'climate', 'health', 'education', 'security',
+            'data', 'vr', 'iot', 'fairness', 'policy', 'accessibility', 'web', 'mobile', 'games',
+            'biotech', 'energy', 'space', 'music', 'art', 'law', 'finance', 'social-media',
+            'surveillance', 'automation', 'open-source', 'hardware', 'ml']
+COUNTRIES = ['United States', 'Canada', 'India', 'United Kingdom', 'Germany', 'Brazil', 'Kenya', 'Japan']
+WORDS = ('technology ethics student project community data model privacy design system impact '
+         'research public policy future network learning open build club school users fairness').split()
+
+
+def _call_counts():
+    return {kind: values['count'] for kind, values in storage_metrics.process_totals().items()}
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _put_json(backend, name, data):
+    backend.put(name, json.dumps(data, default=str).encode('utf-8'), content_type='application/json')
+
+
+def seed_corpus(backend, size, seed=0):
+    """Write size gallery items, users and blog posts (plus size/20 courses). Returns lookup keys."""
+    rng = random.Random(seed)
+    start = datetime(2022, 1, 1)
+
+    courses = []
+    for i in range(max(3, size // 20)):
+        course = {'id': f'course-{i}', 'title': f'Course {i}', 'description': _sentence(rng, 20),
+                  'instructor': f'Instructor {i % 7}', 'course_code': f'CS{100 + i}', 'semester': 'Fall',
+                  'created_by': 'admin@example.com', 'created_at': (start + timedelta(days=i)).isoformat(),
+                  'is_active': True, 'project_count': 0}
+        _put_json(backend, f"courses/{course['id']}.json", course)
+        courses.append(course['id'])
+
+    gallery_ids = []
+    for i in range(size):
+        item_id = f'project-{i}'
+        creator = {'name': f'Student {i % 500}', 'email': f'student{i % 500}@example.com',
+                   'school': f'School {i % 40}', 'city': 'Springfield', 'state': 'CA',
+                   'country': rng.choice(COUNTRIES)}
+        item = {'id': item_id, 'title': f'Project {i}: {_sentence(rng, 4)}',
+                'description': _sentence(rng, 60), 'image_filename': None, 'image_url': None,
+                'creators': [creator], 'creator_name': creator['name'], 'creator_email': creator['email'],
+                'creator_school': creator['school'], 'creator_city': creator['city'],
+                'creator_state': creator['state'], 'creator_country': creator['country'],
+                'project_links': [{'url': f'https://example.com/{item_id}', 'title': 'Demo'}],
+                'tags': rng.sample(TAG_POOL, 3), 'additional_images': [], 'videos': [],
+                'course_id': rng.choice(courses) if rng.random() < 0.7 else None,
+                'created_by': 'admin@example.com', 'is_active': True,
+                'created_at': (start + timedelta(minutes=i * 37)).isoformat()}
+        _put_json(backend, f'gallery/{item_id}.json', item)
+        gallery_ids.append(item_id)
+
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    user_emails = []
+    for i in range(size):
+        email = f'user{i}@example.com'
+        user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        _put_json(backend, f'users/{user_id}.json', {'id': user_id, 'email': email, 'password_hash': password_hash,
+                                                     'is_admin': False, 'created_at': start.isoformat()})
+        user_emails.append(email)
+
+    summaries = []
+    slugs = []
+    for i in range(size):
+        created_at = (start + timedelta(hours=i * 5)).isoformat()
+        post = {'id': str(uuid.UUID(int=rng.getrandbits(128))), 'title': f'Post {i} {_sentence(rng, 5)}',
+                'slug': f'post-{i}', 'content': '\n\n'.join(_sentence(rng, 80) for _ in range(6)),
+                'author_email': f'author{i % 50}@example.com', 'author_name': f'Author {i % 50}',
+                'author_city': 'Springfield', 'author_state': 'CA', 'author_country': rng.choice(COUNTRIES),
+                'author_school': f'School {i % 40}', 'tags': rng.sample(TAG_POOL, 2),
+                'created_at': created_at, 'updated_at': created_at}
+        _put_json(backend, f"blog/posts/{post['id']}.json", post)
+        summaries.append({field: post.get(field) for field in (
+            'id', 'title', 'slug', 'author_email', 'author_name', 'author_city', 'author_state',
+            'author_country', 'author_school', 'tags', 'created_at', 'updated_at')})
+        slugs.append(post['slug'])
+    _put_json(backend, 'blog/manifest.json', {'posts': summaries, 'updated_at': datetime.now().isoformat()})
+    _put_json(backend, 'cis_news.json', [])
+
+    return {'gallery_ids': gallery_ids, 'user_emails': user_emails, 'slugs': slugs}
+
+
+def install_backend(backend):
+    """Point the app's storage singletons at backend and drop every in-process cache."""
+    import app as app_module
+    from blog_storage import BlogStorage, blog_storage
+    from cis_news_storage import cis_news_storage
+    from cloud_storage import cloud_storage
+
+    cloud_storage.backend = backend
+    cloud_storage.bucket_name = backend.bucket_name
+    cloud_storage._storage_available = True
+    cloud_storage._gallery_index_cache = None
+    cloud_storage._gallery_index_loaded_at = 0.0
+    cloud_storage._missing_ids.clear()
+    blog_storage.backend = backend
+    BlogStorage._post_cache.clear()
+    BlogStorage._manifest_cache = None
+    cis_news_storage.backend = backend
+    app_module.job_runner.backend = backend
+    app_module.contact_mail_queue.backend = backend
+
+
+def build_routes(keys, rng):
+    """(name, iterations_cap, request(client)) for every benchmarked route."""
+    def get(path_fn):
+        return lambda client: client.get(path_fn())
+
+    def login(client):
+        return client.post('/login', data={'email': rng.choice(keys['user_emails']), 'password': BENCH_PASSWORD})
+
+    return [
+        ('gallery', None, get(lambda: '/gallery')),
+        ('gallery_item', None, get(lambda: f"/gallery/{rng.choice(keys['gallery_ids'])}")),
+        ('blog', None, get(lambda: '/blog')),
+        ('blog_post', None, get(lambda: f"/blog/post/{rng.choice(keys['slugs'])}")),
+        ('login', None, login),
+        # PDFs are built by a background job; these time the request (queue, or send the stored export).
+        ('gallery_item_pdf', None, get(lambda: f"/gallery/{rng.choice(keys['gallery_ids'])}/pdf")),
+        ('gallery_pdf', 2, get(lambda: '/gallery/pdf')),
+    ]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _calls_between(before, after):
+    return {kind: after.get(kind, 0) - before.get(kind, 0)
+            for kind in after if after.get(kind, 0) - before.get(kind, 0)}
+
+
+def bench_route(app, name, request_fn, iterations, quiet, budget_seconds=DEFAULT_ROUTE_BUDGET_SECONDS):
+    sink = open(os.devnull, 'w') if quiet else None
+
+    def run():
+        client = app.test_client()
+        before = _call_counts()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+            response = request_fn(client)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return response.status_code, elapsed_ms, _calls_between(before, _call_counts())
+
+    try:
+        # The first request sees cold caches (index, post bodies); report it separately.
+        cold_status, cold_ms, cold_calls = run()
+
+        latencies = []
+        call_totals = {}
+        statuses = {}
+        deadline = time.perf_counter() + budget_seconds
+        for _ in range(iterations):
+            if latencies and time.perf_counter() > deadline:
+                break
+            status, elapsed_ms, calls = run()
+            latencies.append(elapsed_ms)
+            statuses[status] = statuses.get(status, 0) + 1
+            for kind, count in calls.items():
+                call_totals[kind] = call_totals.get(kind, 0) + count
+
+        # Separate pass: tracemalloc slows allocation-heavy code, so keep it out of the timings.
+        tracemalloc.start()
+        try:
+            run()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        if sink:
+            sink.close()
+
+    iterations = len(latencies)
+    by_kind = {kind: round(count / iterations, 2) for kind, count in sorted(call_totals.items())}
+    return {
+        'route': name,
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'cold_ms': round(cold_ms, 3),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'cold_status': cold_status,
+        'storage_calls': round(sum(call_totals.values()) / iterations, 2),
+        'storage_calls_by_kind': by_kind,
+        'cold_storage_calls': sum(cold_calls.values()),
+        'peak_memory_kb': round(peak_bytes / 1024, 1),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmarks(sizes, iterations, latency_ms=0.0, routes=None, quiet=True, seed=0,
+                   budget_seconds=DEFAULT_ROUTE_BUDGET_SECONDS):
+    if quiet:
+        logging.disable(logging.INFO)
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        from app import app
+    app.config['TESTING'] = True
+
+    results = []
+    for size in sizes:
+        print(f"\nSeeding {size} items / users / posts...")
+        memory = MemoryBackend('benchmark-bucket')
+        keys = seed_corpus(memory, size, seed)
+        inner = LatencyBackend(memory, latency_ms / 1000.0) if latency_ms else memory
+        install_backend(storage_metrics.InstrumentedBackend(inner))
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            from cloud_storage import cloud_storage
+            cloud_storage.rebuild_gallery_index()
+
+        rng = random.Random(seed)
+        for name, cap, request_fn in build_routes(keys, rng):
+            if routes and name not in routes:
+                continue
+            runs = min(iterations, cap) if cap else iterations
+            result = bench_route(app, name, request_fn, runs, quiet, budget_seconds)
+            result['size'] = size
+            results.append(result)
+            print(f"  {name:<18} p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+                  f"calls {result['storage_calls']:>8}  peak {result['peak_memory_kb']:>9.1f}KB  "
+                  f"status {','.join(result['statuses'])}")
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': list(sizes),
+            'iterations': iterations,
+            'latency_ms': latency_ms,
+            'route_budget_seconds': budget_seconds,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Print p95 and storage-call deltas per (size, route); returns the number of regressions."""
+    previous = {(r['size'], r['route']): r for r in baseline.get('results', [])}
+    regressions = 0
+    print(f"\nCompared with {baseline.get('meta', {}).get('commit') or 'baseline'}:")
+    for result in current['results']:
+        old = previous.get((result['size'], result['route']))
+        if not old:
+            continue
+        p95_change = (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0.0
+        calls_change = result['storage_calls'] - old['storage_calls']
+        regressed = p95_change > threshold or calls_change > 0
+        regressions += regressed
+        print(f"  {'REGRESSION ' if regressed else ''}{result['size']:>6} {result['route']:<18} "
+              f"p95 {old['p95_ms']:.2f} -> {result['p95_ms']:.2f}ms ({p95_change:+.0%})  "
+              f"calls {old['storage_calls']} -> {result['storage_calls']}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma-separated corpus sizes')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS, help='timed requests per route')
+    parser.add_argument('--routes', help='comma-separated subset of routes to run')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='injected delay per storage operation')
+    parser.add_argument('--budget-seconds', type=float, default=DEFAULT_ROUTE_BUDGET_SECONDS,
+                        help='stop timing a route after this much wall time (at least one run)')
+    parser.add_argument('--output', default='benchmark_results.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='p95 growth (fraction) that --compare reports as a regression')
+    parser.add_argument('--verbose', action='store_true', help="keep the app's own log output")
+    args = parser.parse_args()
+    try:
+        sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+        routes = set(args.routes.split(',')) if args.routes else None
+        report = run_benchmarks(sizes, args.iterations, args.latency_ms, routes, quiet=not args.verbose,
+                                budget_seconds=args.budget_seconds)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {len(report['results'])} results to {args.output}")
+        if args.compare:
+            with open(args.compare) as f:
+                if compare_results(json.load(f), report, args.threshold):
+                    sys.exit(2)
+    except Exception as e:
+        print(f"\n✗ Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
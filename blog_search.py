@@ -0,0 +1,282 @@
+"""
+BM25 ranking for blog search over a precomputed term-statistics index.
+
+The index is plain JSON (BlogStorage keeps it at blog/search_index.json and
+updates it on every post write):
+
+    {'docs': {post_id: {'tf': {field: {term: count}}, 'len': {field: terms},
+                        'heading': title/tags/author tokens}},
+     'df': {term: posts containing it in any field},
+     'field_lengths': {field: total terms across posts},
+     'version': SEARCH_INDEX_VERSION}
+
+add_document/remove_document keep df and field_lengths in step with docs, so
+ranking only reads the index: no post bodies are loaded or re-tokenised. Scoring
+is BM25F: per-field term frequencies are length-normalised, weighted
+(SEARCH_FIELD_WEIGHTS, overridable with BLOG_SEARCH_WEIGHTS="title=3,body=1")
+and saturated once per term; the last query word also matches as a prefix, so
+results keep up with a search box as it is typed. Body text stays out of the index; the caller builds
+snippets (the body passage with the most query terms, HTML-escaped, matches in
+<mark>) from the bodies of the hits it returns.
+"""
+
+import heapq
+import math
+import os
+import re
+from collections import namedtuple
+
+from markupsafe import Markup, escape
+
+SEARCH_FIELDS = ('title', 'tags', 'author', 'body')
+DEFAULT_FIELD_WEIGHTS = {'title': 3.0, 'tags': 2.0, 'author': 1.5, 'body': 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+BLOG_SEARCH_TOP_K = 20
+# The last query word also matches the commonest PREFIX_EXPANSIONS indexed terms it starts
+# ("priv" -> "privacy", "private"), once it is at least PREFIX_MIN_CHARS long.
+PREFIX_MIN_CHARS = 2
+PREFIX_EXPANSIONS = 10
+SNIPPET_CHARS = 180
+# Bumped when entries change shape; older indexes are rebuilt on first read.
+SEARCH_INDEX_VERSION = 2
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+_SPLIT_RE = re.compile(r'([^\W_]+)')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+|\n{2,}')
+
+
+def _weights_from_env():
+    weights = dict(DEFAULT_FIELD_WEIGHTS)
+    for pair in os.environ.get('BLOG_SEARCH_WEIGHTS', '').split(','):
+        field, _, value = pair.partition('=')
+        if field.strip() in weights:
+            try:
+                weights[field.strip()] = float(value)
+            except ValueError:
+                pass
+    return weights
+
+
+SEARCH_FIELD_WEIGHTS = _weights_from_env()
+
+# hits: [(post_id, score)] for the requested ranks; total: every matching post;
+# terms: the indexed terms the query matched, for highlighting.
+SearchResults = namedtuple('SearchResults', ['hits', 'total', 'terms'])
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def query_terms(query):
+    """Distinct query tokens, in query order."""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def plain_text(markdown):
+    """Post body without the markdown markup the editor allows (headings, emphasis, links)."""
+    text = re.sub(r'!?\[([^\]]*)\]\([^)]*\)', r'\1', markdown or '')
+    text = re.sub(r'^\s{0,3}(#{1,6}|>|[-*+]|\d+\.)\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*([-*_]\s*){3,}$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'[*_`~]+', '', text)
+    return text
+
+
+def split_passages(text, max_chars=SNIPPET_CHARS):
+    """Whole sentences packed into passages of at most max_chars (long sentences are cut at a word)."""
+    passages, current = [], ''
+    for sentence in _SENTENCE_RE.split(text):
+        sentence = ' '.join(sentence.split())
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                passages.append(current)
+                current = ''
+            passages.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            passages.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        passages.append(current)
+    return passages
+
+
+def _term_counts(tokens):
+    counts = {}
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    return counts
+
+
+def document_entry(post):
+    """Index entry for one post: per-field term frequencies and field lengths."""
+    field_tokens = {
+        'title': tokenize(post.get('title')),
+        'tags': [token for tag in post.get('tags') or [] for token in tokenize(tag)],
+        'author': tokenize(post.get('author_name')),
+        'body': tokenize(plain_text(post.get('content'))),
+    }
+    return {
+        'tf': {field: _term_counts(tokens) for field, tokens in field_tokens.items()},
+        'len': {field: len(tokens) for field, tokens in field_tokens.items()},
+        # Title, author and tag tokens; ' | ' keeps exact phrases from spanning fields.
+        'heading': ' | '.join(' '.join(tokens) for field, tokens in field_tokens.items() if field != 'body'),
+    }
+
+
+def empty_index():
+    return {'docs': {}, 'df': {}, 'field_lengths': {field: 0 for field in SEARCH_FIELDS},
+            'version': SEARCH_INDEX_VERSION}
+
+
+def _doc_terms(entry):
+    return set(term for counts in entry['tf'].values() for term in counts)
+
+
+def remove_document(index, post_id):
+    entry = index['docs'].pop(post_id, None)
+    if entry is None:
+        return False
+    df = index['df']
+    for term in _doc_terms(entry):
+        remaining = df.get(term, 0) - 1
+        if remaining > 0:
+            df[term] = remaining
+        else:
+            df.pop(term, None)
+    for field, length in entry['len'].items():
+        index['field_lengths'][field] = max(0, index['field_lengths'].get(field, 0) - length)
+    return True
+
+
+def add_document(index, post):
+    """Insert or replace post in index, keeping df and field_lengths consistent."""
+    remove_document(index, post['id'])
+    entry = document_entry(post)
+    index['docs'][post['id']] = entry
+    df = index['df']
+    for term in _doc_terms(entry):
+        df[term] = df.get(term, 0) + 1
+    for field, length in entry['len'].items():
+        index['field_lengths'][field] = index['field_lengths'].get(field, 0) + length
+    return entry
+
+
+def _highlight(passage, terms):
+    parts = _SPLIT_RE.split(passage)
+    return Markup(''.join(
+        Markup('<mark>%s</mark>') % part if index % 2 and part.lower() in terms else escape(part)
+        for index, part in enumerate(parts)
+    ))
+
+
+def snippet(post, terms):
+    """The body passage of post with the most distinct query terms (else the first), highlighted."""
+    passages = split_passages(plain_text((post or {}).get('content')))
+    if not passages:
+        return Markup('')
+    best, best_hits = 0, 0
+    for position, passage in enumerate(passages):
+        hits = len(terms.intersection(tokenize(passage)))
+        if hits > best_hits:
+            best, best_hits = position, hits
+    text = _highlight(passages[best], terms)
+    if best > 0:
+        text = Markup('…') + text
+    if best < len(passages) - 1:
+        text = text + Markup('…')
+    return text
+
+
+def _contains_phrase(entry, post_id, phrase_tokens, load_body=None):
+    """True if phrase_tokens appear consecutively in the title, author, a tag or the body (via load_body)."""
+    doc_terms = _doc_terms(entry)
+    if any(token not in doc_terms for token in phrase_tokens):
+        return False
+    needle = f" {' '.join(phrase_tokens)} "
+    if needle in f" {entry.get('heading', '')} ":
+        return True
+    if load_body is None:
+        return False
+    return needle in f" {' '.join(tokenize(plain_text(load_body(post_id))))} "
+
+
+def _expand_prefix(df, prefix):
+    """Indexed terms starting with prefix, the word itself first, then by document frequency."""
+    if len(prefix) < PREFIX_MIN_CHARS:
+        return [prefix]
+    completions = [term for term in df if term.startswith(prefix)]
+    return heapq.nlargest(PREFIX_EXPANSIONS, completions, key=lambda term: (term == prefix, df[term])) or [prefix]
+
+
+def _term_score(entry, term, term_idf, weights, avg_lengths):
+    """BM25F contribution of one term: field tfs length-normalised, weighted, then saturated once."""
+    weighted_tf = 0.0
+    for field in SEARCH_FIELDS:
+        weight = weights.get(field, 0.0)
+        tf = entry['tf'].get(field, {}).get(term)
+        if not tf or not weight:
+            continue
+        norm = 1 - BM25_B + BM25_B * entry['len'].get(field, 0) / avg_lengths[field]
+        weighted_tf += weight * tf / norm
+    if not weighted_tf:
+        return 0.0
+    return term_idf * weighted_tf * (BM25_K1 + 1) / (weighted_tf + BM25_K1)
+
+
+def search(index, query, limit=BLOG_SEARCH_TOP_K, offset=0, weights=None, candidate_ids=None, exact=False,
+           load_body=None):
+    """
+    SearchResults for query: hits are (post_id, score) at ranks offset..offset+limit,
+    best first, and total counts every matching post.
+
+    Unless exact, the last word also matches as a prefix; a post scores its best
+    completion. candidate_ids restricts scoring to those posts (author/tag
+    filters). With exact, only posts containing the query words as a consecutive
+    phrase count; load_body(post_id) returns a post's markdown for the phrase
+    check, and is only called for posts that contain every word but not in their
+    heading. weights default to SEARCH_FIELD_WEIGHTS; a field weighted 0 is not
+    searched.
+    """
+    words = query_terms(query)
+    docs = index.get('docs', {})
+    if not words or not docs:
+        return SearchResults([], 0, [])
+    weights = weights or SEARCH_FIELD_WEIGHTS
+    df = index.get('df', {})
+    doc_count = len(docs)
+    field_lengths = index.get('field_lengths', {})
+    avg_lengths = {field: (field_lengths.get(field, 0) / doc_count) or 1.0 for field in SEARCH_FIELDS}
+    # One slot per query word; only the last (when not exact) holds several candidate terms.
+    slots = [[word] for word in words]
+    if not exact:
+        slots[-1] = _expand_prefix(df, words[-1])
+    idf = {term: math.log(1 + (doc_count - df[term] + 0.5) / (df[term] + 0.5))
+           for slot in slots for term in slot if df.get(term)}
+    slots = [[term for term in slot if term in idf] for slot in slots]
+    slots = [slot for slot in slots if slot]
+    if not slots:
+        return SearchResults([], 0, [])
+
+    scored = []
+    for post_id, entry in docs.items():
+        if candidate_ids is not None and post_id not in candidate_ids:
+            continue
+        score = sum(max(_term_score(entry, term, idf[term], weights, avg_lengths) for term in slot)
+                    for slot in slots)
+        if score <= 0:
+            continue
+        if exact and not _contains_phrase(entry, post_id, tokenize(query), load_body):
+            continue
+        scored.append((score, post_id))
+
+    ranked = heapq.nlargest(offset + limit, scored)[offset:]
+    return SearchResults([(post_id, score) for score, post_id in ranked], len(scored),
+                         [term for slot in slots for term in slot])
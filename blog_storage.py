@@ -1,63 +1,293 @@
+"""
+Blog posts in GCS: one blob per post under blog/posts/<id>.json plus a compact
+summary manifest (blog/manifest.json) used for listings, slug lookups and ids.
+Manifest summaries carry a short excerpt and are kept newest-first, so a listing
+page is a slice of the manifest and never loads post bodies. The manifest also
+holds facet indexes, by_author and by_tag ({name: [post ids, newest first]}),
+updated with each summary, so filter options, their counts and filtered
+listings are lookups. by_slug maps current slugs to ids and slug_history keeps
+every slug a post has been renamed away from, so old links still resolve.
+The parsed manifest and an id -> summary map are cached per blob generation.
 
+The legacy single-file layout (blog_posts.json) is migrated once, on first read
+or via migrate_blog_posts.py, and left in place as a backup.
 
+Search reads blog/search_index.json, BM25 term statistics (see blog_search) that
+add/update/delete keep current; it is rebuilt from the posts if missing or
+outdated, and the parsed index is cached per blob generation. Snippets come from
+the bodies of the returned hits only.
+
+Writes are lock-free: every read-modify-write goes through generation
+preconditions (storage_concurrency), so concurrent instances cannot lose updates.
+"""
+
+import bisect
 import os
 import json
 import uuid
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from google.cloud import storage
-import threading
+from google.api_core.exceptions import PreconditionFailed
+
+import blog_search
+from metrics import record_cache_lookup
+from storage_backend import STORAGE_IO_WORKERS, create_storage_backend
+from storage_metrics import bind_request_stats
+from storage_concurrency import (
+    MAX_WRITE_ATTEMPTS, WriteConflictError, backoff_sleep, read_json_with_generation,
+    update_json, write_json_if_generation
+)
+
+# Fields copied from each post into the manifest; bodies stay in the per-post blob.
+BLOG_SUMMARY_FIELDS = ('id', 'title', 'slug', 'author_email', 'author_name', 'author_city',
+                       'author_state', 'author_country', 'author_school', 'tags',
+                       'created_at', 'updated_at')
+BLOG_FETCH_WORKERS = STORAGE_IO_WORKERS
+BLOG_EXCERPT_CHARS = 300
+BLOG_PAGE_SIZE = 10
+# Bumped when summaries gain derived fields; older manifests are upgraded on first read.
+BLOG_MANIFEST_VERSION = 4
+
+
+def _post_summary(post):
+    summary = {field: post.get(field) for field in BLOG_SUMMARY_FIELDS}
+    content = post.get('content') or ''
+    summary['excerpt'] = content[:BLOG_EXCERPT_CHARS] + ('...' if len(content) > BLOG_EXCERPT_CHARS else '')
+    return summary
+
+
+def _sort_summaries(summaries):
+    summaries.sort(key=lambda summary: summary.get('created_at') or '', reverse=True)
+
+
+def _new_manifest():
+    return {'posts': [], 'by_author': {}, 'by_tag': {}, 'by_slug': {}, 'slug_history': {},
+            'version': BLOG_MANIFEST_VERSION}
+
+
+def _facet_keys(summary):
+    keys = [('by_author', summary['author_name'])] if summary.get('author_name') else []
+    keys += [('by_tag', tag) for tag in dict.fromkeys(summary.get('tags') or []) if tag]
+    return keys
+
+
+def _unindex_summary(manifest, summary):
+    for index_name, key in _facet_keys(summary):
+        ids = manifest.setdefault(index_name, {}).get(key)
+        if ids and summary['id'] in ids:
+            ids.remove(summary['id'])
+            if not ids:
+                del manifest[index_name][key]
+
+
+def _index_summary(manifest, summary):
+    """Add summary (already placed in manifest['posts']) to its author and tag lists, in post order."""
+    keys = _facet_keys(summary)
+    if not keys:
+        return
+    rank = {post.get('id'): position for position, post in enumerate(manifest['posts'])}
+    for index_name, key in keys:
+        ids = manifest.setdefault(index_name, {}).setdefault(key, [])
+        if summary['id'] not in ids:
+            bisect.insort(ids, summary['id'], key=lambda post_id: rank.get(post_id, len(rank)))
+
+
+def _rebuild_facets(manifest):
+    manifest['by_author'], manifest['by_tag'] = {}, {}
+    for summary in manifest['posts']:
+        for index_name, key in _facet_keys(summary):
+            manifest[index_name].setdefault(key, []).append(summary['id'])
+
+
+def _rebuild_slug_map(manifest):
+    """by_slug from the summaries; slug_history is kept (it cannot be recomputed)."""
+    manifest['by_slug'] = {summary['slug']: summary['id'] for summary in manifest['posts'] if summary.get('slug')}
+    history = manifest.setdefault('slug_history', {})
+    for slug in manifest['by_slug']:
+        history.pop(slug, None)
+
+
+def _set_slug(manifest, post_id, old_slug, new_slug):
+    """Point new_slug at post_id; a replaced slug moves to slug_history so links to it keep working."""
+    by_slug = manifest.setdefault('by_slug', {})
+    history = manifest.setdefault('slug_history', {})
+    if old_slug and old_slug != new_slug and by_slug.get(old_slug) == post_id:
+        del by_slug[old_slug]
+        history[old_slug] = post_id
+    if new_slug:
+        by_slug[new_slug] = post_id
+        history.pop(new_slug, None)
+
 
 class BlogStorage:
     _shared_data = None
-    _shared_blob = None
-    _lock = threading.Lock()
+    # post id -> (updated_at, post); bodies are reused while the manifest says they're current
+    _post_cache = {}
+    # (manifest generation, manifest, {post id: summary}); callers must not mutate what it returns
+    _manifest_cache = None
+    # (search index generation, parsed index); read-only, like _manifest_cache
+    _search_index_cache = None
     
-    def __init__(self):
+    def __init__(self, backend=None):
         self.bucket_name = os.environ.get('STORAGE_BUCKET', 'tech-ethics-club-uploads')
-        self.blog_blob_name = 'blog_posts.json'
+        self.blog_blob_name = 'blog_posts.json'  # legacy single-file layout, read only by the migration
+        self.manifest_blob_name = 'blog/manifest.json'
+        self.post_prefix = 'blog/posts/'
+        self.search_index_blob_name = 'blog/search_index.json'
         self.process_id = os.getpid()
         
         try:
-            if os.path.exists('tech-ethics-club-sa-key.json'):
-                self.client = storage.Client.from_service_account_json('tech-ethics-club-sa-key.json')
-            else:
-                self.client = storage.Client()
-            
-            self.bucket = self.client.bucket(self.bucket_name)
-            
-            if BlogStorage._shared_blob is None:
-                BlogStorage._shared_blob = self.bucket.blob(self.blog_blob_name)
-            
-            self._blog_blob = BlogStorage._shared_blob
-            
+            self.backend = backend or create_storage_backend(self.bucket_name)
+            self.bucket_name = self.backend.bucket_name
         except Exception as e:
             print(f"Error initializing blog storage: {e}")
             raise
     
-    def _get_blog_blob(self):
-        return self._blog_blob
+    def _post_blob_name(self, post_id):
+        return f"{self.post_prefix}{post_id}.json"
     
-    def _load_blog_posts(self):
-        with self._lock:
+    def _load_legacy_blog_posts(self):
+        posts, generation = read_json_with_generation(self.backend, self.blog_blob_name, list)
+        return posts if isinstance(posts, list) else []
+    
+    def migrate_to_per_post_blobs(self):
+        """One-shot copy of blog_posts.json into per-post blobs plus a manifest."""
+        try:
+            if self.backend.exists(self.manifest_blob_name):
+                print(f"📝 {self.manifest_blob_name} already exists; nothing to migrate")
+                return False
+            
+            posts = self._load_legacy_blog_posts()
+            for post in posts:
+                self._write_post(post)
+            manifest = _new_manifest()
+            manifest['posts'] = [_post_summary(post) for post in posts]
+            _sort_summaries(manifest['posts'])
+            _rebuild_facets(manifest)
+            _rebuild_slug_map(manifest)
+            manifest['updated_at'] = datetime.now().isoformat()
+            # Create-only: if another instance migrated first, keep its manifest.
+            write_json_if_generation(self.backend, self.manifest_blob_name, manifest, 0)
+            print(f"✅ [PID:{self.process_id}] Migrated {len(posts)} blog posts to {self.post_prefix}")
+            return True
+        except PreconditionFailed:
+            print(f"📝 {self.manifest_blob_name} was created concurrently; nothing to migrate")
+            return False
+        except Exception as e:
+            print(f"❌ Error migrating blog posts: {e}")
+            return False
+    
+    def _load_manifest_indexed(self):
+        """
+        (manifest, {post id: summary}); migrates the legacy file and upgrades old
+        manifests on first use. Reuses the parsed manifest while its generation is unchanged.
+        """
+        for attempt in range(2):
             try:
-                blob = self._get_blog_blob()
-                if blob.exists():
-                    content = blob.download_as_text()
-                    posts = json.loads(content)
-                    print(f"✅ [PID:{self.process_id}] Loaded {len(posts)} blog posts from {self.bucket_name}/{self.blog_blob_name}")
-                    return posts
+                found = self.backend.get(self.manifest_blob_name)
+                if found is None:
+                    data, generation = None, 0
                 else:
-                    print(f"📝 No blog posts file found at {self.bucket_name}/{self.blog_blob_name}")
-                    initial_posts = []
-                    blob = self._get_blog_blob()
-                    content = json.dumps(initial_posts, indent=2, default=str)
-                    blob.upload_from_string(content, content_type='application/json')
-                    print(f"✅ [PID:{self.process_id}] Created initial blog posts file")
-                    return initial_posts
+                    content, generation = found
+                    cached = BlogStorage._manifest_cache
+                    if cached and cached[0] == generation:
+                        record_cache_lookup('blog_manifest', True)
+                        return cached[1], cached[2]
+                    record_cache_lookup('blog_manifest', False)
+                    data = json.loads(content)
             except Exception as e:
-                print(f"❌ Error loading blog posts from {self.bucket_name}/{self.blog_blob_name}: {e}")
-                return []
+                print(f"❌ Error loading blog manifest from {self.bucket_name}/{self.manifest_blob_name}: {e}")
+                return _new_manifest(), {}
+            if generation:
+                by_id = {summary.get('id'): summary for summary in data.get('posts', [])}
+                if data.get('version', 1) < BLOG_MANIFEST_VERSION:
+                    data = self._upgrade_manifest(data)
+                    by_id = {summary.get('id'): summary for summary in data.get('posts', [])}
+                else:
+                    BlogStorage._manifest_cache = (generation, data, by_id)
+                print(f"✅ [PID:{self.process_id}] Loaded {len(data.get('posts', []))} blog post summaries from {self.bucket_name}/{self.manifest_blob_name}")
+                return data, by_id
+            if attempt == 0:
+                print(f"📝 No blog manifest found at {self.bucket_name}/{self.manifest_blob_name}")
+                self.migrate_to_per_post_blobs()
+        return _new_manifest(), {}
+    
+    def _load_manifest_data(self):
+        """The whole manifest dict (summaries plus facet and slug indexes)."""
+        return self._load_manifest_indexed()[0]
+    
+    def _load_manifest(self):
+        """Summaries of all posts, newest first."""
+        return self._load_manifest_data().get('posts', [])
+    
+    def _upgrade_manifest(self, data):
+        """Recompute every summary from its post once, for manifests written before BLOG_MANIFEST_VERSION."""
+        with ThreadPoolExecutor(max_workers=BLOG_FETCH_WORKERS) as executor:
+            posts = list(executor.map(bind_request_stats(self._load_post), data.get('posts', [])))
+        fresh = {post['id']: _post_summary(post) for post in posts if post}
+        
+        def apply(manifest):
+            if manifest.get('version', 1) >= BLOG_MANIFEST_VERSION:
+                return False
+            summaries = manifest.setdefault('posts', [])
+            summaries[:] = [fresh.get(summary.get('id'), summary) for summary in summaries]
+            _sort_summaries(summaries)
+            _rebuild_facets(manifest)
+            _rebuild_slug_map(manifest)
+            manifest['version'] = BLOG_MANIFEST_VERSION
+            manifest['updated_at'] = datetime.now().isoformat()
+            return manifest
+        
+        upgraded = update_json(self.backend, self.manifest_blob_name, apply, _new_manifest)
+        if not upgraded:
+            # Another instance upgraded it first.
+            upgraded, generation = read_json_with_generation(self.backend, self.manifest_blob_name, _new_manifest)
+        print(f"✅ [PID:{self.process_id}] Upgraded blog manifest to version {BLOG_MANIFEST_VERSION}")
+        return upgraded
+    
+    def _update_manifest(self, mutate):
+        """Apply mutate(manifest) under a generation precondition; mutate keeps the facet indexes in step."""
+        def apply(manifest):
+            manifest.setdefault('posts', [])
+            result = mutate(manifest)
+            manifest['updated_at'] = datetime.now().isoformat()
+            return result
+        return update_json(self.backend, self.manifest_blob_name, apply, _new_manifest)
+    
+    def _write_post(self, post, if_generation_match=None):
+        self.backend.put(self._post_blob_name(post['id']), json.dumps(post, default=str).encode('utf-8'),
+                         content_type='application/json', if_generation_match=if_generation_match)
+        BlogStorage._post_cache[post['id']] = (post.get('updated_at'), post)
+    
+    def _load_post(self, summary):
+        """Full post for a manifest entry, served from the in-process cache when current."""
+        post_id = summary.get('id')
+        cached = BlogStorage._post_cache.get(post_id)
+        if cached and cached[0] == summary.get('updated_at'):
+            record_cache_lookup('blog_post', True)
+            return cached[1]
+        record_cache_lookup('blog_post', False)
+        try:
+            found = self.backend.get(self._post_blob_name(post_id))
+            if found is None:
+                print(f"❌ Blog post {post_id} is in the manifest but its blob is missing")
+                return None
+            post = json.loads(found[0])
+            BlogStorage._post_cache[post_id] = (post.get('updated_at'), post)
+            return post
+        except Exception as e:
+            print(f"❌ Error loading blog post {post_id}: {e}")
+            return None
+    
+    def _load_blog_posts(self):
+        """All full posts. Uncached bodies are fetched concurrently."""
+        summaries = self._load_manifest()
+        if not summaries:
+            return []
+        with ThreadPoolExecutor(max_workers=BLOG_FETCH_WORKERS) as executor:
+            posts = list(executor.map(bind_request_stats(self._load_post), summaries))
+        return [post for post in posts if post]
     
     def _generate_slug(self, title):
         slug = title.lower()
@@ -66,40 +296,29 @@ class BlogStorage:
         slug = slug.strip('-')
         return slug
     
-    def _save_blog_posts(self, blog_posts):
-        with self._lock:
-            try:
-                if not blog_posts:
-                    print("❌ Cannot save empty blog posts - this prevents data corruption")
-                    return False
-                
-                blob = self._get_blog_blob()
-                content = json.dumps(blog_posts, indent=2, default=str)
-                blob.upload_from_string(content, content_type='application/json')
-                
-                print(f"✅ [PID:{self.process_id}] Saved {len(blog_posts)} blog posts to {self.bucket_name}/{self.blog_blob_name}")
-                return True
-                            
-            except Exception as e:
-                print(f"❌ Error saving blog posts to {self.bucket_name}/{self.blog_blob_name}: {e}")
-                return False
+    def _unique_slug(self, title, manifest, post_id=None):
+        """Slug for title not used by another post now or in its slug history."""
+        by_slug = manifest.get('by_slug', {})
+        history = manifest.get('slug_history', {})
+        
+        def taken(candidate):
+            owner = by_slug.get(candidate) or history.get(candidate)
+            return owner is not None and owner != post_id
+        
+        slug = self._generate_slug(title)
+        counter = 1
+        original_slug = slug
+        while taken(slug):
+            slug = f"{original_slug}-{counter}"
+            counter += 1
+        return slug
     
     def add_blog_post(self, title, content, author_email, author_name, author_city=None, author_state=None, author_country=None, author_school=None, tags=None):
         try:
-            blog_posts = self._load_blog_posts()
-            
-            slug = self._generate_slug(title)
-            
-            counter = 1
-            original_slug = slug
-            while any(post.get('slug') == slug for post in blog_posts):
-                slug = f"{original_slug}-{counter}"
-                counter += 1
-            
             new_post = {
                 'id': str(uuid.uuid4()),
                 'title': title,
-                'slug': slug,
+                'slug': self._unique_slug(title, self._load_manifest_data()),
                 'content': content,
                 'author_email': author_email,
                 'author_name': author_name,
@@ -111,84 +330,180 @@ class BlogStorage:
                 'created_at': datetime.now().isoformat(),
                 'updated_at': datetime.now().isoformat()
             }
+            # Post first (create-only), so the manifest never points at a missing blob.
+            self._write_post(new_post, if_generation_match=0)
+            written_slug = new_post['slug']
             
-            if not blog_posts and not new_post:
-                print("❌ Cannot save empty blog posts")
-                return None
-                
-            blog_posts.append(new_post)
+            def add_summary(manifest):
+                summaries = manifest['posts']
+                new_post['slug'] = self._unique_slug(title, manifest)
+                summary = _post_summary(new_post)
+                summaries.insert(0, summary)
+                _sort_summaries(summaries)
+                _index_summary(manifest, summary)
+                _set_slug(manifest, new_post['id'], None, new_post['slug'])
+                return True
             
-            if self._save_blog_posts(blog_posts):
-                return new_post
-            else:
-                return None
+            try:
+                self._update_manifest(add_summary)
+            except Exception:
+                self._discard_unlisted_post(new_post['id'])
+                raise
+            if new_post['slug'] != written_slug:
+                # Someone claimed the slug between our read and the manifest write.
+                self._write_post(new_post)
+            self._update_search_index(post=new_post)
+            print(f"✅ [PID:{self.process_id}] Added blog post {new_post['id']}")
+            return new_post
                 
         except Exception as e:
             print(f"Error adding blog post: {e}")
             return None
     
+    def _discard_unlisted_post(self, post_id):
+        """Best-effort delete of a post blob the manifest never came to reference."""
+        try:
+            self.backend.delete(self._post_blob_name(post_id))
+        except Exception as e:
+            # Left behind, the orphan sweep keeps it: it looks like any other post blob.
+            print(f"⚠️ Could not delete unlisted blob for blog post {post_id}: {e}")
+        BlogStorage._post_cache.pop(post_id, None)
+    
     def get_all_blog_posts(self):
+        """Every full post, newest first. Loads all bodies; listings should use get_blog_post_page."""
         try:
-            blog_posts = self._load_blog_posts()
-            blog_posts.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-            return blog_posts
+            return self._load_blog_posts()
         except Exception as e:
             print(f"Error getting blog posts: {e}")
             return []
     
-    def get_blog_post_by_id(self, post_id):
+    def get_blog_post_summaries(self):
+        """Manifest entries (no content), newest first; for pages that only need titles."""
+        try:
+            return self._load_manifest()
+        except Exception as e:
+            print(f"Error getting blog post summaries: {e}")
+            return []
+    
+    def get_blog_post_page(self, page=1, per_page=BLOG_PAGE_SIZE, author=None, tag=None):
+        """
+        One page of post summaries (metadata and excerpt, no content), newest first.
+        
+        author/tag keep only that author name / tag. Returns {'posts', 'page', 'pages',
+        'total'}; page is clamped to the available range.
+        """
         try:
-            blog_posts = self._load_blog_posts()
-            for post in blog_posts:
-                if post.get('id') == post_id:
-                    return post
+            manifest, by_id = self._load_manifest_indexed()
+        except Exception as e:
+            print(f"Error getting blog post page: {e}")
+            manifest, by_id = _new_manifest(), {}
+        summaries = manifest.get('posts', [])
+        filtered_ids = self._filtered_ids(manifest, author, tag)
+        total = len(summaries) if filtered_ids is None else len(filtered_ids)
+        pages = max(1, -(-total // per_page))
+        page = min(max(1, page), pages)
+        start = (page - 1) * per_page
+        if filtered_ids is None:
+            page_posts = summaries[start:start + per_page]
+        else:
+            page_posts = [by_id[post_id] for post_id in filtered_ids[start:start + per_page] if post_id in by_id]
+        return {'posts': page_posts, 'page': page, 'pages': pages, 'total': total}
+    
+    @staticmethod
+    def _filtered_ids(manifest, author=None, tag=None):
+        """Post ids (newest first) with that author and/or tag from the facet indexes; None if unfiltered."""
+        if not author and not tag:
             return None
+        ids = manifest.get('by_author', {}).get(author, []) if author else None
+        if tag:
+            tagged = manifest.get('by_tag', {}).get(tag, [])
+            if ids is None:
+                ids = tagged
+            else:
+                tagged = set(tagged)
+                ids = [post_id for post_id in ids if post_id in tagged]
+        return ids
+    
+    def get_blog_facets(self):
+        """{'authors': {name: post count}, 'tags': {tag: post count}}, each sorted by name."""
+        try:
+            manifest = self._load_manifest_data()
+        except Exception as e:
+            print(f"Error getting blog facets: {e}")
+            return {'authors': {}, 'tags': {}}
+        return {
+            'authors': {name: len(ids) for name, ids in sorted(manifest.get('by_author', {}).items())},
+            'tags': {tag: len(ids) for tag, ids in sorted(manifest.get('by_tag', {}).items())},
+        }
+    
+    def get_blog_post_by_id(self, post_id):
+        try:
+            manifest, by_id = self._load_manifest_indexed()
+            summary = by_id.get(post_id)
+            return self._load_post(summary) if summary else None
         except Exception as e:
             print(f"Error getting blog post: {e}")
             return None
     
     def get_blog_post_by_slug(self, slug):
+        """Post whose current or former slug is slug; compare post['slug'] to spot an old link."""
         try:
-            blog_posts = self._load_blog_posts()
-            for post in blog_posts:
-                if post.get('slug') == slug:
-                    return post
-            return None
+            manifest, by_id = self._load_manifest_indexed()
+            post_id = manifest.get('by_slug', {}).get(slug) or manifest.get('slug_history', {}).get(slug)
+            summary = by_id.get(post_id) if post_id else None
+            return self._load_post(summary) if summary else None
         except Exception as e:
             print(f"Error getting blog post by slug: {e}")
             return None
     
     def update_blog_post(self, post_id, title, content, author_name, author_city=None, author_state=None, author_country=None, author_school=None, tags=None):
         try:
-            blog_posts = self._load_blog_posts()
+            for attempt in range(MAX_WRITE_ATTEMPTS):
+                post, generation = read_json_with_generation(self.backend, self._post_blob_name(post_id), dict)
+                if not generation:
+                    return None
+                
+                if post.get('title') != title:
+                    post['slug'] = self._unique_slug(title, self._load_manifest_data(), post_id)
+                post['title'] = title
+                post['content'] = content
+                post['author_name'] = author_name
+                post['author_city'] = author_city
+                post['author_state'] = author_state
+                post['author_country'] = author_country
+                post['author_school'] = author_school
+                post['tags'] = tags or []
+                post['updated_at'] = datetime.now().isoformat()
+                
+                try:
+                    self._write_post(post, if_generation_match=generation)
+                    break
+                except PreconditionFailed:
+                    backoff_sleep(attempt)
+            else:
+                raise WriteConflictError(f"Blog post {post_id} kept changing during update")
+            written_slug = post['slug']
             
-            for post in blog_posts:
-                if post.get('id') == post_id:
-                    if post.get('title') != title:
-                        new_slug = self._generate_slug(title)
-                        counter = 1
-                        original_slug = new_slug
-                        while any(p.get('slug') == new_slug and p.get('id') != post_id for p in blog_posts):
-                            new_slug = f"{original_slug}-{counter}"
-                            counter += 1
-                        post['slug'] = new_slug
-                    
-                    post['title'] = title
-                    post['content'] = content
-                    post['author_name'] = author_name
-                    post['author_city'] = author_city
-                    post['author_state'] = author_state
-                    post['author_country'] = author_country
-                    post['author_school'] = author_school
-                    post['tags'] = tags or []
-                    post['updated_at'] = datetime.now().isoformat()
-                    
-                    if self._save_blog_posts(blog_posts):
-                        return post
-                    else:
-                        return None
+            def replace_summary(manifest):
+                summaries = manifest['posts']
+                for index, summary in enumerate(summaries):
+                    if summary.get('id') == post_id:
+                        if summary.get('slug') != post['slug']:
+                            post['slug'] = self._unique_slug(title, manifest, post_id)
+                        _unindex_summary(manifest, summary)
+                        summaries[index] = _post_summary(post)
+                        _index_summary(manifest, summaries[index])
+                        _set_slug(manifest, post_id, summary.get('slug'), post['slug'])
+                        return True
+                return False
             
-            return None
+            if not self._update_manifest(replace_summary):
+                return None
+            if post['slug'] != written_slug:
+                self._write_post(post)
+            self._update_search_index(post=post)
+            print(f"✅ [PID:{self.process_id}] Updated blog post {post_id}")
+            return post
                 
         except Exception as e:
             print(f"Error updating blog post: {e}")
@@ -196,62 +511,159 @@ class BlogStorage:
     
     def delete_blog_post(self, post_id):
         try:
-            blog_posts = self._load_blog_posts()
-            
-            original_count = len(blog_posts)
-            blog_posts = [post for post in blog_posts if post.get('id') != post_id]
-            
-            if len(blog_posts) < original_count:
-                if self._save_blog_posts(blog_posts):
-                    return True
-                else:
+            def remove_summary(manifest):
+                summaries = manifest['posts']
+                removed = [summary for summary in summaries if summary.get('id') == post_id]
+                if not removed:
                     return False
-            else:
+                summaries[:] = [summary for summary in summaries if summary.get('id') != post_id]
+                for summary in removed:
+                    _unindex_summary(manifest, summary)
+                    manifest.get('by_slug', {}).pop(summary.get('slug'), None)
+                # Former slugs become free again once the post is gone.
+                history = manifest.get('slug_history', {})
+                for slug in [slug for slug, owner in history.items() if owner == post_id]:
+                    del history[slug]
+                return True
+            
+            if not self._update_manifest(remove_summary):
                 return False
+            
+            try:
+                self.backend.delete(self._post_blob_name(post_id))
+            except Exception as e:
+                # The manifest no longer references it, so a leftover blob is harmless.
+                print(f"⚠️ Could not delete blob for blog post {post_id}: {e}")
+            BlogStorage._post_cache.pop(post_id, None)
+            self._update_search_index(removed_id=post_id)
+            print(f"✅ [PID:{self.process_id}] Deleted blog post {post_id}")
+            return True
                 
         except Exception as e:
             print(f"Error deleting blog post: {e}")
             return False
     
-    def search_blog_posts(self, query):
+    def rebuild_search_index(self, if_generation_match=None):
+        """
+        Recompute blog/search_index.json from every post (first use, outdated format
+        or after manual edits). Written only if the blob is still at if_generation_match
+        (0 = create-only; default: its current generation), so an incremental update
+        made meanwhile is never overwritten; returns None when that happens.
+        """
+        if if_generation_match is None:
+            info = self.backend.stat(self.search_index_blob_name)
+            if_generation_match = info.generation if info else 0
+        index = blog_search.empty_index()
+        for post in self._load_blog_posts():
+            blog_search.add_document(index, post)
+        index['updated_at'] = datetime.now().isoformat()
+        try:
+            generation = write_json_if_generation(self.backend, self.search_index_blob_name, index,
+                                                  if_generation_match)
+        except PreconditionFailed:
+            print(f"📝 {self.search_index_blob_name} changed during the rebuild; keeping that version")
+            return None
+        BlogStorage._search_index_cache = (generation, index)
+        print(f"✅ [PID:{self.process_id}] Rebuilt blog search index with {len(index['docs'])} posts")
+        return index
+    
+    def _load_search_index(self):
+        """Parsed search index, reused while the blob's generation is unchanged."""
+        index = {}
+        for attempt in range(2):
+            info = self.backend.stat(self.search_index_blob_name)
+            cached = BlogStorage._search_index_cache
+            if info and cached and cached[0] == info.generation:
+                record_cache_lookup('blog_search_index', True)
+                return cached[1]
+            record_cache_lookup('blog_search_index', False)
+            index, generation = read_json_with_generation(self.backend, self.search_index_blob_name, dict)
+            if generation and 'docs' in index and index.get('version', 1) >= blog_search.SEARCH_INDEX_VERSION:
+                BlogStorage._search_index_cache = (generation, index)
+                return index
+            rebuilt = self.rebuild_search_index(if_generation_match=generation)
+            if rebuilt is not None:
+                return rebuilt
+        # Lost two rebuild races in a row; the last copy read still ranks correctly.
+        return index if 'docs' in index else blog_search.empty_index()
+    
+    def _update_search_index(self, post=None, removed_id=None):
+        """Fold one post write or delete into the search index's term statistics."""
         try:
-            blog_posts = self._load_blog_posts()
-            query = query.lower()
+            if not self.backend.exists(self.search_index_blob_name):
+                # A rebuild reads the posts, so it already reflects the write just made.
+                if self.rebuild_search_index(if_generation_match=0) is not None:
+                    return
+                # Another instance created it first; fold this write into theirs.
             
-            results = []
-            for post in blog_posts:
-                if query in post.get('title', '').lower():
-                    results.append(post)
-                    continue
-                
-                if query in post.get('content', '').lower():
-                    results.append(post)
-                    continue
-                
-                for tag in post.get('tags', []):
-                    if query in tag.lower():
-                        results.append(post)
-                        break
+            def apply(index):
+                if removed_id:
+                    blog_search.remove_document(index, removed_id)
+                if post:
+                    blog_search.add_document(index, post)
+                index['updated_at'] = datetime.now().isoformat()
+                return True
             
-            results.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-            return results
+            update_json(self.backend, self.search_index_blob_name, apply, blog_search.empty_index)
+        except Exception as e:
+            # Derived data: the post itself is saved; a rebuild repairs the index.
+            print(f"⚠️ Could not update blog search index: {e}")
+    
+    def search_blog_posts(self, query, page=1, per_page=BLOG_PAGE_SIZE, weights=None,
+                          author=None, tag=None, exact=False):
+        """
+        One page of best-matching post summaries for query, most relevant first.
+        
+        Returns {'posts', 'page', 'pages', 'total'} like get_blog_post_page, with total
+        counting every match. Each post is a manifest summary plus 'score' and
+        'snippet' (safe HTML with the query terms in <mark>), cut from the bodies of
+        that page's hits only. author/tag restrict the results to that author name /
+        tag; weights override SEARCH_FIELD_WEIGHTS.
+        """
+        empty = {'posts': [], 'page': 1, 'pages': 1, 'total': 0}
+        try:
+            manifest, summaries = self._load_manifest_indexed()
+            filtered_ids = self._filtered_ids(manifest, author, tag)
+            candidate_ids = set(summaries) if filtered_ids is None else set(filtered_ids)
+            if not candidate_ids:
+                return empty
+            index = self._load_search_index()
             
+            def load_body(post_id):
+                return (self._load_post(summaries[post_id]) or {}).get('content')
+            
+            def ranked(page):
+                return blog_search.search(index, query, limit=per_page, offset=(page - 1) * per_page,
+                                          weights=weights, candidate_ids=candidate_ids, exact=exact,
+                                          load_body=load_body)
+            
+            page = max(1, page)
+            results = ranked(page)
+            pages = max(1, -(-results.total // per_page))
+            if page > pages:
+                page = pages
+                results = ranked(page)
+            with ThreadPoolExecutor(max_workers=BLOG_FETCH_WORKERS) as executor:
+                posts = list(executor.map(bind_request_stats(self._load_post),
+                                          [summaries[post_id] for post_id, score in results.hits]))
+            terms = set(results.terms)
+            page_posts = [dict(summaries[post_id], score=score, snippet=blog_search.snippet(post, terms))
+                          for (post_id, score), post in zip(results.hits, posts)]
+            return {'posts': page_posts, 'page': page, 'pages': pages, 'total': results.total}
         except Exception as e:
             print(f"Error searching blog posts: {e}")
-            return []
+            return empty
     
     def ensure_data_consistency(self):
         try:
             print("🔍 Checking data consistency...")
             
-            blob = self._get_blog_blob()
-            if blob.exists():
+            if self.backend.exists(self.manifest_blob_name):
                 print("✅ Data consistency check completed")
                 return True
             else:
-                print("📝 Creating initial blog posts file")
-                initial_posts = []
-                self._save_blog_posts(initial_posts)
+                print("📝 Creating blog manifest")
+                self._load_manifest()
                 return True
                 
         except Exception as e:
@@ -1,80 +1,64 @@
-"""JSON blob in GCS for short CIS news posts (title, body, optional image URL)."""
+"""JSON blob in GCS for short CIS news posts (title, body, optional image URL).
+
+Reads are lock-free; writes are read-modify-write cycles guarded by generation
+preconditions (see storage_concurrency), so they are safe across instances.
+"""
 
-import json
 import os
-import threading
 import uuid
 from datetime import datetime
 
-from google.cloud import storage
+from storage_backend import create_storage_backend
+from storage_concurrency import read_json_with_generation, update_json
 
 
 class CisNewsStorage:
-    _shared_blob = None
-    _lock = threading.Lock()
-
-    def __init__(self):
+    def __init__(self, backend=None):
         self.bucket_name = os.environ.get("STORAGE_BUCKET", "tech-ethics-club-uploads")
         self.blob_name = "cis_news.json"
         self.process_id = os.getpid()
 
         try:
-            if os.path.exists("tech-ethics-club-sa-key.json"):
-                self.client = storage.Client.from_service_account_json(
-                    "tech-ethics-club-sa-key.json"
-                )
-            else:
-                self.client = storage.Client()
-
-            self.bucket = self.client.bucket(self.bucket_name)
-
-            if CisNewsStorage._shared_blob is None:
-                CisNewsStorage._shared_blob = self.bucket.blob(self.blob_name)
-
-            self._blob = CisNewsStorage._shared_blob
-
+            self.backend = backend or create_storage_backend(self.bucket_name)
+            self.bucket_name = self.backend.bucket_name
         except Exception as e:
             print(f"Error initializing CIS news storage: {e}")
             raise
 
     def _load_items(self):
-        with self._lock:
-            try:
-                blob = self._blob
-                if blob.exists():
-                    data = json.loads(blob.download_as_text())
-                    if not isinstance(data, list):
-                        return []
-                    print(
-                        f"✅ [PID:{self.process_id}] Loaded {len(data)} CIS news items from "
-                        f"{self.bucket_name}/{self.blob_name}"
-                    )
-                    return data
+        try:
+            data, generation = read_json_with_generation(self.backend, self.blob_name, list)
+            if not generation:
                 print(
                     f"📝 No CIS news file at {self.bucket_name}/{self.blob_name}; starting empty"
                 )
                 return []
-            except Exception as e:
-                print(f"❌ Error loading CIS news: {e}")
+            if not isinstance(data, list):
                 return []
+            print(
+                f"✅ [PID:{self.process_id}] Loaded {len(data)} CIS news items from "
+                f"{self.bucket_name}/{self.blob_name}"
+            )
+            return data
+        except Exception as e:
+            print(f"❌ Error loading CIS news: {e}")
+            return []
 
-    def _save_items(self, items):
-        """Persist list (may be empty after deleting all items)."""
-        with self._lock:
-            try:
-                if not isinstance(items, list):
-                    print("❌ CIS news save rejected: payload must be a list")
-                    return False
-                content = json.dumps(items, indent=2, default=str)
-                self._blob.upload_from_string(content, content_type="application/json")
-                print(
-                    f"✅ [PID:{self.process_id}] Saved {len(items)} CIS news items to "
-                    f"{self.bucket_name}/{self.blob_name}"
-                )
-                return True
-            except Exception as e:
-                print(f"❌ Error saving CIS news: {e}")
-                return False
+    def _update_items(self, mutate):
+        """Run mutate(items) under a generation precondition; returns its result."""
+
+        def apply(items):
+            if not isinstance(items, list):
+                raise ValueError("CIS news payload must be a list")
+            return mutate(items)
+
+        result = update_json(self.backend, self.blob_name, apply, list)
+        if result:
+            print(
+                f"✅ [PID:{self.process_id}] Saved CIS news items to "
+                f"{self.bucket_name}/{self.blob_name}"
+            )
+        return result
 
     def get_all_items(self):
         try:
@@ -87,7 +71,6 @@ class CisNewsStorage:
 
     def add_item(self, title, body, image_url, created_by_email):
         try:
-            items = self._load_items()
             new_item = {
                 "id": str(uuid.uuid4()),
                 "title": title.strip(),
@@ -96,22 +79,27 @@ class CisNewsStorage:
                 "created_at": datetime.now().isoformat(),
                 "created_by_email": created_by_email,
             }
-            items.append(new_item)
-            if self._save_items(items):
+
+            def append(items):
+                items.append(new_item)
                 return new_item
-            return None
+
+            return self._update_items(append)
         except Exception as e:
             print(f"Error adding CIS news item: {e}")
             return None
 
     def delete_item(self, item_id):
         try:
-            items = self._load_items()
-            before = len(items)
-            items = [i for i in items if i.get("id") != item_id]
-            if len(items) < before:
-                return self._save_items(items)
-            return False
+
+            def remove(items):
+                remaining = [i for i in items if i.get("id") != item_id]
+                if len(remaining) == len(items):
+                    return False
+                items[:] = remaining
+                return True
+
+            return self._update_items(remove)
         except Exception as e:
             print(f"Error deleting CIS news item: {e}")
             return False
@@ -2,45 +2,137 @@
 Google Cloud Storage persistence for users, gallery JSON documents, courses, and uploads.
 
 Each gallery item is typically gallery/<id>.json plus files under a prefix for images.
-CloudStorageManager picks credentials: App Engine default, local service account JSON,
-or default ADC. See __init__ for bucket name (STORAGE_BUCKET env).
+indexes/gallery.json holds card summaries of active items plus course/tag secondary
+indexes, so listing pages never have to download every item blob. Its aliases map
+covers legacy items whose blob name differs from their id.
+All I/O goes through a storage_backend.StorageBackend: GCS by default (App Engine
+credentials, local service account JSON, or ADC), or an in-memory / local-disk backend
+via STORAGE_BACKEND. See __init__ for bucket name (STORAGE_BUCKET env).
+Originals uploaded straight from the browser land under incoming/ (create_upload_session)
+and are optimized into uploads/ by a background job in app.py.
 """
 
+import base64
+import bisect
+import itertools
 import json
+import mimetypes
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Optional, Any
-from google.cloud import storage
+from urllib.parse import unquote
+from google.api_core.exceptions import PreconditionFailed
 from werkzeug.security import generate_password_hash, check_password_hash
+
+from metrics import record_cache_lookup
+from storage_backend import STORAGE_IO_WORKERS, StorageBackend, create_storage_backend
+from storage_concurrency import update_json
+from storage_metrics import bind_request_stats
 import uuid
 
+
+GALLERY_INDEX_PATH = 'indexes/gallery.json'
+# Bumped when the index gains a secondary index; older blobs are rebuilt on first read.
+GALLERY_INDEX_VERSION = 2
+# Secondary indexes: {key: [item ids in (created_at, id) order]}.
+GALLERY_SECONDARY_INDEXES = ('by_course', 'by_tag', 'by_school', 'by_country')
+GALLERY_INDEX_TTL_SECONDS = 30
+# Recently missed item ids, so repeated 404s (crawlers, stale links) cost nothing.
+GALLERY_NEGATIVE_CACHE_SIZE = 1024
+GALLERY_NEGATIVE_CACHE_TTL_SECONDS = 60
+# Concurrent GCS requests for bulk gallery operations (the shared client pool is sized for these).
+GALLERY_IO_WORKERS = STORAGE_IO_WORKERS
+# GCS JSON API limit on calls per batch request.
+GCS_BATCH_SIZE = 100
+# Fields a gallery card needs; everything else stays in the per-item blob.
+GALLERY_CARD_FIELDS = (
+    'id', 'title', 'description', 'image_url', 'additional_images', 'videos',
+    'creators', 'creator_name', 'creator_school', 'creator_city', 'creator_state',
+    'creator_country', 'tags', 'course_id', 'created_by', 'created_at', 'media_status'
+)
+UNCATEGORIZED_COURSE_KEY = 'individual'
+# Browser-uploaded originals, kept until their optimized copy is attached to an item.
+INCOMING_PREFIX = 'incoming/'
+
+
+def _gallery_sort_key(summary: Dict):
+    return (summary.get('created_at') or '', summary.get('id') or '')
+
+
+def _index_value(value) -> str:
+    """Case- and whitespace-insensitive key for the school/country/tag indexes."""
+    return ' '.join(str(value or '').split()).lower()
+
+
+def _creator_values(summary: Dict, creator_field: str, legacy_field: str) -> List[str]:
+    values = [creator.get(creator_field) for creator in summary.get('creators') or [] if isinstance(creator, dict)]
+    values.append(summary.get(legacy_field))
+    return [value for value in dict.fromkeys(_index_value(value) for value in values) if value]
+
+
+def _gallery_index_keys(summary: Dict) -> List[tuple]:
+    """(secondary index, key) pairs an item's card summary is listed under."""
+    keys = [('by_course', summary.get('course_id') or UNCATEGORIZED_COURSE_KEY)]
+    keys += [('by_tag', tag) for tag in dict.fromkeys(_index_value(tag) for tag in summary.get('tags') or []) if tag]
+    keys += [('by_school', school) for school in _creator_values(summary, 'school', 'creator_school')]
+    keys += [('by_country', country) for country in _creator_values(summary, 'country', 'creator_country')]
+    return keys
+
+
+def _gallery_matches_query(summary: Dict, query: str) -> bool:
+    """True if every word of query appears in the card's title, description, creators or tags."""
+    creators = [creator.get(field) for creator in summary.get('creators') or [] if isinstance(creator, dict)
+                for field in ('name', 'school')]
+    haystack = _index_value(' '.join(str(value) for value in [
+        summary.get('title'), summary.get('description'), summary.get('creator_name'),
+        summary.get('creator_school'), *creators, *(summary.get('tags') or [])
+    ] if value))
+    return all(word in haystack for word in query.split())
+
+
+def encode_gallery_cursor(summary: Dict) -> str:
+    raw = json.dumps(list(_gallery_sort_key(summary))).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_gallery_cursor(cursor: str):
+    """Return the (created_at, id) key encoded in cursor, or None if malformed."""
+    try:
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (str(created_at), str(item_id))
+    except Exception:
+        return None
+
+
 class CloudStorageManager:
     """Thin CRUD over GCS JSON blobs and file uploads for the app."""
 
-    def __init__(self, bucket_name: str = None):
+    def __init__(self, bucket_name: str = None, backend: StorageBackend = None):
         self.bucket_name = bucket_name or os.environ.get('STORAGE_BUCKET', 'tech-ethics-club-uploads')
         
-        self.client = None
-        self.bucket = None
+        self.backend = backend
         self.auth_error = None
         self._storage_available = False
+        self._gallery_index_cache = None
+        self._gallery_index_loaded_at = 0.0
+        # item id -> monotonic time of the last miss; bounded LRU
+        self._missing_ids = OrderedDict()
+        self._missing_ids_lock = threading.Lock()
         
         try:
-            if os.environ.get('GAE_ENV'):
-                print("Running on App Engine - using default credentials")
-                self.client = storage.Client()
-            elif os.path.exists('tech-ethics-club-sa-key.json'):
-                print("Using service account key for authentication")
-                self.client = storage.Client.from_service_account_json('tech-ethics-club-sa-key.json')
+            if self.backend is None:
+                self.backend = create_storage_backend(self.bucket_name)
             else:
-                print("Using default credentials for authentication")
-                self.client = storage.Client()
-            
-            self.bucket = self.client.bucket(self.bucket_name)
+                self.bucket_name = self.backend.bucket_name
 
             try:
-                list(self.bucket.list_blobs(max_results=1))
-                print(f"Successfully connected to bucket: {self.bucket_name}")
+                next(iter(self.backend.list(max_results=1)), None)
+                print(f"Successfully connected to bucket: {self.bucket_name} ({self.backend.kind})")
                 self._storage_available = True
             except Exception as bucket_error:
                 # Credentials exist but lack bucket permissions (common in local dev)
@@ -55,25 +147,27 @@ class CloudStorageManager:
             print("1. Google Cloud SDK installed and authenticated")
             print("2. Service account key file (tech-ethics-club-sa-key.json) for local development")
             print("3. Proper permissions for the storage bucket")
+            print("Or set STORAGE_BACKEND=memory / STORAGE_BACKEND=local to run without GCS")
     
-    def _get_blob(self, path: str):
-        return self.bucket.blob(path)
-    
-    def _save_json(self, path: str, data: Dict):
+    def _save_json(self, path: str, data: Dict, if_generation_match: int = None):
+        """Write JSON; if_generation_match=0 makes it create-only (raises PreconditionFailed if taken)."""
         if not self._storage_available:
             print(f"Storage unavailable; skipping write to {path}")
             return
-        blob = self._get_blob(path)
-        blob.upload_from_string(
-            json.dumps(data, default=str),
-            content_type='application/json'
+        self.backend.put(
+            path,
+            json.dumps(data, default=str).encode('utf-8'),
+            content_type='application/json',
+            if_generation_match=if_generation_match
         )
     
     def _load_json(self, path: str) -> Optional[Dict]:
+        if not self.backend:
+            return None
         try:
-            blob = self._get_blob(path)
-            if blob.exists():
-                return json.loads(blob.download_as_text())
+            found = self.backend.get(path)
+            if found:
+                return json.loads(found[0])
             else:
                 print(f"File {path} does not exist")
                 return None
@@ -85,17 +179,16 @@ class CloudStorageManager:
         if not self._storage_available:
             return []
         try:
-            blobs = self.client.list_blobs(self.bucket_name, prefix=prefix)
-            return [blob.name for blob in blobs]
+            return [info.name for info in self.backend.list(prefix)]
         except Exception as e:
             print(f"Error listing files at {prefix}: {e}")
             return []
     
     def _delete_file(self, path: str):
+        if not self.backend:
+            return False
         try:
-            blob = self._get_blob(path)
-            if blob.exists():
-                blob.delete()
+            if self.backend.delete(path):
                 return True
             else:
                 print(f"File {path} does not exist")
@@ -140,25 +233,32 @@ class CloudStorageManager:
                 users.append(user_data)
         return users
     
-    def _generate_title_based_id(self, title: str) -> str:
-        import re
+    def _title_to_base_id(self, title: str) -> str:
         base_id = re.sub(r'[^a-zA-Z0-9\s-]', '', title.lower())
-        base_id = re.sub(r'\s+', '-', base_id.strip())
-        
-        existing_items = self.get_all_gallery_items()
-        existing_ids = [item.get('id', '') for item in existing_items]
-        
-        counter = 1
-        final_id = base_id
-        while final_id in existing_ids:
-            final_id = f"{base_id}-{counter}"
-            counter += 1
-        
-        return final_id
+        return re.sub(r'\s+', '-', base_id.strip())
 
-    def create_gallery_item(self, title: str, description: str, image_filename: str, image_url: str, created_by: str, creators: List[Dict] = None, creator_name: str = None, creator_email: str = None, creator_linkedin: str = None, creator_city: str = None, creator_state: str = None, creator_country: str = None, creator_school: str = None, project_link: str = None, project_links: List[Dict] = None, image_link: str = None, project_poster_url: str = None, project_poster_link: str = None, project_poster_filename: str = None, additional_image_links: List[str] = None, tags: List[str] = None, additional_images: List[str] = None, additional_filenames: List[str] = None, videos: List[Dict] = None, course_id: str = None, slideshow_images: List[str] = None, slideshow_filenames: List[str] = None, slideshow_image_links: List[str] = None, slideshow_title: str = None) -> Dict:
-        item_id = self._generate_title_based_id(title)
-        
+    def _create_with_title_based_id(self, folder: str, title: str, data: Dict, known_ids=()) -> Dict:
+        """
+        Save data as <folder>/<id>.json under the first free id derived from title.
+
+        Each candidate is claimed with a create-only write, so two concurrent creates
+        can never pick the same id. known_ids only lets us skip candidates we already
+        know are taken without a round trip.
+        """
+        base_id = self._title_to_base_id(title)
+        taken = set(known_ids)
+        for counter in itertools.count():
+            candidate = base_id if counter == 0 else f"{base_id}-{counter}"
+            if candidate in taken:
+                continue
+            data['id'] = candidate
+            try:
+                self._save_json(f'{folder}/{candidate}.json', data, if_generation_match=0)
+                return data
+            except PreconditionFailed:
+                continue
+
+    def create_gallery_item(self, title: str, description: str, image_filename: str, image_url: str, created_by: str, creators: List[Dict] = None, creator_name: str = None, creator_email: str = None, creator_linkedin: str = None, creator_city: str = None, creator_state: str = None, creator_country: str = None, creator_school: str = None, project_link: str = None, project_links: List[Dict] = None, image_link: str = None, project_poster_url: str = None, project_poster_link: str = None, project_poster_filename: str = None, additional_image_links: List[str] = None, tags: List[str] = None, additional_images: List[str] = None, additional_filenames: List[str] = None, videos: List[Dict] = None, course_id: str = None, slideshow_images: List[str] = None, slideshow_filenames: List[str] = None, slideshow_image_links: List[str] = None, slideshow_title: str = None, pending_uploads: List[str] = None) -> Dict:
         if creators:
             creators_list = creators
         elif creator_name:
@@ -175,7 +275,7 @@ class CloudStorageManager:
             creators_list = []
         
         item_data = {
-            'id': item_id,
+            'id': None,  # assigned when the id is claimed below
             'title': title,
             'description': description,
             'image_filename': image_filename,
@@ -208,54 +308,356 @@ class CloudStorageManager:
             'created_at': datetime.utcnow().isoformat(),
             'is_active': True
         }
+        if pending_uploads:
+            # incoming/ originals still being optimized; cleared when they are attached.
+            item_data['pending_uploads'] = list(pending_uploads)
+            item_data['media_status'] = 'processing'
         
-        self._save_json(f'gallery/{item_id}.json', item_data)
+        known_ids = self._load_gallery_index()['items'].keys()
+        self._create_with_title_based_id('gallery', title, item_data, known_ids)
+        self._update_gallery_index(upserts=[item_data])
         return item_data
     
+    def _gallery_item_path(self, item_id: str) -> str:
+        """Blob path for an item id, following the alias index for legacy file names."""
+        aliases = self._load_gallery_index().get('aliases', {})
+        return aliases.get(item_id, f'gallery/{item_id}.json')
+
+    def _is_known_missing(self, item_id: str) -> bool:
+        with self._missing_ids_lock:
+            missed_at = self._missing_ids.get(item_id)
+            if missed_at is not None and time.monotonic() - missed_at > GALLERY_NEGATIVE_CACHE_TTL_SECONDS:
+                del self._missing_ids[item_id]
+                missed_at = None
+        record_cache_lookup('gallery_negative', missed_at is not None)
+        return missed_at is not None
+
+    def _remember_missing(self, item_id: str):
+        with self._missing_ids_lock:
+            self._missing_ids[item_id] = time.monotonic()
+            self._missing_ids.move_to_end(item_id)
+            while len(self._missing_ids) > GALLERY_NEGATIVE_CACHE_SIZE:
+                self._missing_ids.popitem(last=False)
+
+    def _forget_missing(self, item_id: str):
+        with self._missing_ids_lock:
+            self._missing_ids.pop(item_id, None)
+
+    def _read_gallery_item(self, path: str) -> Optional[Dict]:
+        """Parsed item at path, or None if absent (or not valid JSON); read errors propagate."""
+        found = self.backend.get(path)
+        if found is None:
+            return None
+        try:
+            return json.loads(found[0])
+        except ValueError as e:
+            print(f"Gallery item {path} is not valid JSON: {e}")
+            return None
+
     def get_gallery_item_by_id(self, item_id: str) -> Optional[Dict]:
-        item_data = self._load_json(f'gallery/{item_id}.json')
+        """
+        Direct GET, then the alias index; misses are remembered briefly so repeats are free.
+        A failed read propagates and is not remembered, so the item is back on the next request.
+        """
+        if not self.backend or self._is_known_missing(item_id):
+            return None
+
+        item_data = self._read_gallery_item(f'gallery/{item_id}.json')
         if item_data:
             return item_data
-        
-        all_items = self.get_all_gallery_items()
-        for item in all_items:
-            if item.get('id') == item_id:
-                return item
-        
+
+        alias_path = self._load_gallery_index().get('aliases', {}).get(item_id)
+        if alias_path:
+            item_data = self._read_gallery_item(alias_path)
+            if item_data:
+                return item_data
+
+        self._remember_missing(item_id)
         return None
     
-    def get_all_gallery_items(self) -> List[Dict]:
-        items = []
-        item_files = self._list_files('gallery/')
-        for item_file in item_files:
+    def _iter_gallery_blobs(self):
+        """Yield (path, item_data) for every parseable blob under gallery/."""
+        for item_file in self._list_files('gallery/'):
             item_data = self._load_json(item_file)
-            if item_data and item_data.get('is_active', True):
-                items.append(item_data)
+            if item_data:
+                yield item_file, item_data
+
+    def get_all_gallery_items(self) -> List[Dict]:
+        items = [item_data for _, item_data in self._iter_gallery_blobs() if item_data.get('is_active', True)]
         return sorted(items, key=lambda x: x.get('created_at', ''), reverse=False)
+
+    def _gallery_index_remove(self, index: Dict, item_id: str, drop_alias: bool = False):
+        if drop_alias:
+            index.setdefault('aliases', {}).pop(item_id, None)
+        summary = index['items'].pop(item_id, None)
+        if summary is None:
+            return
+        index['order'] = [i for i in index['order'] if i != item_id]
+        for index_name, key in _gallery_index_keys(summary):
+            ids = index.setdefault(index_name, {}).get(key)
+            if ids is None:
+                continue
+            ids[:] = [i for i in ids if i != item_id]
+            if not ids:
+                del index[index_name][key]
+
+    def _gallery_index_put(self, index: Dict, item_data: Dict):
+        """Insert or replace one item's card summary and its secondary index entries."""
+        item_id = item_data.get('id')
+        if not item_id:
+            return
+        self._gallery_index_remove(index, item_id)
+        if not item_data.get('is_active', True):
+            return
+        self._forget_missing(item_id)
+        items = index['items']
+        items[item_id] = {field: item_data.get(field) for field in GALLERY_CARD_FIELDS}
+        sort_key = lambda i: _gallery_sort_key(items[i])
+        bisect.insort(index['order'], item_id, key=sort_key)
+        for index_name, key in _gallery_index_keys(items[item_id]):
+            bisect.insort(index.setdefault(index_name, {}).setdefault(key, []), item_id, key=sort_key)
+
+    def _read_gallery_index(self):
+        """(index, generation) as stored, or (None, 0) if absent; read errors propagate."""
+        found = self.backend.get(GALLERY_INDEX_PATH)
+        if found is None:
+            return None, 0
+        try:
+            return json.loads(found[0]), found[1]
+        except ValueError as e:
+            print(f"Gallery index is not valid JSON: {e}")
+            return {}, found[1]
+
+    @staticmethod
+    def _gallery_index_current(index: Optional[Dict]) -> bool:
+        return bool(index) and 'items' in index and index.get('version', 1) >= GALLERY_INDEX_VERSION
+
+    def rebuild_gallery_index(self, if_generation_match: int = None) -> Dict:
+        """
+        Full scan of gallery/ to (re)create indexes/gallery.json.
+
+        Every read must succeed (an error propagates instead of writing an index with
+        items missing). The write only replaces generation if_generation_match (0 when
+        the index was absent; default: whatever is there now), so a concurrent rebuild
+        or update is never overwritten; that version is used instead when it is current.
+        """
+        index = {'items': {}, 'order': [], 'aliases': {}, 'version': GALLERY_INDEX_VERSION}
+        index.update({index_name: {} for index_name in GALLERY_SECONDARY_INDEXES})
+        if not self._storage_available:
+            return index
+        if if_generation_match is None:
+            info = self.backend.stat(GALLERY_INDEX_PATH)
+            if_generation_match = info.generation if info else 0
+        for info in self.backend.list('gallery/'):
+            found = self.backend.get(info.name)
+            if found is None:
+                continue  # deleted since the listing
+            try:
+                item_data = json.loads(found[0])
+            except ValueError as e:
+                print(f"Skipping unreadable gallery blob {info.name}: {e}")
+                continue
+            if not isinstance(item_data, dict):
+                continue
+            item_id = item_data.get('id')
+            if item_id and info.name != f'gallery/{item_id}.json':
+                # Legacy items whose file name differs from their id.
+                index['aliases'][item_id] = info.name
+            self._gallery_index_put(index, item_data)
+        index['updated_at'] = datetime.utcnow().isoformat()
+        try:
+            self._save_json(GALLERY_INDEX_PATH, index, if_generation_match=if_generation_match)
+        except PreconditionFailed:
+            print("Gallery index changed during the rebuild; keeping that version")
+            current, _ = self._read_gallery_index()
+            if self._gallery_index_current(current):
+                index = current
+        else:
+            print(f"Rebuilt gallery index with {len(index['items'])} items")
+        self._gallery_index_cache = index
+        self._gallery_index_loaded_at = time.monotonic()
+        return index
+
+    def _load_gallery_index(self, fresh: bool = False) -> Dict:
+        """
+        The gallery index, cached for GALLERY_INDEX_TTL_SECONDS. Rebuilt only when
+        it is absent or outdated. If storage cannot be read, the last cached copy is
+        served, unless fresh was asked for or there is none; then the error propagates.
+        """
+        cache_age = time.monotonic() - self._gallery_index_loaded_at
+        if not fresh and self._gallery_index_cache is not None and cache_age < GALLERY_INDEX_TTL_SECONDS:
+            record_cache_lookup('gallery_index', True)
+            return self._gallery_index_cache
+        record_cache_lookup('gallery_index', False)
+        if not self._storage_available:
+            return self.rebuild_gallery_index()
+        try:
+            index, generation = self._read_gallery_index()
+            if not self._gallery_index_current(index):
+                return self.rebuild_gallery_index(if_generation_match=generation)
+        except Exception as e:
+            if fresh or self._gallery_index_cache is None:
+                raise
+            print(f"Error loading gallery index; serving the cached copy: {e}")
+            return self._gallery_index_cache
+        self._gallery_index_cache = index
+        self._gallery_index_loaded_at = time.monotonic()
+        return index
+
+    def _update_gallery_index(self, upserts: List[Dict] = None, removals: List[str] = None):
+        """Apply item writes/deletes to the index once, under a generation precondition."""
+        if not self._storage_available:
+            return
+        try:
+            if not self.backend.exists(GALLERY_INDEX_PATH):
+                # The scan already sees the writes just made; applying them below as well
+                # is idempotent and covers another instance creating the index first.
+                self.rebuild_gallery_index(if_generation_match=0)
+
+            def apply(index):
+                if index.get('version', 1) < GALLERY_INDEX_VERSION:
+                    return None
+                for item_id in removals or []:
+                    self._gallery_index_remove(index, item_id, drop_alias=True)
+                for item_data in upserts or []:
+                    self._gallery_index_put(index, item_data)
+                index['updated_at'] = datetime.utcnow().isoformat()
+                return index
+
+            updated = update_json(self.backend, GALLERY_INDEX_PATH, apply, dict)
+            if updated is None:
+                # Written by older code without every secondary index; start over from gallery/.
+                self.rebuild_gallery_index()
+                return
+            self._gallery_index_cache = updated
+            self._gallery_index_loaded_at = time.monotonic()
+        except Exception as e:
+            # The index is derived data; drop the cache so the next read reloads it.
+            print(f"Error updating gallery index: {e}")
+            self._gallery_index_cache = None
+
+    def _filtered_gallery_ids(self, index: Dict, course_id: str = None, tag: str = None,
+                              school: str = None, country: str = None, query: str = None) -> List[str]:
+        """
+        Item ids matching every given filter, in (created_at, id) order.
+
+        course/tag/school/country come from the secondary indexes; query is then
+        matched against the card summaries already held in the index.
+        """
+        filters = [('by_course', course_id), ('by_tag', _index_value(tag)),
+                   ('by_school', _index_value(school)), ('by_country', _index_value(country))]
+        matches = [index.get(index_name, {}).get(key, []) for index_name, key in filters if key]
+        if matches:
+            # Walk the shortest list; the others only answer membership.
+            matches.sort(key=len)
+            ids = matches[0]
+            for other in matches[1:]:
+                members = set(other)
+                ids = [i for i in ids if i in members]
+        else:
+            ids = index['order']
+        query = _index_value(query)
+        if query:
+            items = index['items']
+            ids = [i for i in ids if _gallery_matches_query(items[i], query)]
+        return ids
+
+    def get_gallery_page(self, cursor: str = None, limit: int = 24, course_id: str = None, tag: str = None,
+                         school: str = None, country: str = None, query: str = None) -> Dict:
+        """
+        One page of gallery card summaries in (created_at, id) order.
+
+        course_id may be UNCATEGORIZED_COURSE_KEY for items without a course; tag,
+        school and country match any creator, ignoring case; query keeps items whose
+        title, description, creators or tags contain every word. Returns
+        {'items': [...], 'next_cursor': str or None, 'total': matching item count}.
+        """
+        index = self._load_gallery_index()
+        items = index['items']
+        ids = self._filtered_gallery_ids(index, course_id, tag, school, country, query)
+
+        start = 0
+        cursor_key = decode_gallery_cursor(cursor) if cursor else None
+        if cursor_key:
+            start = bisect.bisect_right(ids, cursor_key, key=lambda i: _gallery_sort_key(items[i]))
+
+        page_ids = ids[start:start + limit]
+        page = [dict(items[i]) for i in page_ids]
+        next_cursor = encode_gallery_cursor(page[-1]) if page and start + limit < len(ids) else None
+        return {'items': page, 'next_cursor': next_cursor, 'total': len(ids)}
+
+    def get_gallery_course_counts(self) -> Dict[str, int]:
+        """Active item count per course id (UNCATEGORIZED_COURSE_KEY for no course)."""
+        return self.get_gallery_index_counts('by_course')
+
+    def get_gallery_index_counts(self, index_name: str) -> Dict[str, int]:
+        """Active item count per key of one of GALLERY_SECONDARY_INDEXES (school/country keys are lowercased)."""
+        index = self._load_gallery_index()
+        return {key: len(ids) for key, ids in index.get(index_name, {}).items()}
+
+    def count_gallery_items(self, **filters) -> int:
+        """Active items matching course_id/tag/school/country/query, from the index alone."""
+        return len(self._filtered_gallery_ids(self._load_gallery_index(), **filters))
     
-    def delete_gallery_item(self, item_id: str):
+    def delete_gallery_item(self, item_id: str, delete_media: bool = True):
+        """Delete the item JSON and, by default, every uploaded blob it references."""
         try:
-            delete_result = self._delete_file(f'gallery/{item_id}.json')
-            if delete_result:
-                print(f"Successfully deleted gallery item file: {item_id}")
-                return True
+            item_path = self._gallery_item_path(item_id)
+            item_data = self._load_json(item_path)
+            delete_result = self._delete_file(item_path)
             
-            all_items = self.get_all_gallery_items()
-            for item in all_items:
-                if item.get('id') == item_id:
-                    actual_filename = f"gallery/{item_id}.json"
-                    delete_result = self._delete_file(actual_filename)
-                    if delete_result:
-                        print(f"Successfully deleted gallery item file: {item_id}")
-                        return True
-                    break
+            if not delete_result:
+                print(f"Failed to delete gallery item file: {item_id}")
+                self._remember_missing(item_id)
+                return False
             
-            print(f"Failed to delete gallery item file: {item_id}")
-            return False
+            print(f"Successfully deleted gallery item file: {item_id}")
+            self._update_gallery_index(removals=[item_id])
+            if delete_media and item_data:
+                media_paths = self.gallery_item_media_paths(item_data)
+                deleted = self.delete_blobs(media_paths)
+                print(f"Deleted {deleted} of {len(media_paths)} media blobs for gallery item {item_id}")
+            return True
         except Exception as e:
             print(f"Error deleting gallery item {item_id}: {str(e)}")
             return False
     
+    def blob_path_from_url(self, url: str) -> Optional[str]:
+        """Object name for a public URL in this bucket, or None for external URLs."""
+        if not url or not isinstance(url, str):
+            return None
+        prefixes = [f"https://storage.googleapis.com/{self.bucket_name}/",
+                    f"https://{self.bucket_name}.storage.googleapis.com/"]
+        if self.backend:
+            prefixes.append(self.backend.public_url(''))
+        for prefix in prefixes:
+            if url.startswith(prefix):
+                return unquote(url[len(prefix):].split('?', 1)[0]) or None
+        return None
+    
+    def gallery_item_media_paths(self, item_data: Dict) -> List[str]:
+        """Blob paths of every uploaded image, poster, slideshow frame and video thumbnail."""
+        urls = [item_data.get('image_url'), item_data.get('project_poster_url')]
+        urls += item_data.get('additional_images') or []
+        urls += item_data.get('slideshow_images') or []
+        urls += [video.get('thumbnail_url') for video in item_data.get('videos') or [] if isinstance(video, dict)]
+        paths = [self.blob_path_from_url(url) for url in urls]
+        paths += item_data.get('pending_uploads') or []  # incoming/ originals not processed yet
+        return list(dict.fromkeys(path for path in paths if path))
+    
+    def delete_blobs(self, paths: List[str]) -> int:
+        """Delete blobs in batched requests; missing blobs are ignored. Returns paths attempted."""
+        if not self._storage_available or not paths:
+            return 0
+        attempted = 0
+        for start in range(0, len(paths), GCS_BATCH_SIZE):
+            chunk = paths[start:start + GCS_BATCH_SIZE]
+            try:
+                attempted += self.backend.delete_many(chunk)
+            except Exception as e:
+                print(f"Error batch-deleting {len(chunk)} blobs: {e}")
+        return attempted
+    
     def update_gallery_item(self, item_id: str, **kwargs) -> Optional[Dict]:
         item_data = self.get_gallery_item_by_id(item_id)
         if item_data:
@@ -265,13 +667,42 @@ class CloudStorageManager:
             
             item_data['updated_at'] = datetime.utcnow().isoformat()
             
-            self._save_json(f'gallery/{item_id}.json', item_data)
+            self._save_json(self._gallery_item_path(item_id), item_data)
+            self._update_gallery_index(upserts=[item_data])
             return item_data
         return None
     
+    def modify_gallery_item(self, item_id: str, mutate) -> Optional[Dict]:
+        """
+        Read-modify-write one item under a generation precondition, for background
+        jobs that may race an admin edit. mutate(item_data) edits in place and
+        returns True to save. Returns the saved item, or None if missing/unchanged.
+        """
+        if not self._storage_available:
+            return None
+
+        def apply(item_data):
+            if not item_data or not mutate(item_data):
+                return None
+            item_data['updated_at'] = datetime.utcnow().isoformat()
+            return item_data
+
+        item_data = update_json(self.backend, self._gallery_item_path(item_id), apply, dict)
+        if item_data:
+            self._update_gallery_index(upserts=[item_data])
+        return item_data
+    
+    def gallery_version(self) -> Optional[str]:
+        """Changes whenever any gallery item is written (the index's updated_at)."""
+        return self._load_gallery_index().get('updated_at')
+    
     def upload_file(self, file_data, filename: str, folder: str = 'uploads') -> str:
+        """
+        Stream file_data (bytes, a file-like object or an iterable of chunks) to
+        folder/<timestamp>_<filename> as a publicly readable object; returns its URL.
+        """
         try:
-            if not self.client or not self.bucket:
+            if not self.backend:
                 print(f"Cloud storage not available. Auth error: {self.auth_error}")
                 return None
             
@@ -281,15 +712,14 @@ class CloudStorageManager:
             
             print(f"Uploading file: {filename} to path: {file_path}")
             
-            blob = self._get_blob(file_path)
-            blob.upload_from_file(file_data)
-            
-            print(f"File uploaded successfully to blob: {blob.name}")
+            started = time.perf_counter()
+            result = self.backend.upload_stream(file_path, file_data, mimetypes.guess_type(filename)[0], public=True)
+            seconds = time.perf_counter() - started
+            public_url = self.backend.public_url(file_path)
             
-            blob.make_public()
-            public_url = blob.public_url
-            
-            print(f"File made public. URL: {public_url}")
+            throughput = result.size / seconds / 1024 / 1024 if seconds > 0 else 0.0
+            print(f"File uploaded and made public: {public_url} ({result.size / 1024:.1f}KB in {seconds * 1000:.0f}ms, "
+                  f"{throughput:.2f}MB/s, {'resumable' if result.resumable else 'single request'})")
             return public_url
             
         except Exception as e:
@@ -297,10 +727,24 @@ class CloudStorageManager:
             print(f"This might be due to authentication issues. Auth error: {self.auth_error}")
             return None
     
+    def create_upload_session(self, filename: str, content_type: str = None, size: int = None,
+                              origin: str = None) -> Optional[Dict]:
+        """
+        Reserve an incoming/ object for a browser upload: {'name', 'upload_url'}.
+        upload_url is None when the backend cannot take uploads directly (memory/local),
+        in which case the app accepts the PUT itself. filename must already be sanitized.
+        """
+        if not self.backend:
+            print(f"Cloud storage not available. Auth error: {self.auth_error}")
+            return None
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        name = f"{INCOMING_PREFIX}{timestamp}_{uuid.uuid4().hex[:8]}_{filename}"
+        upload_url = self.backend.create_upload_session(name, content_type, size, origin)
+        return {'name': name, 'upload_url': upload_url}
+    
     def create_course(self, title: str, description: str, created_by: str, instructor: str = None, course_code: str = None, semester: str = None) -> Dict:
-        course_id = self._generate_title_based_id(title)
         course_data = {
-            'id': course_id,
+            'id': None,  # assigned when the id is claimed below
             'title': title,
             'description': description,
             'instructor': instructor,
@@ -312,7 +756,7 @@ class CloudStorageManager:
             'project_count': 0
         }
         
-        self._save_json(f'courses/{course_id}.json', course_data)
+        self._create_with_title_based_id('courses', title, course_data)
         return course_data
     
     def get_course_by_id(self, course_id: str) -> Optional[Dict]:
@@ -321,10 +765,9 @@ class CloudStorageManager:
     def get_all_courses(self) -> List[Dict]:
         courses = []
         try:
-            blobs = self.bucket.list_blobs(prefix='courses/')
-            for blob in blobs:
-                if blob.name.endswith('.json'):
-                    course_data = self._load_json(blob.name)
+            for path in self._list_files('courses/'):
+                if path.endswith('.json'):
+                    course_data = self._load_json(path)
                     if course_data and course_data.get('is_active', True):
                         course_data['project_count'] = self._count_course_projects(course_data['id'])
                         courses.append(course_data)
@@ -334,12 +777,7 @@ class CloudStorageManager:
     
     def _count_course_projects(self, course_id: str) -> int:
         try:
-            gallery_items = self.get_all_gallery_items()
-            count = 0
-            for item in gallery_items:
-                if item.get('course_id') == course_id:
-                    count += 1
-            return count
+            return len(self._load_gallery_index()['by_course'].get(course_id, []))
         except Exception as e:
             print(f"Error counting course projects: {e}")
             return 0
@@ -356,31 +794,37 @@ class CloudStorageManager:
     
     def delete_course(self, course_id: str) -> bool:
         try:
-            gallery_items = self.get_all_gallery_items()
-            for item in gallery_items:
-                if item.get('course_id') == course_id:
-                    item['course_id'] = None
-                    self._save_json(f'gallery/{item["id"]}.json', item)
+            # Fresh read: an item assigned on another instance moments ago must not keep a dangling course.
+            course_item_ids = list(self._load_gallery_index(fresh=True)['by_course'].get(course_id, []))
+            if course_item_ids:
+                self.move_multiple_gallery_items_to_course(course_item_ids, None)
             
-            blob = self._get_blob(f'courses/{course_id}.json')
-            blob.delete()
+            self.backend.delete(f'courses/{course_id}.json')
             return True
         except Exception as e:
             print(f"Error deleting course: {e}")
             return False
     
     def get_course_projects(self, course_id: str) -> List[Dict]:
+        """Full item data for a course's items (oldest first); only those items' blobs are read."""
         try:
-            gallery_items = self.get_all_gallery_items()
-            course_projects = []
-            for item in gallery_items:
-                if item.get('course_id') == course_id:
-                    course_projects.append(item)
-            return course_projects
+            item_ids = self._load_gallery_index()['by_course'].get(course_id, [])
+            with ThreadPoolExecutor(max_workers=GALLERY_IO_WORKERS) as executor:
+                items = list(executor.map(bind_request_stats(self.get_gallery_item_by_id), item_ids))
+            return [item for item in items if item and item.get('course_id') == course_id]
         except Exception as e:
             print(f"Error loading course projects: {e}")
             return []
     
+    def _assign_course(self, item_data: Dict, course_id: str = None):
+        item_data['course_id'] = course_id
+        # Remove tags when assigned to a course
+        if course_id:
+            if item_data.get('tags'):
+                print(f"Removing tags from item {item_data.get('id')} because it's being assigned to course {course_id}")
+            item_data['tags'] = []
+        item_data['updated_at'] = datetime.utcnow().isoformat()
+
     def move_gallery_item_to_course(self, item_id: str, course_id: str = None) -> bool:
         try:
             item_data = self.get_gallery_item_by_id(item_id)
@@ -388,15 +832,10 @@ class CloudStorageManager:
                 print(f"Gallery item {item_id} not found")
                 return False
             
-            item_data['course_id'] = course_id
-            # Remove tags when assigned to a course
-            if course_id:
-                if item_data.get('tags'):
-                    print(f"Removing tags from item {item_id} because it's being assigned to course {course_id}")
-                item_data['tags'] = []
-            item_data['updated_at'] = datetime.utcnow().isoformat()
+            self._assign_course(item_data, course_id)
             
-            self._save_json(f'gallery/{item_id}.json', item_data)
+            self._save_json(self._gallery_item_path(item_id), item_data)
+            self._update_gallery_index(upserts=[item_data])
             
             print(f"Gallery item {item_id} moved to course {course_id}")
             return True
@@ -406,10 +845,40 @@ class CloudStorageManager:
             return False
     
     def move_multiple_gallery_items_to_course(self, item_ids: List[str], course_id: str = None) -> Dict[str, bool]:
-        results = {}
-        for item_id in item_ids:
-            results[item_id] = self.move_gallery_item_to_course(item_id, course_id)
-        return results
+        """
+        Bulk move: parallel read-modify-writes, one index update. Returns {item_id: moved}.
+        Each item is rewritten under a generation precondition, so a concurrent job's
+        write (e.g. a thumbnail_url) is kept rather than overwritten.
+        """
+        unique_ids = list(dict.fromkeys(item_ids))
+        if not self._storage_available:
+            return {item_id: False for item_id in item_ids}
+        paths = {item_id: self._gallery_item_path(item_id) for item_id in unique_ids}
+        
+        def move(item_id):
+            def apply(item_data):
+                if not item_data:
+                    return None
+                self._assign_course(item_data, course_id)
+                return item_data
+            
+            try:
+                item_data = update_json(self.backend, paths[item_id], apply, dict)
+            except Exception as e:
+                print(f"Error moving gallery item {item_id} to course: {e}")
+                return None
+            if not item_data:
+                print(f"Gallery item {item_id} not found")
+            return item_data
+        
+        with ThreadPoolExecutor(max_workers=GALLERY_IO_WORKERS) as executor:
+            saved = dict(zip(unique_ids, executor.map(bind_request_stats(move), unique_ids)))
+        
+        moved = [saved[item_id] for item_id in unique_ids if saved[item_id]]
+        if moved:
+            self._update_gallery_index(upserts=moved)
+        print(f"Moved {len(moved)} of {len(unique_ids)} gallery items to course {course_id}")
+        return {item_id: bool(saved[item_id]) for item_id in item_ids}
 
     def authenticate_user(self, email: str, password: str) -> Optional[Dict]:
         user = self.get_user_by_email(email)
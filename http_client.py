@@ -0,0 +1,214 @@
+"""
+Shared outbound HTTP client for fetching third-party content (PDF images, video thumbnails).
+
+One requests.Session for the process keeps per-host keep-alive pools, so fetching
+every image of a gallery PDF from storage.googleapis.com, or several thumbnail
+sizes from img.youtube.com, pays for one TLS handshake per host rather than one
+per file. Each call names a use ('image', 'thumbnail', 'api', 'video'), which picks
+its connect/read timeouts and the largest body it will accept. Idempotent GETs are
+retried a bounded number of times on connection errors and 429/5xx, with jittered
+exponential backoff. Pool usage and connection reuse are exposed as
+outbound_http_* metrics.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import CallbackMetric, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# use -> ((connect, read) timeout seconds, max body bytes)
+FETCH_PROFILES = {
+    'image': ((3.05, 15), 20 * 1024 * 1024),
+    'thumbnail': ((3.05, 10), 5 * 1024 * 1024),
+    'api': ((3.05, 5), 1024 * 1024),
+    'video': ((3.05, 30), 200 * 1024 * 1024),
+}
+# Keep-alive connections kept per host, and how many hosts keep a pool.
+OUTBOUND_POOL_SIZE = int(os.environ.get('OUTBOUND_POOL_SIZE', 4))
+OUTBOUND_POOL_HOSTS = 16
+OUTBOUND_RETRIES = 2
+OUTBOUND_BACKOFF_SECONDS = 0.25
+OUTBOUND_BACKOFF_JITTER_SECONDS = 0.25
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CHUNK_SIZE = 64 * 1024
+ERROR_BODY_DRAIN_BYTES = 64 * 1024
+USER_AGENT = 'tech-ethics-club-app/1.0'
+
+# outcome: ok, http_error, too_large or error
+OUTBOUND_REQUESTS = Counter('outbound_http_fetches_total', 'Outbound fetches by use and outcome.',
+                            ('use', 'outcome'))
+OUTBOUND_RETRIES_TOTAL = Counter('outbound_http_retries_total', 'Retries made by outbound fetches.', ('use',))
+OUTBOUND_SECONDS = Histogram('outbound_http_fetch_seconds', 'Outbound fetch time including retries.', ('use',))
+
+
+class ResponseTooLarge(Exception):
+    """The response body exceeded the size cap for its use."""
+
+
+_session = None
+_adapter = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    retry = Retry(
+        total=OUTBOUND_RETRIES,
+        connect=OUTBOUND_RETRIES,
+        read=1,
+        status=OUTBOUND_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        backoff_factor=OUTBOUND_BACKOFF_SECONDS,
+        backoff_jitter=OUTBOUND_BACKOFF_JITTER_SECONDS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=OUTBOUND_POOL_HOSTS, pool_maxsize=OUTBOUND_POOL_SIZE,
+                          max_retries=retry)
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session, adapter
+
+
+def get_session():
+    """The process-wide outbound session, created on first use."""
+    global _session, _adapter
+    with _session_lock:
+        if _session is None:
+            _session, _adapter = _build_session()
+        return _session
+
+
+def _open(url, use):
+    if use not in FETCH_PROFILES:
+        raise ValueError(f"Unknown fetch use: {use}")
+    timeout, max_bytes = FETCH_PROFILES[use]
+    response = get_session().get(url, timeout=timeout, stream=True)
+    retries = getattr(response.raw, 'retries', None)
+    if retries is not None and retries.history:
+        OUTBOUND_RETRIES_TOTAL.inc(len(retries.history), use=use)
+    declared = response.headers.get('Content-Length')
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        response.close()
+        raise ResponseTooLarge(f"{url} is {declared} bytes; the limit for {use} is {max_bytes}")
+    return response, max_bytes
+
+
+def _iter_capped(response, url, use, max_bytes):
+    received = 0
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        received += len(chunk)
+        if received > max_bytes:
+            raise ResponseTooLarge(f"{url} exceeded the {max_bytes} byte limit for {use}")
+        yield chunk
+
+
+def _fetch(url, use, consume):
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        response, max_bytes = _open(url, use)
+        with response:
+            if response.status_code == 200:
+                consume(response, _iter_capped(response, url, use, max_bytes))
+                outcome = 'ok'
+            else:
+                outcome = 'http_error'
+                # Read a short error body (a 404 page) so the connection goes back to the pool.
+                declared = response.headers.get('Content-Length', '')
+                if declared.isdigit() and int(declared) <= ERROR_BODY_DRAIN_BYTES:
+                    response.content
+        return response
+    except ResponseTooLarge:
+        outcome = 'too_large'
+        raise
+    finally:
+        OUTBOUND_REQUESTS.inc(use=use, outcome=outcome)
+        OUTBOUND_SECONDS.observe(time.perf_counter() - started, use=use)
+
+
+def fetch(url, use='image'):
+    """GET url through the shared session; the body is read (within the cap) only on HTTP 200.
+
+    Returns the requests.Response, so callers keep using status_code, content
+    and json(). Raises ResponseTooLarge, or the usual requests exceptions once
+    retries are exhausted.
+    """
+    def consume(response, chunks):
+        # Same bookkeeping requests does when it reads a body itself.
+        response._content = b''.join(chunks)
+        response._content_consumed = True
+
+    return _fetch(url, use, consume)
+
+
+def download_to_file(url, file_obj, use='video'):
+    """Stream url into file_obj (within the cap) on HTTP 200; returns the response."""
+    def consume(response, chunks):
+        for chunk in chunks:
+            file_obj.write(chunk)
+
+    return _fetch(url, use, consume)
+
+
+def adapter_pool_stats(adapter):
+    """Per-host pool usage of a requests HTTPAdapter.
+
+    in_use is connections checked out right now, idle is open connections
+    waiting in the pool, and reused is requests served without opening a new
+    connection.
+    """
+    stats = []
+    pools = adapter.poolmanager.pools
+    for key in pools.keys():  # a snapshot; the container itself is not iterable
+        try:
+            pool = pools[key]
+        except KeyError:  # evicted meanwhile
+            continue
+        queue = pool.pool
+        if queue is None:  # closed
+            continue
+        stats.append({
+            'host': pool.host,
+            'max_size': queue.maxsize,
+            'in_use': queue.maxsize - queue.qsize(),
+            'idle': sum(1 for conn in list(queue.queue) if conn is not None),
+            'connections_opened': pool.num_connections,
+            'requests': pool.num_requests,
+            'reused': max(0, pool.num_requests - pool.num_connections),
+        })
+    return stats
+
+
+def pool_stats():
+    """Per-host pool usage of the outbound session: [] until it is first used."""
+    return adapter_pool_stats(_adapter) if _adapter is not None else []
+
+
+def pool_metric_values(stats_fn, field):
+    """A CallbackMetric collector reading one field of stats_fn() per host."""
+    def collect():
+        return {(stats['host'],): stats[field] for stats in stats_fn()}
+    return collect
+
+
+OUTBOUND_POOL_IN_USE = CallbackMetric('outbound_http_pool_in_use_connections', 'Connections checked out right now.',
+                                      ('host',), pool_metric_values(pool_stats, 'in_use'))
+OUTBOUND_POOL_IDLE = CallbackMetric('outbound_http_pool_idle_connections', 'Open connections waiting in the pool.',
+                                    ('host',), pool_metric_values(pool_stats, 'idle'))
+OUTBOUND_CONNECTIONS_OPENED = CallbackMetric('outbound_http_connections_opened_total', 'New connections opened.',
+                                             ('host',), pool_metric_values(pool_stats, 'connections_opened'),
+                                             kind='counter')
+OUTBOUND_CONNECTIONS_REUSED = CallbackMetric('outbound_http_connections_reused_total',
+                                             'Requests served on an already-open keep-alive connection.',
+                                             ('host',), pool_metric_values(pool_stats, 'reused'), kind='counter')
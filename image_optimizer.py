@@ -2,13 +2,23 @@
 
 import os
 import io
+import time
 from PIL import Image, ImageOps
 import logging
 
+from metrics import Counter, Histogram
+
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+OPTIMIZE_SECONDS = Histogram('image_optimizer_seconds', 'Time to optimize one image.', ('format',))
+OPTIMIZE_BYTES = Counter('image_optimizer_bytes_total', 'Image bytes read and written by the optimizer.',
+                         ('direction',))
+COMPRESSION_RATIO = Histogram('image_optimizer_compression_ratio', 'Optimized size / original size.', (),
+                              buckets=(0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.25, 1.5, 2.0))
+OPTIMIZE_FAILURES = Counter('image_optimizer_failures_total', 'Images returned unoptimized after an error.')
+
 class ImageOptimizer:
     def __init__(self):
         self.max_width = 1200
@@ -17,6 +27,7 @@ class ImageOptimizer:
         self.format = 'JPEG'
         
     def optimize_image(self, image_data, filename):
+        started = time.perf_counter()
         try:
             image = Image.open(image_data)
             
@@ -59,16 +70,28 @@ class ImageOptimizer:
             
             output.seek(0)
             
-            original_size = len(image_data.read()) if hasattr(image_data, 'read') else 0
+            if hasattr(image_data, 'seek') and hasattr(image_data, 'tell'):
+                # PIL has already consumed the stream; measure it rather than re-reading it.
+                image_data.seek(0, os.SEEK_END)
+                original_size = image_data.tell()
+            else:
+                original_size = 0
             optimized_size = len(output.getvalue())
             compression_ratio = ((original_size - optimized_size) / original_size * 100) if original_size > 0 else 0
             
+            OPTIMIZE_SECONDS.observe(time.perf_counter() - started, format=self.format)
+            OPTIMIZE_BYTES.inc(original_size, direction='in')
+            OPTIMIZE_BYTES.inc(optimized_size, direction='out')
+            if original_size:
+                COMPRESSION_RATIO.observe(optimized_size / original_size)
+            
             logger.info(f"Optimized {filename}: {original_size/1024/1024:.1f}MB -> {optimized_size/1024/1024:.1f}MB ({compression_ratio:.1f}% reduction)")
             
             return output
             
         except Exception as e:
             logger.error(f"Error optimizing image {filename}: {str(e)}")
+            OPTIMIZE_FAILURES.inc()
             if hasattr(image_data, 'seek'):
                 image_data.seek(0)
             return image_data
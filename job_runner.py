@@ -0,0 +1,463 @@
+"""
+In-process background jobs for slow work that should not hold a request open
+(video thumbnails, PDF exports, media cleanup).
+
+Route handlers call submit(kind, payload) and return; JOB_WORKERS threads run
+the registered handler for each kind. Every job is a JSON record under jobs/ in
+the storage backend, written on each state change (queued -> running ->
+succeeded / failed), so:
+
+  * the status API (get) works from any instance;
+  * jobs queued or running on an instance that restarts are picked up again once
+    their lease expires (running jobs are retried, so handlers must be safe to
+    run twice);
+  * a dedup key maps to at most one active job: submitting the same key again
+    returns the job already queued or running. Keys are claimed with create-only
+    writes under jobs/keys/, so this holds across instances too.
+
+Failures are retried up to max_attempts with jittered exponential backoff. At
+most JOB_MAX_QUEUED jobs wait in memory; submit raises JobQueueFull beyond that.
+Finished records are pruned after JOB_RETENTION_SECONDS. Queue depth, wait and
+run times and outcomes are background_job_* metrics.
+"""
+
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from google.api_core.exceptions import PreconditionFailed
+
+from metrics import CallbackMetric, Counter, Histogram
+from storage_concurrency import MAX_WRITE_ATTEMPTS, WriteConflictError, backoff_sleep
+
+logger = logging.getLogger(__name__)
+
+JOB_PREFIX = 'jobs/'
+JOB_KEY_PREFIX = 'jobs/keys/'
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_MAX_QUEUED = 100
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BASE_SECONDS = 10
+JOB_RETRY_MAX_SECONDS = 600
+JOB_LEASE_SECONDS = 600
+JOB_RESCAN_SECONDS = 300
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+JOB_RECENT_FINISHED = 200
+JOB_PERSIST_ATTEMPTS = 5
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+JOB_RUNS = Counter('background_job_runs_total', 'Job attempts by kind and outcome (succeeded, retry, failed).',
+                   ('kind', 'outcome'))
+JOB_RUN_SECONDS = Histogram('background_job_run_seconds', 'Time spent running one job attempt.', ('kind',),
+                            buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+JOB_WAIT_SECONDS = Histogram('background_job_wait_seconds', 'Time from submit (or retry due) to start.', ('kind',),
+                             buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+
+class JobQueueFull(Exception):
+    """JOB_MAX_QUEUED jobs are already waiting on this instance."""
+
+
+def _key_path(dedup_key):
+    return f"{JOB_KEY_PREFIX}{hashlib.sha1(dedup_key.encode('utf-8')).hexdigest()}.json"
+
+
+def public_view(job):
+    """The fields the status API exposes (no payload)."""
+    return {field: job.get(field) for field in
+            ('id', 'kind', 'subject', 'status', 'attempts', 'max_attempts', 'created_at', 'started_at',
+             'finished_at', 'error', 'result')}
+
+
+class JobRunner:
+    """Bounded worker pool over persisted job records; one instance per process."""
+
+    def __init__(self, backend, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED):
+        self.backend = backend
+        self.workers = workers
+        self.max_queued = max_queued
+        self._handlers = {}
+        # id -> (job, generation or None when storage is unavailable)
+        self._jobs = {}
+        self._finished = OrderedDict()
+        # id -> (job, generation): finished jobs whose final record could not be written yet
+        self._unrecorded = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def register(self, kind, handler, max_attempts=JOB_MAX_ATTEMPTS, on_failure=None):
+        """
+        handler(payload) does the work and returns a JSON-able result (or None).
+        on_failure(payload, error) runs once the last attempt has failed, e.g. to
+        clear a "processing" marker.
+        """
+        self._handlers[kind] = (handler, max_attempts, on_failure)
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._threads = [threading.Thread(target=self._work, name=f'job-worker-{n}', daemon=True)
+                             for n in range(self.workers)]
+            self._threads.append(threading.Thread(target=self._rescan_loop, name='job-rescan', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, kind, payload, dedup_key=None, subject=None):
+        """Queue a job (or return the active one with the same dedup_key); returns its record."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind {kind}")
+        if dedup_key:
+            existing = self._active_for_key(dedup_key)
+            if existing:
+                return existing
+        with self._cond:
+            if self._queued_count() >= self.max_queued:
+                raise JobQueueFull(f"{self.max_queued} jobs already queued")
+
+        now = time.time()
+        job = {
+            'id': f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:12]}",
+            'kind': kind,
+            'payload': payload,
+            'subject': subject,
+            'dedup_key': dedup_key,
+            'status': 'queued',
+            'attempts': 0,
+            'max_attempts': self._handlers[kind][1],
+            'created_at': datetime.utcnow().isoformat(),
+            'queued_at': now,
+            'next_attempt_at': now,
+            'leased_until': now + JOB_LEASE_SECONDS,
+            'started_at': None,
+            'finished_at': None,
+            'error': None,
+            'result': None,
+        }
+        if dedup_key:
+            existing = self._claim_or_find(dedup_key, job['id'])
+            if existing:
+                return existing
+        # A write that still fails propagates; a key claimed for the unwritten job is taken over by the next claim.
+        generation = self._persist(job, if_generation_match=0)
+        self._schedule(job, generation)
+        self.start()
+        return public_view(job)
+
+    def get(self, job_id):
+        """Status of a job from this instance's memory or from storage; None if unknown."""
+        with self._cond:
+            entry = self._jobs.get(job_id)
+            finished = self._finished.get(job_id)
+        if entry:
+            return public_view(entry[0])
+        if finished:
+            return public_view(finished)
+        job = self._load(job_id)
+        return public_view(job[0]) if job else None
+
+    def active_jobs(self, subject):
+        """Queued or running jobs on this instance for subject (e.g. 'gallery:<id>')."""
+        with self._cond:
+            return [public_view(job) for job, _ in self._jobs.values()
+                    if job['subject'] == subject and job['status'] in ACTIVE_STATUSES]
+
+    def depth(self, status='queued'):
+        with self._cond:
+            return sum(1 for job, _ in self._jobs.values() if job['status'] == status)
+
+    def _queued_count(self):
+        return sum(1 for job, _ in self._jobs.values() if job['status'] == 'queued')
+
+    # Storage helpers; without a backend, jobs live in memory only.
+
+    def _persist(self, job, if_generation_match=None):
+        """
+        Write job's record and return its new generation (None only without a backend).
+        Other errors are retried with backoff; PreconditionFailed (someone else wrote the
+        record) and the last error after JOB_PERSIST_ATTEMPTS propagate.
+        """
+        if self.backend is None:
+            return None
+        data = json.dumps(job, default=str).encode('utf-8')
+        for attempt in range(JOB_PERSIST_ATTEMPTS):
+            try:
+                return self.backend.put(f"{JOB_PREFIX}{job['id']}.json", data, content_type='application/json',
+                                        if_generation_match=if_generation_match)
+            except PreconditionFailed:
+                raise
+            except Exception as e:
+                if attempt == JOB_PERSIST_ATTEMPTS - 1:
+                    raise
+                logger.warning(f"Could not persist job {job['id']} (attempt {attempt + 1}): {e}")
+                backoff_sleep(attempt)
+
+    def _load(self, job_id):
+        if self.backend is None:
+            return None
+        found = self.backend.get(f"{JOB_PREFIX}{job_id}.json")
+        return (json.loads(found[0]), found[1]) if found else None
+
+    def _claim_key(self, dedup_key, job_id):
+        if self.backend is None:
+            return True
+        data = json.dumps({'dedup_key': dedup_key, 'job_id': job_id}).encode('utf-8')
+        try:
+            self.backend.put(_key_path(dedup_key), data, content_type='application/json', if_generation_match=0)
+            return True
+        except PreconditionFailed:
+            pass
+        # The key exists: take it over only if its job is finished (or gone).
+        found = self.backend.get(_key_path(dedup_key))
+        if found:
+            holder = self._load(json.loads(found[0]).get('job_id'))
+            if holder and holder[0]['status'] in ACTIVE_STATUSES:
+                return False
+            try:
+                self.backend.put(_key_path(dedup_key), data, content_type='application/json',
+                                 if_generation_match=found[1])
+                return True
+            except PreconditionFailed:
+                return False
+        return self._claim_key(dedup_key, job_id)
+
+    def _claim_or_find(self, dedup_key, job_id):
+        """
+        Claim dedup_key for job_id (returns None) or return the active job holding it.
+        A lost claim whose holder has already finished is simply tried again.
+        """
+        for attempt in range(MAX_WRITE_ATTEMPTS):
+            if self._claim_key(dedup_key, job_id):
+                return None
+            # Another instance claimed the key between our check and now.
+            existing = self._active_for_key(dedup_key)
+            if existing:
+                return existing
+            backoff_sleep(attempt)
+        raise WriteConflictError(f"Gave up claiming job key {dedup_key} after {MAX_WRITE_ATTEMPTS} attempts")
+
+    def _active_for_key(self, dedup_key):
+        with self._cond:
+            for job, _ in self._jobs.values():
+                if job['dedup_key'] == dedup_key and job['status'] in ACTIVE_STATUSES:
+                    return public_view(job)
+        if self.backend is None:
+            return None
+        found = self.backend.get(_key_path(dedup_key))
+        if not found:
+            return None
+        holder = self._load(json.loads(found[0]).get('job_id'))
+        if holder and holder[0]['status'] in ACTIVE_STATUSES:
+            return public_view(holder[0])
+        return None
+
+    def _release_key(self, job):
+        if self.backend is not None and job.get('dedup_key'):
+            found = self.backend.get(_key_path(job['dedup_key']))
+            if found and json.loads(found[0]).get('job_id') == job['id']:
+                self.backend.delete(_key_path(job['dedup_key']), if_generation_match=found[1])
+
+    # Scheduling
+
+    def _schedule(self, job, generation):
+        with self._cond:
+            self._jobs[job['id']] = (job, generation)
+            heapq.heappush(self._heap, (job['next_attempt_at'], next(self._seq), job['id']))
+            self._cond.notify()
+
+    def _next_due(self):
+        """Block until a job is due; returns (job, generation)."""
+        with self._cond:
+            while True:
+                if self._heap:
+                    run_at, _, job_id = self._heap[0]
+                    wait = run_at - time.time()
+                    if wait <= 0:
+                        heapq.heappop(self._heap)
+                        entry = self._jobs.get(job_id)
+                        if entry and entry[0]['status'] == 'queued':
+                            entry[0]['status'] = 'running'
+                            return entry
+                        continue
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+    def _work(self):
+        while True:
+            job, generation = self._next_due()
+            try:
+                self._run(job, generation)
+            except Exception as e:
+                logger.error(f"Job worker error on {job['id']}: {e}")
+
+    def _run(self, job, generation):
+        kind = job['kind']
+        JOB_WAIT_SECONDS.observe(max(0.0, time.time() - job['next_attempt_at']), kind=kind)
+        job['attempts'] += 1
+        job['started_at'] = datetime.utcnow().isoformat()
+        job['leased_until'] = time.time() + JOB_LEASE_SECONDS
+        if generation is not None:
+            try:
+                generation = self._persist(job, if_generation_match=generation)
+            except PreconditionFailed:
+                # Another instance adopted it; it is theirs now.
+                with self._cond:
+                    self._jobs.pop(job['id'], None)
+                return
+            except Exception as e:
+                # The stored record is still at the last generation we know; later writes build on it.
+                logger.error(f"Could not record the start of job {job['id']}: {e}")
+
+        handler = self._handlers[kind][0]
+        started = time.perf_counter()
+        try:
+            result = handler(job['payload'])
+        except Exception as e:
+            JOB_RUN_SECONDS.observe(time.perf_counter() - started, kind=kind)
+            self._failed(job, generation, e)
+            return
+        JOB_RUN_SECONDS.observe(time.perf_counter() - started, kind=kind)
+        JOB_RUNS.inc(kind=kind, outcome='succeeded')
+        job['status'] = 'succeeded'
+        job['result'] = result
+        job['error'] = None
+        self._finish(job, generation)
+
+    def _failed(self, job, generation, error):
+        job['error'] = str(error)
+        if job['attempts'] >= job['max_attempts']:
+            JOB_RUNS.inc(kind=job['kind'], outcome='failed')
+            logger.error(f"Job {job['id']} ({job['kind']}) failed after {job['attempts']} attempts: {error}")
+            job['status'] = 'failed'
+            self._finish(job, generation)
+            on_failure = self._handlers[job['kind']][2]
+            if on_failure:
+                try:
+                    on_failure(job['payload'], error)
+                except Exception as e:
+                    logger.error(f"on_failure for job {job['id']} raised: {e}")
+            return
+        JOB_RUNS.inc(kind=job['kind'], outcome='retry')
+        delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** (job['attempts'] - 1))
+        job['status'] = 'queued'
+        job['next_attempt_at'] = time.time() + delay * random.uniform(0.5, 1.5)
+        job['leased_until'] = job['next_attempt_at'] + JOB_LEASE_SECONDS
+        logger.warning(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed ({error}); "
+                       f"retrying in {job['next_attempt_at'] - time.time():.0f}s")
+        if generation is not None:
+            try:
+                generation = self._persist(job, if_generation_match=generation)
+            except PreconditionFailed:
+                with self._cond:
+                    self._jobs.pop(job['id'], None)
+                return
+            except Exception as e:
+                logger.error(f"Could not record the retry of job {job['id']}: {e}")
+        self._schedule(job, generation)
+
+    def _finish(self, job, generation):
+        job['finished_at'] = datetime.utcnow().isoformat()
+        job['finished_ts'] = time.time()
+        with self._cond:
+            self._jobs.pop(job['id'], None)
+            self._unrecorded[job['id']] = (job, generation)
+        self._record_finished(job['id'])
+        with self._cond:
+            # Recent results answer status polls without a storage read.
+            self._finished[job['id']] = job
+            while len(self._finished) > JOB_RECENT_FINISHED:
+                self._finished.popitem(last=False)
+
+    def _record_finished(self, job_id):
+        """
+        Store a finished job's final record and release its key. On a write error it stays
+        in _unrecorded (and is not adopted by _rescan), which tries again.
+        """
+        with self._cond:
+            entry = self._unrecorded.get(job_id)
+        if not entry:
+            return
+        job, generation = entry
+        try:
+            if generation is not None:
+                self._persist(job, if_generation_match=generation)
+        except PreconditionFailed:
+            # Adopted elsewhere meanwhile: the record and the key are the adopter's now.
+            logger.warning(f"Job {job_id} was adopted elsewhere before its end was recorded")
+            with self._cond:
+                self._unrecorded.pop(job_id, None)
+            return
+        except Exception as e:
+            logger.error(f"Could not record the end of job {job_id}, will retry: {e}")
+            return
+        with self._cond:
+            self._unrecorded.pop(job_id, None)
+        try:
+            self._release_key(job)
+        except Exception as e:
+            logger.error(f"Could not release the key of job {job_id}: {e}")
+
+    # Recovery
+
+    def _rescan_loop(self):
+        while True:
+            try:
+                self._rescan()
+            except Exception as e:
+                logger.error(f"Job rescan failed: {e}")
+            time.sleep(JOB_RESCAN_SECONDS)
+
+    def _rescan(self):
+        """Retry unrecorded job ends, adopt active jobs whose lease expired and prune old finished records."""
+        if self.backend is None:
+            return
+        with self._cond:
+            unrecorded = list(self._unrecorded)
+        for job_id in unrecorded:
+            self._record_finished(job_id)
+        now = time.time()
+        adopted = 0
+        stale = []
+        for info in list(self.backend.list(JOB_PREFIX)):
+            if info.name.startswith(JOB_KEY_PREFIX):
+                continue
+            job_id = info.name[len(JOB_PREFIX):].rsplit('.json', 1)[0]
+            with self._cond:
+                if job_id in self._jobs or job_id in self._unrecorded:
+                    continue
+            loaded = self._load(job_id)
+            if not loaded:
+                continue
+            job, generation = loaded
+            if job['status'] in ACTIVE_STATUSES:
+                if job.get('leased_until', 0) > now or job['kind'] not in self._handlers:
+                    continue
+                job['status'] = 'queued'
+                job['next_attempt_at'] = now
+                self._schedule(job, generation)
+                adopted += 1
+            elif now - job.get('finished_ts', now) > JOB_RETENTION_SECONDS:
+                stale.append(info.name)
+        if stale:
+            self.backend.delete_many(stale)
+        if adopted:
+            logger.info(f"Adopted {adopted} unfinished job(s) from storage")
+
+
+def register_metrics(runner):
+    """Expose queued/running counts for runner on /metrics."""
+    CallbackMetric('background_jobs', 'Jobs on this instance by status.', ('status',),
+                   lambda: {(status,): runner.depth(status) for status in ACTIVE_STATUSES})
@@ -0,0 +1,305 @@
+"""
+Outbound mail queue for the contact form: the request enqueues, a background thread sends.
+
+Each message is stored as JSON under mail_queue/pending/ in the storage backend before
+the request returns, so a restart or a crashed instance does not lose it. The
+sender thread keeps one authenticated SMTP connection open while there is work
+(closing it after MAIL_CONNECTION_IDLE_SECONDS), sends up to MAIL_BATCH_SIZE due
+messages per pass, and retries failures with jittered exponential backoff. After
+MAIL_MAX_ATTEMPTS a message moves to mail_queue/failed/.
+
+Instances coordinate through leases: a record carries leased_until and every
+claim is a generation-matched write, so a message is only sent by the instance
+that owns it, and records left by a dead instance are adopted once the lease
+expires.
+
+SMTP settings: SMTP_HOST (default smtp.gmail.com), SMTP_PORT (587), SMTP_STARTTLS (on),
+GMAIL_APP_PASSWORD (login is skipped when unset, e.g. for a local SMTP stand-in).
+Depth, oldest message age, delivery latency and outcomes are mail_queue_* metrics.
+"""
+
+import json
+import logging
+import os
+import random
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from google.api_core.exceptions import PreconditionFailed
+
+from metrics import CallbackMetric, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+MAIL_PENDING_PREFIX = 'mail_queue/pending/'
+MAIL_FAILED_PREFIX = 'mail_queue/failed/'
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1').lower() not in ('0', 'false', 'no', 'off')
+SMTP_TIMEOUT_SECONDS = 30
+MAIL_BATCH_SIZE = 20
+MAIL_MAX_ATTEMPTS = 8
+MAIL_RETRY_BASE_SECONDS = 30
+MAIL_RETRY_MAX_SECONDS = 3600
+MAIL_LEASE_SECONDS = 300
+MAIL_CONNECTION_IDLE_SECONDS = 60
+# How often to look in storage for messages orphaned by other instances.
+MAIL_RESCAN_SECONDS = 300
+# Rejections of one message; the connection is still fine for the next.
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+# outcome: sent, retry or failed
+MAIL_DELIVERIES = Counter('mail_queue_deliveries_total', 'Delivery attempts by outcome.', ('outcome',))
+MAIL_DELIVERY_LATENCY = Histogram('mail_queue_delivery_latency_seconds', 'Time from enqueue to successful send.',
+                                  buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0))
+MAIL_SMTP_CONNECTIONS = Counter('mail_queue_smtp_connections_total', 'SMTP connections opened (and logged in).')
+
+
+class MailQueue:
+    """Durable queue of plain-text messages with a single background sender thread."""
+
+    def __init__(self, backend, sender, password=None, host=SMTP_HOST, port=SMTP_PORT, starttls=SMTP_STARTTLS):
+        self.backend = backend
+        self.sender = sender
+        self.password = password
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        # id -> (record, generation or None when it could not be persisted)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._smtp = None
+        self._smtp_last_used = 0.0
+        self._last_rescan = 0.0
+
+    def is_configured(self):
+        """Whether mail can actually be sent: a password, or an explicit (stand-in) SMTP host."""
+        return bool(self.password) or 'SMTP_HOST' in os.environ
+
+    def enqueue(self, to, subject, body):
+        """Persist the message and wake the sender; returns its id without touching SMTP."""
+        now = time.time()
+        message_id = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:12]}"
+        record = {
+            'id': message_id,
+            'to': to,
+            'subject': subject,
+            'body': body,
+            'enqueued_at': now,
+            'attempts': 0,
+            'next_attempt_at': now,
+            'leased_until': now + MAIL_LEASE_SECONDS,
+            'last_error': None,
+        }
+        generation = None
+        if self.backend is not None:
+            try:
+                generation = self._write(record, if_generation_match=0)
+            except Exception as e:
+                # Still send it from memory; it just will not survive a restart.
+                logger.error(f"Could not persist queued mail {message_id}: {e}")
+        with self._lock:
+            self._pending[message_id] = (record, generation)
+        self.start()
+        self._wake.set()
+        return message_id
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='mail-queue', daemon=True)
+                self._thread.start()
+
+    def depth(self):
+        with self._lock:
+            return len(self._pending)
+
+    def oldest_age_seconds(self):
+        with self._lock:
+            oldest = min((record['enqueued_at'] for record, _ in self._pending.values()), default=None)
+        return time.time() - oldest if oldest is not None else 0.0
+
+    def _write(self, record, if_generation_match=None, prefix=MAIL_PENDING_PREFIX):
+        return self.backend.put(f"{prefix}{record['id']}.json", json.dumps(record).encode('utf-8'),
+                                content_type='application/json', if_generation_match=if_generation_match)
+
+    def _recover(self):
+        """Adopt persisted messages whose lease has expired (left by a restart or another instance)."""
+        self._last_rescan = time.time()
+        if self.backend is None:
+            return
+        try:
+            infos = list(self.backend.list(MAIL_PENDING_PREFIX))
+        except Exception as e:
+            logger.error(f"Could not list queued mail: {e}")
+            return
+        for info in infos:
+            message_id = info.name[len(MAIL_PENDING_PREFIX):].rsplit('.json', 1)[0]
+            with self._lock:
+                if message_id in self._pending:
+                    continue
+            found = self.backend.get(info.name)
+            if not found:
+                continue
+            record = json.loads(found[0])
+            if record.get('leased_until', 0) > time.time():
+                continue
+            with self._lock:
+                self._pending.setdefault(message_id, (record, found[1]))
+        if infos:
+            logger.info(f"Mail queue: {self.depth()} message(s) pending after rescan")
+
+    def _claim(self, record, generation):
+        """Extend our lease with a generation-matched write: (new generation, False if another instance took it)."""
+        if generation is None:
+            return None, True
+        record['leased_until'] = time.time() + MAIL_LEASE_SECONDS
+        try:
+            return self._write(record, if_generation_match=generation), True
+        except PreconditionFailed:
+            return None, False
+
+    def _connection(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.noop()
+                return self._smtp
+            except (smtplib.SMTPException, OSError):
+                self._close_connection()
+        smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+        try:
+            if self.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+            if self.password:
+                smtp.login(self.sender, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        MAIL_SMTP_CONNECTIONS.inc()
+        self._smtp = smtp
+        return smtp
+
+    def _close_connection(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                self._smtp.close()
+            self._smtp = None
+
+    def _build_message(self, record):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = record['to']
+        msg['Subject'] = record['subject']
+        msg.attach(MIMEText(record['body'], 'plain'))
+        return msg
+
+    def _run(self):
+        self._recover()
+        while True:
+            # Clear before delivering so an enqueue during the pass is not missed.
+            self._wake.clear()
+            try:
+                self._deliver_due()
+            except Exception as e:
+                logger.error(f"Mail queue sender error: {e}")
+            if self._smtp is not None and time.time() - self._smtp_last_used > MAIL_CONNECTION_IDLE_SECONDS:
+                self._close_connection()
+            self._wake.wait(self._next_wait())
+            if time.time() - self._last_rescan > MAIL_RESCAN_SECONDS:
+                self._recover()
+
+    def _next_wait(self):
+        with self._lock:
+            next_due = min((record['next_attempt_at'] for record, _ in self._pending.values()), default=None)
+        wait = MAIL_RESCAN_SECONDS if next_due is None else max(0.0, next_due - time.time())
+        if self._smtp is not None:
+            wait = min(wait, MAIL_CONNECTION_IDLE_SECONDS)
+        return wait
+
+    def _deliver_due(self):
+        now = time.time()
+        with self._lock:
+            due = sorted((entry for entry in self._pending.values() if entry[0]['next_attempt_at'] <= now),
+                         key=lambda entry: entry[0]['next_attempt_at'])[:MAIL_BATCH_SIZE]
+        for record, generation in due:
+            generation, owned = self._claim(record, generation)
+            if not owned:
+                with self._lock:
+                    self._pending.pop(record['id'], None)
+                continue
+            try:
+                self._connection().send_message(self._build_message(record))
+            except MESSAGE_ERRORS as e:
+                self._record_failure(record, generation, e)
+                continue
+            except Exception as e:
+                # Connection or login trouble: the rest of the batch waits for the next pass.
+                self._close_connection()
+                self._record_failure(record, generation, e)
+                return
+            self._smtp_last_used = time.time()
+            self._record_success(record, generation)
+
+    def _record_success(self, record, generation):
+        MAIL_DELIVERIES.inc(outcome='sent')
+        MAIL_DELIVERY_LATENCY.observe(time.time() - record['enqueued_at'])
+        logger.info(f"Sent queued mail {record['id']} after {record['attempts'] + 1} attempt(s)")
+        with self._lock:
+            self._pending.pop(record['id'], None)
+        if generation is not None:
+            try:
+                self.backend.delete(f"{MAIL_PENDING_PREFIX}{record['id']}.json", if_generation_match=generation)
+            except Exception as e:
+                logger.error(f"Sent mail {record['id']} but could not remove its queue record: {e}")
+
+    def _record_failure(self, record, generation, error):
+        record['attempts'] += 1
+        record['last_error'] = str(error)
+        if record['attempts'] >= MAIL_MAX_ATTEMPTS:
+            MAIL_DELIVERIES.inc(outcome='failed')
+            logger.error(f"Giving up on mail {record['id']} after {record['attempts']} attempts: {error}")
+            with self._lock:
+                self._pending.pop(record['id'], None)
+            if generation is not None:
+                try:
+                    self._write(record, prefix=MAIL_FAILED_PREFIX)
+                    self.backend.delete(f"{MAIL_PENDING_PREFIX}{record['id']}.json", if_generation_match=generation)
+                except Exception as e:
+                    logger.error(f"Could not move mail {record['id']} to {MAIL_FAILED_PREFIX}: {e}")
+            return
+
+        MAIL_DELIVERIES.inc(outcome='retry')
+        delay = min(MAIL_RETRY_MAX_SECONDS, MAIL_RETRY_BASE_SECONDS * 2 ** (record['attempts'] - 1))
+        record['next_attempt_at'] = time.time() + delay * random.uniform(0.5, 1.5)
+        # Keep the lease past the retry so other instances leave it alone while we are alive.
+        record['leased_until'] = record['next_attempt_at'] + MAIL_LEASE_SECONDS
+        logger.warning(f"Mail {record['id']} attempt {record['attempts']} failed ({error}); "
+                       f"retrying in {record['next_attempt_at'] - time.time():.0f}s")
+        if generation is not None:
+            try:
+                generation = self._write(record, if_generation_match=generation)
+            except PreconditionFailed:
+                with self._lock:
+                    self._pending.pop(record['id'], None)
+                return
+            except Exception as e:
+                logger.error(f"Could not persist retry state for mail {record['id']}: {e}")
+        with self._lock:
+            self._pending[record['id']] = (record, generation)
+
+
+def register_metrics(queue):
+    """Expose queue depth and oldest message age for this queue on /metrics."""
+    CallbackMetric('mail_queue_depth', 'Messages waiting to be sent.', (), lambda: {(): queue.depth()})
+    CallbackMetric('mail_queue_oldest_age_seconds', 'Age of the oldest unsent message.', (),
+                   lambda: {(): round(queue.oldest_age_seconds(), 3)})
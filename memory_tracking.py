@@ -0,0 +1,136 @@
+"""
+Optional per-request memory tracking for the heavy paths (uploads, PDFs, thumbnails).
+
+Enable with MEMORY_TRACKING=1. For each tracked request (MEMORY_TRACKED_ENDPOINTS,
+comma-separated Flask endpoint names or '*'), tracemalloc records the peak Python
+heap and the allocation sites still holding memory when the view returns, and
+/proc reports RSS growth and whether the process high-water mark moved. Requests
+over MEMORY_LOG_THRESHOLD_MB log a warning with their top allocation sites; every
+tracked request feeds the request_memory_* metrics.
+
+tracemalloc is process-wide, so one request is tracked at a time; concurrent
+requests on other threads are simply not tracked.
+"""
+
+import json
+import logging
+import os
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+MEMORY_TRACKING_ENABLED = os.environ.get('MEMORY_TRACKING', '').lower() in ('1', 'true', 'on', 'yes')
+DEFAULT_TRACKED_ENDPOINTS = 'add_gallery_item,generate_gallery_pdf,generate_gallery_item_pdf'
+MEMORY_TRACKED_ENDPOINTS = frozenset(
+    endpoint.strip() for endpoint in
+    os.environ.get('MEMORY_TRACKED_ENDPOINTS', DEFAULT_TRACKED_ENDPOINTS).split(',') if endpoint.strip()
+)
+MEMORY_LOG_THRESHOLD_BYTES = int(float(os.environ.get('MEMORY_LOG_THRESHOLD_MB', '32')) * 1024 * 1024)
+MEMORY_TRACE_FRAMES = 8
+MEMORY_TOP_SITES = 10
+
+_MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 2, 5, 10, 25, 50, 100, 200, 400))
+REQUEST_PEAK_HEAP = Histogram('request_memory_peak_heap_bytes', 'Peak Python heap allocated during a tracked request.',
+                              ('endpoint',), buckets=_MEMORY_BUCKETS)
+REQUEST_RSS_GROWTH = Histogram('request_memory_rss_growth_bytes', 'RSS growth across a tracked request.',
+                               ('endpoint',), buckets=_MEMORY_BUCKETS)
+REQUESTS_OVER_THRESHOLD = Counter('request_memory_threshold_exceeded_total',
+                                  'Tracked requests whose peak heap or RSS growth crossed the threshold.', ('endpoint',))
+PROCESS_RSS = Gauge('process_resident_memory_bytes', 'Resident set size after the last tracked request.')
+PROCESS_PEAK_RSS = Gauge('process_peak_resident_memory_bytes', 'Peak resident set size of the process.')
+
+_tracking_lock = threading.Lock()
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss_bytes():
+    """Resident set size from /proc (Linux, App Engine); 0 where unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return 0
+    # ru_maxrss is kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def should_track(endpoint):
+    return MEMORY_TRACKING_ENABLED and endpoint is not None and (
+        '*' in MEMORY_TRACKED_ENDPOINTS or endpoint in MEMORY_TRACKED_ENDPOINTS)
+
+
+class RequestMemoryTracker:
+    def __init__(self):
+        self.rss_before = current_rss_bytes()
+        self.peak_rss_before = peak_rss_bytes()
+        tracemalloc.start(MEMORY_TRACE_FRAMES)
+
+    def finish(self, endpoint, path=None):
+        """Stop tracing and return the summary; logs and counts it when over threshold."""
+        try:
+            _, peak_heap = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__),))
+        finally:
+            tracemalloc.stop()
+            _tracking_lock.release()
+        rss_after = current_rss_bytes()
+        peak_rss_after = peak_rss_bytes()
+
+        top_sites = []
+        for stat in snapshot.statistics('traceback')[:MEMORY_TOP_SITES]:
+            frame = stat.traceback[-1] if len(stat.traceback) else None
+            top_sites.append({
+                'site': f"{frame.filename}:{frame.lineno}" if frame else 'unknown',
+                'stack': [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+                'bytes': stat.size,
+                'blocks': stat.count,
+            })
+
+        summary = {
+            'event': 'request_memory',
+            'endpoint': endpoint,
+            'path': path,
+            'peak_heap_bytes': peak_heap,
+            'rss_growth_bytes': rss_after - self.rss_before,
+            'rss_after_bytes': rss_after,
+            'peak_rss_growth_bytes': peak_rss_after - self.peak_rss_before,
+            'top_sites': top_sites,
+        }
+
+        label = endpoint or 'unmatched'
+        REQUEST_PEAK_HEAP.observe(peak_heap, endpoint=label)
+        REQUEST_RSS_GROWTH.observe(max(0, summary['rss_growth_bytes']), endpoint=label)
+        PROCESS_RSS.set(rss_after)
+        PROCESS_PEAK_RSS.set(peak_rss_after)
+        if max(peak_heap, summary['rss_growth_bytes']) >= MEMORY_LOG_THRESHOLD_BYTES:
+            REQUESTS_OVER_THRESHOLD.inc(endpoint=label)
+            logger.warning(json.dumps(summary, sort_keys=True))
+        return summary
+
+
+def start_tracking():
+    """A tracker for the current request, or None if another request (or tool) is already tracing."""
+    if not _tracking_lock.acquire(blocking=False):
+        return None
+    if tracemalloc.is_tracing():
+        _tracking_lock.release()
+        return None
+    try:
+        return RequestMemoryTracker()
+    except Exception:
+        _tracking_lock.release()
+        raise
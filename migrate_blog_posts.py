@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+One-off migration: split blog_posts.json into blog/posts/<id>.json blobs plus
+blog/manifest.json (see BlogStorage).
+
+Run from repo root: python migrate_blog_posts.py
+Requires same GCS credentials as the main app. Safe to re-run: it does nothing
+once the manifest exists. blog_posts.json is left untouched as a backup.
+"""
+
+import sys
+import os
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from blog_storage import BlogStorage
+
+def migrate_blog_posts():
+    """Copy every legacy post into its own blob and write the summary manifest."""
+    blog_storage = BlogStorage()
+    
+    print(f"Migrating {blog_storage.bucket_name}/{blog_storage.blog_blob_name}...")
+    migrated = blog_storage.migrate_to_per_post_blobs()
+    
+    summaries = blog_storage.get_blog_post_summaries()
+    print(f"\n{'='*60}")
+    print(f"Summary:")
+    print(f"  Migration performed: {migrated}")
+    print(f"  Posts in manifest: {len(summaries)}")
+    print(f"{'='*60}")
+    
+    return migrated
+
+if __name__ == '__main__':
+    try:
+        if migrate_blog_posts():
+            print("\n✓ Blog posts migrated to per-post blobs")
+        else:
+            print("\n✓ Nothing to migrate (manifest already present or migration failed; see log above)")
+    except Exception as e:
+        print(f"\n✗ Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -6,7 +6,7 @@ Used by Flask routes in app.py: /gallery/<id>/pdf and /gallery/pdf.
 
 import os
 import io
-import requests
+import time
 from PIL import Image
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak
@@ -16,10 +16,17 @@ from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 import logging
 
+import http_client
+from metrics import Counter, Histogram
+
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PDF_BUILD_SECONDS = Histogram('pdf_build_seconds', 'Time to build a PDF export.', ('kind', 'outcome'),
+                              buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+PDF_IMAGES = Counter('pdf_images_total', 'Images fetched for PDF exports.', ('outcome',))
+
 class GalleryPDFGenerator:
     """Builds PDF documents from gallery item dicts (title, body, images where possible)."""
 
@@ -73,6 +80,7 @@ class GalleryPDFGenerator:
         )
     
     def generate_gallery_item_pdf(self, gallery_item, output_path: str) -> bool:
+        started = time.perf_counter()
         try:
             doc = SimpleDocTemplate(output_path, pagesize=A4)
             story = []
@@ -173,17 +181,20 @@ class GalleryPDFGenerator:
             
             doc.build(story)
             logger.info(f"Successfully generated PDF: {output_path}")
+            PDF_BUILD_SECONDS.observe(time.perf_counter() - started, kind='item', outcome='success')
             return True
             
         except Exception as e:
             logger.error(f"Error generating PDF: {str(e)}")
+            PDF_BUILD_SECONDS.observe(time.perf_counter() - started, kind='item', outcome='error')
             return False
     
     def _add_image_to_story(self, story, image_url: str, caption: str = "") -> bool:
         try:
-            response = requests.get(image_url, timeout=30)
+            response = http_client.fetch(image_url, use='image')
             if response.status_code != 200:
                 logger.warning(f"Failed to download image from {image_url}")
+                PDF_IMAGES.inc(outcome='download_failed')
                 return False
             
             image_data = io.BytesIO(response.content)
@@ -213,13 +224,16 @@ class GalleryPDFGenerator:
                 caption_para = Paragraph(f"<i>{caption}</i>", self.creator_style)
                 story.append(caption_para)
             
+            PDF_IMAGES.inc(outcome='added')
             return True
             
         except Exception as e:
             logger.error(f"Error adding image to PDF: {str(e)}")
+            PDF_IMAGES.inc(outcome='error')
             return False
     
     def generate_gallery_pdf(self, gallery_items, output_path: str) -> bool:
+        started = time.perf_counter()
         try:
             doc = SimpleDocTemplate(output_path, pagesize=A4)
             story = []
@@ -282,8 +296,10 @@ class GalleryPDFGenerator:
             
             doc.build(story)
             logger.info(f"Successfully generated gallery PDF: {output_path}")
+            PDF_BUILD_SECONDS.observe(time.perf_counter() - started, kind='gallery', outcome='success')
             return True
             
         except Exception as e:
             logger.error(f"Error generating gallery PDF: {str(e)}")
+            PDF_BUILD_SECONDS.observe(time.perf_counter() - started, kind='gallery', outcome='error')
             return False
\ No newline at end of file
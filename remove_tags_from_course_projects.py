@@ -48,6 +48,10 @@ def remove_tags_from_course_projects():
                 except Exception as e:
                     print(f"  ✗ Error updating item {item_id}: {str(e)}")
     
+    if updated_count:
+        # _save_json bypasses the gallery index, so refresh the card summaries once.
+        cloud_storage.rebuild_gallery_index()
+    
     print(f"\n{'='*60}")
     print(f"Summary:")
     print(f"  Total items checked: {len(all_items)}")
@@ -0,0 +1,192 @@
+"""
+On-demand sampling profiler for single requests (admin only).
+
+An admin adds ?_profile=1 (or the header X-Profile: 1) to any URL. While that request
+runs, a background thread samples its stack every PROFILE_SAMPLE_INTERVAL seconds
+and the report ranks the hottest call stacks and functions. Storage calls (from
+storage_metrics) and template rendering are broken out both as exact timings and as
+their share of samples. Reports are stored under profiles/ in the bucket; only the
+newest PROFILE_RETENTION are kept.
+
+Overhead is bounded: sampling (not tracing) keeps the slowdown to a few percent; at
+most one request per process is profiled at a time, at most one every
+PROFILE_MIN_INTERVAL_SECONDS; and sampling stops after PROFILE_MAX_SECONDS even if
+the request keeps running.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+PROFILE_QUERY_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PREFIX = 'profiles/'
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_MAX_SECONDS = 10.0
+PROFILE_MIN_INTERVAL_SECONDS = 10.0
+PROFILE_MAX_STACK_DEPTH = 60
+PROFILE_TOP_STACKS = 25
+PROFILE_TOP_FUNCTIONS = 40
+PROFILE_RETENTION = 50
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+# Frames in these files count towards the storage / template share of samples.
+STORAGE_MARKERS = (os.path.join(_ROOT, 'storage_backend.py'), os.path.join('google', 'cloud', 'storage'))
+TEMPLATE_MARKERS = (os.sep + 'jinja2' + os.sep, os.path.join('flask', 'templating.py'))
+
+_profile_lock = threading.Lock()
+_last_profile_started = 0.0
+
+
+def profile_requested(request):
+    flag = request.args.get(PROFILE_QUERY_PARAM) or request.headers.get(PROFILE_HEADER)
+    return bool(flag) and flag.lower() not in ('0', 'false', 'no')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_ROOT + os.sep):
+        filename = os.path.relpath(filename, _ROOT)
+    return f"{code.co_name} ({filename}:{frame.f_lineno})"
+
+
+def _classify(stack_files):
+    if any(marker in path for path in stack_files for marker in STORAGE_MARKERS):
+        return 'storage'
+    if any(marker in path for path in stack_files for marker in TEMPLATE_MARKERS):
+        return 'template'
+    return 'app'
+
+
+class RequestSampler:
+    """Samples one thread's stack on a background thread until stopped or out of time."""
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL, max_seconds=PROFILE_MAX_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.categories = Counter()
+        self.samples = 0
+        self.truncated = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        deadline = self.started + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.perf_counter() > deadline:
+                self.truncated = True
+                return
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            labels = []
+            files = []
+            while frame is not None and len(labels) < PROFILE_MAX_STACK_DEPTH:
+                labels.append(_frame_label(frame))
+                files.append(frame.f_code.co_filename)
+                frame = frame.f_back
+            del frame
+            # Outermost first, like collapsed-stack (flame graph) input.
+            self.stacks[';'.join(reversed(labels))] += 1
+            self.categories[_classify(files)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+
+def try_start_profile():
+    """A running sampler for the current thread, or None when another profile is running or too recent."""
+    global _last_profile_started
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    now = time.monotonic()
+    if _last_profile_started and now - _last_profile_started < PROFILE_MIN_INTERVAL_SECONDS:
+        _profile_lock.release()
+        return None
+    _last_profile_started = now
+    return RequestSampler(threading.get_ident()).start()
+
+
+def finish_profile(sampler):
+    """Stop sampling and free the per-process profiling slot."""
+    try:
+        return sampler.stop()
+    finally:
+        _profile_lock.release()
+
+
+def build_report(sampler, request_info, storage_stats=None, template_timings=()):
+    """Ranked report: hottest collapsed stacks, hottest functions (self and inclusive), breakdowns."""
+    samples = sampler.samples or 1
+    self_counts = Counter()
+    inclusive_counts = Counter()
+    for stack, count in sampler.stacks.items():
+        frames = stack.split(';')
+        self_counts[frames[-1]] += count
+        for label in set(frames):
+            inclusive_counts[label] += count
+
+    def share(count):
+        return round(100.0 * count / samples, 1)
+
+    return {
+        'request': request_info,
+        'created_at': datetime.utcnow().isoformat(),
+        'duration_ms': round(sampler.elapsed * 1000, 3),
+        'sample_interval_ms': sampler.interval * 1000,
+        'samples': sampler.samples,
+        'truncated': sampler.truncated,
+        'breakdown': {
+            'sample_share_percent': {category: share(count) for category, count in sampler.categories.items()},
+            'storage': storage_stats.as_dict() if storage_stats else {},
+            'storage_ms': round(storage_stats.total_seconds * 1000, 3) if storage_stats else 0.0,
+            'templates': [{'template': name, 'ms': round(seconds * 1000, 3)} for name, seconds in template_timings],
+            'template_ms': round(sum(seconds for _, seconds in template_timings) * 1000, 3),
+        },
+        'hottest_stacks': [{'samples': count, 'percent': share(count), 'stack': stack.split(';')}
+                           for stack, count in sampler.stacks.most_common(PROFILE_TOP_STACKS)],
+        'hottest_functions_self': [{'function': label, 'samples': count, 'percent': share(count)}
+                                   for label, count in self_counts.most_common(PROFILE_TOP_FUNCTIONS)],
+        'hottest_functions_inclusive': [{'function': label, 'samples': count, 'percent': share(count)}
+                                        for label, count in inclusive_counts.most_common(PROFILE_TOP_FUNCTIONS)],
+    }
+
+
+def save_report(backend, report):
+    """Store report under profiles/ and prune the oldest beyond PROFILE_RETENTION. Returns its name."""
+    endpoint = (report['request'].get('endpoint') or 'unmatched').replace('/', '_')
+    name = f"{PROFILE_PREFIX}{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{endpoint}_{uuid.uuid4().hex[:8]}.json"
+    backend.put(name, json.dumps(report, default=str).encode('utf-8'), content_type='application/json')
+    names = sorted(info.name for info in backend.list(PROFILE_PREFIX))
+    if len(names) > PROFILE_RETENTION:
+        backend.delete_many(names[:-PROFILE_RETENTION])
+    return name
+
+
+def list_reports(backend):
+    """Stored report names, newest first."""
+    return sorted((info.name for info in backend.list(PROFILE_PREFIX)), reverse=True)
+
+
+def load_report(backend, name):
+    if not name.startswith(PROFILE_PREFIX):
+        name = PROFILE_PREFIX + name
+    found = backend.get(name)
+    return json.loads(found[0]) if found else None
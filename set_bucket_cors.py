@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+One-off setup: allow the site's origins to PUT files straight into the bucket.
+
+The admin gallery form uploads images to resumable upload URLs on
+storage.googleapis.com (see create_upload_sessions in app.py); browsers only send
+those cross-origin PUTs if the bucket's CORS configuration allows the origin.
+
+Run from repo root:
+    python set_bucket_cors.py https://tech-ethics-club.appspot.com http://localhost:5000
+Requires same GCS credentials as the main app. Replaces any existing CORS rules.
+"""
+
+import sys
+import os
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from storage_backend import get_shared_gcs_client
+
+
+def set_bucket_cors(origins):
+    bucket_name = os.environ.get('STORAGE_BUCKET', 'tech-ethics-club-uploads')
+    bucket = get_shared_gcs_client().get_bucket(bucket_name)
+    bucket.cors = [{
+        'origin': list(origins),
+        'method': ['PUT', 'POST'],
+        'responseHeader': ['Content-Type', 'Content-Range', 'Location', 'X-Goog-Upload-Status'],
+        'maxAgeSeconds': 3600,
+    }]
+    bucket.patch()
+    print(f"CORS on gs://{bucket.name} now allows uploads from: {', '.join(origins)}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    try:
+        set_bucket_cors(sys.argv[1:])
+    except Exception as e:
+        print(f"\n✗ Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
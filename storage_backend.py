@@ -0,0 +1,606 @@
+"""
+Storage backends: the small set of object-store operations the app relies on.
+
+CloudStorageManager, BlogStorage and CisNewsStorage talk to a StorageBackend
+instead of google.cloud.storage directly, so the app can run, be profiled and be
+load-tested without GCS credentials:
+
+    STORAGE_BACKEND=gcs      (default) Google Cloud Storage
+    STORAGE_BACKEND=memory   process-local dict, shared by every manager
+    STORAGE_BACKEND=local    files under STORAGE_LOCAL_ROOT (default .local_storage)
+    STORAGE_LATENCY_MS=40    optional per-operation delay to mimic GCS round trips
+    STORAGE_LATENCY_JITTER_MS=10
+
+With GCS, every backend shares one process-wide storage.Client (get_shared_gcs_client)
+whose keep-alive connection pool is sized by GCS_POOL_SIZE; gcs_pool_stats() reports
+its utilization and connection reuse.
+
+upload_stream writes a body of unknown length (file-like or chunk iterator) without
+buffering it whole: GCS gets one request up to STREAM_UPLOAD_CHUNK_SIZE and a chunked
+resumable upload beyond, with the public-read ACL set in that same upload (or nothing
+extra when GCS_UNIFORM_ACCESS says the bucket grants public read itself).
+
+create_upload_session hands the browser a resumable upload URL (GCS, including an
+emulator via STORAGE_EMULATOR_HOST); the memory and local backends return None and
+the app accepts those uploads itself.
+
+Whatever the choice, the backend is wrapped in storage_metrics.InstrumentedBackend,
+so every operation is counted and timed.
+
+Every backend has GCS semantics: objects carry an integer generation that changes
+on each write, if_generation_match=0 means "create only", and failed preconditions
+raise google.api_core.exceptions.PreconditionFailed, so callers handle all
+backends the same way.
+"""
+
+import io
+import itertools
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterator, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+GCS_PUBLIC_URL_BASE = 'https://storage.googleapis.com'
+
+# Thread fan-out the managers use for storage I/O (gallery moves, blog post fetches).
+STORAGE_IO_WORKERS = 8
+# Keep-alive connections per host for the shared GCS client: every I/O worker plus
+# the request thread and one spare, so a full fan-out never opens throwaway connections.
+GCS_POOL_SIZE = int(os.environ.get('GCS_POOL_SIZE', STORAGE_IO_WORKERS + 2))
+# storage.googleapis.com plus the OAuth token endpoint.
+GCS_POOL_HOSTS = 4
+# upload_stream sends bodies up to this size in one request; larger or still-growing
+# ones go as a resumable upload in chunks of this size (GCS wants multiples of 256KiB),
+# so at most about one chunk is held in memory.
+STREAM_UPLOAD_CHUNK_SIZE = int(os.environ.get('STREAM_UPLOAD_CHUNK_MB', 8)) * 1024 * 1024
+# Buckets with uniform bucket-level access reject per-object ACLs; public objects
+# are then readable through the bucket's IAM policy instead.
+GCS_UNIFORM_ACCESS = os.environ.get('GCS_UNIFORM_ACCESS', '').lower() in ('1', 'true', 'on', 'yes')
+
+_shared_gcs_client = None
+_shared_gcs_client_lock = threading.Lock()
+
+
+class ObjectInfo(NamedTuple):
+    name: str
+    generation: int
+    size: int
+    time_created: Optional[datetime]
+
+
+class UploadResult(NamedTuple):
+    generation: int
+    size: int
+    resumable: bool  # sent in several requests rather than one
+
+
+def iter_chunks(source, chunk_size: int = STREAM_UPLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+    """Byte chunks from bytes, a file-like object (anything with read) or an iterable of chunks."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        if len(source):
+            yield bytes(source)
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        for chunk in source:
+            if chunk:
+                yield chunk.encode('utf-8') if isinstance(chunk, str) else bytes(chunk)
+
+
+class ChunkReader(io.RawIOBase):
+    """Forward-only file over an iterator of chunks; read(n) returns n bytes until the end."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b''
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        parts = [self._pending]
+        available = len(self._pending)
+        while size is None or size < 0 or available < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            parts.append(chunk)
+            available += len(chunk)
+        data = b''.join(parts)
+        if size is not None and size >= 0:
+            data, self._pending = data[:size], data[size:]
+        else:
+            self._pending = b''
+        self._position += len(data)
+        return data
+
+    def tell(self):
+        return self._position
+
+
+class StorageBackend:
+    """Interface implemented by every backend. Object names are bucket-relative paths."""
+
+    kind = 'abstract'
+
+    def __init__(self, bucket_name: str, public_base_url: str = None):
+        self.bucket_name = bucket_name
+        # Non-GCS backends default to GCS-shaped URLs, so media links in copied data
+        # still resolve and blob_path_from_url keeps working.
+        self.public_base_url = (public_base_url or f"{GCS_PUBLIC_URL_BASE}/{bucket_name}").rstrip('/')
+
+    def get(self, name: str) -> Optional[Tuple[bytes, int]]:
+        """(content, generation) in one round trip, or None if the object does not exist."""
+        raise NotImplementedError
+
+    def stat(self, name: str) -> Optional[ObjectInfo]:
+        """Metadata only, or None if the object does not exist."""
+        raise NotImplementedError
+
+    def exists(self, name: str) -> bool:
+        return self.stat(name) is not None
+
+    def put(self, name: str, data: bytes, content_type: str = None, if_generation_match: int = None) -> int:
+        """Write data and return the new generation. Raises PreconditionFailed on a mismatch."""
+        raise NotImplementedError
+
+    def put_file(self, name: str, file_obj, content_type: str = None) -> int:
+        return self.put(name, file_obj.read(), content_type)
+
+    def upload_stream(self, name: str, source, content_type: str = None, public: bool = False) -> UploadResult:
+        """
+        Write source (bytes, a file-like object or an iterable of chunks, length not
+        needed up front) and, with public=True, make it publicly readable in the same
+        operation. Backends that can stream override this; the default buffers.
+        """
+        data = b''.join(iter_chunks(source))
+        return UploadResult(self.put(name, data, content_type), len(data), False)
+
+    def list(self, prefix: str = '', max_results: int = None) -> Iterator[ObjectInfo]:
+        """Objects under prefix in name order, yielded lazily."""
+        raise NotImplementedError
+
+    def delete(self, name: str, if_generation_match: int = None) -> bool:
+        """Delete one object; False if it did not exist."""
+        raise NotImplementedError
+
+    def delete_many(self, names) -> int:
+        """Best-effort delete of several objects; missing ones are ignored. Returns names attempted."""
+        names = list(names)
+        for name in names:
+            self.delete(name)
+        return len(names)
+
+    def make_public(self, name: str) -> str:
+        """Grant public read on the object and return its public URL."""
+        return self.public_url(name)
+
+    def public_url(self, name: str) -> str:
+        return f"{self.public_base_url}/{quote(name)}"
+
+    def create_upload_session(self, name: str, content_type: str = None, size: int = None,
+                              origin: str = None) -> Optional[str]:
+        """
+        A URL a browser can PUT the object's bytes to without credentials, or None
+        if this backend cannot accept uploads directly (the app then receives them).
+        The object must not exist yet; size, when given, is enforced by the store.
+        """
+        return None
+
+
+def _check_generation(name: str, current: int, if_generation_match: Optional[int]):
+    """current is 0 for a missing object, matching GCS's create-only convention."""
+    if if_generation_match is not None and if_generation_match != current:
+        raise PreconditionFailed(f"{name}: generation {current} does not match {if_generation_match}")
+
+
+class GCSBackend(StorageBackend):
+    kind = 'gcs'
+
+    def __init__(self, client, bucket_name: str):
+        super().__init__(bucket_name)
+        self.client = client
+        self.bucket = client.bucket(bucket_name)
+
+    def get(self, name):
+        blob = self.bucket.blob(name)
+        try:
+            content = blob.download_as_bytes()
+        except NotFound:
+            return None
+        # The media response carries x-goog-generation, so no metadata request is needed.
+        return content, int(blob.generation or 0)
+
+    def stat(self, name):
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            return None
+        return ObjectInfo(blob.name, int(blob.generation or 0), blob.size or 0, blob.time_created)
+
+    def put(self, name, data, content_type=None, if_generation_match=None):
+        blob = self.bucket.blob(name)
+        blob.upload_from_string(data, content_type=content_type or 'application/octet-stream',
+                                if_generation_match=if_generation_match)
+        return int(blob.generation or 0)
+
+    def put_file(self, name, file_obj, content_type=None):
+        blob = self.bucket.blob(name)
+        blob.upload_from_file(file_obj, content_type=content_type)
+        return int(blob.generation or 0)
+
+    def upload_stream(self, name, source, content_type=None, public=False):
+        predefined_acl = 'publicRead' if public and not GCS_UNIFORM_ACCESS else None
+        content_type = content_type or 'application/octet-stream'
+        chunks = iter_chunks(source)
+        head, head_size = [], 0
+        for chunk in chunks:
+            head.append(chunk)
+            head_size += len(chunk)
+            if head_size > STREAM_UPLOAD_CHUNK_SIZE:
+                break
+        blob = self.bucket.blob(name)
+        if head_size <= STREAM_UPLOAD_CHUNK_SIZE:
+            # The whole body is in hand: one multipart request carries data, metadata and ACL.
+            blob.upload_from_string(b''.join(head), content_type=content_type, predefined_acl=predefined_acl)
+            return UploadResult(int(blob.generation or 0), head_size, False)
+
+        # Longer than one chunk (length still unknown): a resumable upload sent chunk by
+        # chunk as the source is read.
+        blob.chunk_size = STREAM_UPLOAD_CHUNK_SIZE
+        reader = ChunkReader(itertools.chain(head, chunks))
+        del head
+        blob.upload_from_file(reader, content_type=content_type, predefined_acl=predefined_acl)
+        return UploadResult(int(blob.generation or 0), reader.tell(), True)
+
+    def list(self, prefix='', max_results=None):
+        for blob in self.client.list_blobs(self.bucket_name, prefix=prefix or None, max_results=max_results):
+            yield ObjectInfo(blob.name, int(blob.generation or 0), blob.size or 0, blob.time_created)
+
+    def delete(self, name, if_generation_match=None):
+        try:
+            self.bucket.delete_blob(name, if_generation_match=if_generation_match)
+            return True
+        except NotFound:
+            return False
+
+    def delete_many(self, names):
+        names = list(names)
+        if names:
+            with self.client.batch(raise_exception=False):
+                for name in names:
+                    self.bucket.delete_blob(name)
+        return len(names)
+
+    def make_public(self, name):
+        blob = self.bucket.blob(name)
+        blob.make_public()
+        return blob.public_url
+
+    def public_url(self, name):
+        return self.bucket.blob(name).public_url
+
+    def create_upload_session(self, name, content_type=None, size=None, origin=None):
+        # A resumable session URI authorizes the upload by itself, so it works with any
+        # credentials (no private key needed for signing) and against the emulator.
+        # Passing origin makes GCS answer the browser's cross-origin PUTs to it.
+        blob = self.bucket.blob(name)
+        return blob.create_resumable_upload_session(content_type=content_type or 'application/octet-stream',
+                                                    size=size, origin=origin, if_generation_match=0)
+
+
+class MemoryBackend(StorageBackend):
+    """Objects in a dict. Deterministic and fast; state lives as long as the process."""
+
+    kind = 'memory'
+
+    def __init__(self, bucket_name: str = 'memory', public_base_url: str = None):
+        super().__init__(bucket_name, public_base_url)
+        # name -> (content, generation, content_type, time_created)
+        self._objects = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def get(self, name):
+        entry = self._objects.get(name)
+        return (entry[0], entry[1]) if entry else None
+
+    def stat(self, name):
+        entry = self._objects.get(name)
+        return ObjectInfo(name, entry[1], len(entry[0]), entry[3]) if entry else None
+
+    def put(self, name, data, content_type=None, if_generation_match=None):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self._lock:
+            entry = self._objects.get(name)
+            _check_generation(name, entry[1] if entry else 0, if_generation_match)
+            self._generation += 1
+            created = entry[3] if entry else datetime.now(timezone.utc)
+            self._objects[name] = (bytes(data), self._generation, content_type, created)
+            return self._generation
+
+    def list(self, prefix='', max_results=None):
+        names = sorted(name for name in list(self._objects) if name.startswith(prefix or ''))
+        for name in names[:max_results]:
+            info = self.stat(name)
+            if info:
+                yield info
+
+    def delete(self, name, if_generation_match=None):
+        with self._lock:
+            entry = self._objects.get(name)
+            if entry is None:
+                if if_generation_match:
+                    raise PreconditionFailed(f"{name}: does not exist")
+                return False
+            _check_generation(name, entry[1], if_generation_match)
+            del self._objects[name]
+            return True
+
+
+class LocalFileBackend(StorageBackend):
+    """
+    Objects as files under root, one file per object name. Writes go through a temp
+    file and os.replace, and the generation is the file's mtime in nanoseconds
+    (bumped when the clock is too coarse), so it changes on every write.
+    Preconditions are enforced within one process.
+    """
+
+    kind = 'local'
+    _TEMP_PREFIX = '.tmp-'
+
+    def __init__(self, root: str, bucket_name: str = 'local', public_base_url: str = None):
+        super().__init__(bucket_name, public_base_url)
+        self.root = os.path.abspath(root)
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, name):
+        path = os.path.abspath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Object name escapes the storage root: {name}")
+        return path
+
+    def _generation_of(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def get(self, name):
+        path = self._path(name)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+                generation = os.fstat(f.fileno()).st_mtime_ns
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+        return content, generation
+
+    def stat(self, name):
+        path = self._path(name)
+        if not os.path.isfile(path):
+            return None
+        st = os.stat(path)
+        return ObjectInfo(name, st.st_mtime_ns, st.st_size, datetime.fromtimestamp(st.st_mtime, timezone.utc))
+
+    def put(self, name, data, content_type=None, if_generation_match=None):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return self._write(name, (data,), if_generation_match)[0]
+
+    def upload_stream(self, name, source, content_type=None, public=False):
+        generation, size = self._write(name, iter_chunks(source))
+        return UploadResult(generation, size, False)
+
+    def _write(self, name, chunks, if_generation_match=None):
+        """Write chunks to a temp file and move it into place: (generation, size)."""
+        path = self._path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, f"{self._TEMP_PREFIX}{os.getpid()}-{threading.get_ident()}")
+        # Fill the temp file outside the lock: a slow source must not hold up other writes.
+        size = 0
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        with self._lock:
+            current = self._generation_of(path)
+            try:
+                _check_generation(name, current, if_generation_match)
+            except PreconditionFailed:
+                os.remove(temp_path)
+                raise
+            os.replace(temp_path, path)
+            generation = self._generation_of(path)
+            if generation <= current:
+                generation = current + 1
+                os.utime(path, ns=(generation, generation))
+            return generation, size
+
+    def list(self, prefix='', max_results=None):
+        names = []
+        for directory, _, files in os.walk(self.root):
+            for filename in files:
+                if filename.startswith(self._TEMP_PREFIX):
+                    continue
+                name = os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, '/')
+                if name.startswith(prefix or ''):
+                    names.append(name)
+        for name in sorted(names)[:max_results]:
+            info = self.stat(name)
+            if info:
+                yield info
+
+    def delete(self, name, if_generation_match=None):
+        path = self._path(name)
+        with self._lock:
+            current = self._generation_of(path)
+            if not current:
+                if if_generation_match:
+                    raise PreconditionFailed(f"{name}: does not exist")
+                return False
+            _check_generation(name, current, if_generation_match)
+            os.remove(path)
+            return True
+
+
+class LatencyBackend(StorageBackend):
+    """Wraps another backend and sleeps before every operation, like a network round trip."""
+
+    def __init__(self, inner: StorageBackend, latency_seconds: float, jitter_seconds: float = 0.0):
+        self.inner = inner
+        self.kind = f"{inner.kind}+latency"
+        self.bucket_name = inner.bucket_name
+        self.public_base_url = inner.public_base_url
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+
+    def _round_trip(self):
+        delay = self.latency_seconds + random.uniform(0, self.jitter_seconds)
+        if delay > 0:
+            time.sleep(delay)
+
+    def get(self, name):
+        self._round_trip()
+        return self.inner.get(name)
+
+    def stat(self, name):
+        self._round_trip()
+        return self.inner.stat(name)
+
+    def put(self, name, data, content_type=None, if_generation_match=None):
+        self._round_trip()
+        return self.inner.put(name, data, content_type, if_generation_match)
+
+    def put_file(self, name, file_obj, content_type=None):
+        self._round_trip()
+        return self.inner.put_file(name, file_obj, content_type)
+
+    def upload_stream(self, name, source, content_type=None, public=False):
+        self._round_trip()
+        return self.inner.upload_stream(name, source, content_type, public)
+
+    def list(self, prefix='', max_results=None):
+        self._round_trip()
+        return self.inner.list(prefix, max_results)
+
+    def delete(self, name, if_generation_match=None):
+        self._round_trip()
+        return self.inner.delete(name, if_generation_match)
+
+    def delete_many(self, names):
+        # GCS batches deletes into one request, so charge one round trip.
+        self._round_trip()
+        return self.inner.delete_many(names)
+
+    def make_public(self, name):
+        self._round_trip()
+        return self.inner.make_public(name)
+
+    def public_url(self, name):
+        return self.inner.public_url(name)
+
+    def create_upload_session(self, name, content_type=None, size=None, origin=None):
+        self._round_trip()
+        return self.inner.create_upload_session(name, content_type, size, origin)
+
+
+# One MemoryBackend per bucket, so every manager in the process sees the same objects.
+_memory_backends = {}
+_memory_backends_lock = threading.Lock()
+
+
+def _gcs_credentials():
+    """(credentials, project) using the same precedence the app has always used."""
+    import google.auth
+    from google.cloud import storage
+    from google.oauth2 import service_account
+
+    if os.environ.get('GAE_ENV'):
+        print("Running on App Engine - using default credentials")
+    elif os.path.exists('tech-ethics-club-sa-key.json'):
+        print("Using service account key for authentication")
+        credentials = service_account.Credentials.from_service_account_file(
+            'tech-ethics-club-sa-key.json', scopes=storage.Client.SCOPE)
+        return credentials, credentials.project_id
+    else:
+        print("Using default credentials for authentication")
+    return google.auth.default(scopes=storage.Client.SCOPE)
+
+
+def create_gcs_client():
+    """A storage.Client whose HTTP session keeps up to GCS_POOL_SIZE connections alive."""
+    from google.auth.transport.requests import AuthorizedSession
+    from google.cloud import storage
+    from requests.adapters import HTTPAdapter
+
+    credentials, project = _gcs_credentials()
+    session = AuthorizedSession(credentials)
+    # pool_block=False: a burst past the pool size opens extra connections
+    # instead of waiting; they are closed on return rather than kept alive.
+    adapter = HTTPAdapter(pool_connections=GCS_POOL_HOSTS, pool_maxsize=GCS_POOL_SIZE, pool_block=False)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)  # STORAGE_EMULATOR_HOST
+    client = storage.Client(project=os.environ.get('GOOGLE_CLOUD_PROJECT') or project,
+                            credentials=credentials, _http=session)
+    client._pool_adapter = adapter
+    return client
+
+
+def get_shared_gcs_client():
+    """The process-wide client (created on first use) shared by every manager."""
+    global _shared_gcs_client
+    with _shared_gcs_client_lock:
+        if _shared_gcs_client is None:
+            _shared_gcs_client = create_gcs_client()
+        return _shared_gcs_client
+
+
+def gcs_pool_stats():
+    """Per-host connection pool usage of the shared client: [] until it exists (see http_client)."""
+    adapter = getattr(_shared_gcs_client, '_pool_adapter', None)
+    if adapter is None:
+        return []
+    from http_client import adapter_pool_stats
+    return adapter_pool_stats(adapter)
+
+
+def create_storage_backend(bucket_name: str) -> StorageBackend:
+    """Instrumented backend selected by STORAGE_BACKEND; raises if GCS credentials cannot be set up."""
+    from storage_metrics import InstrumentedBackend
+
+    kind = os.environ.get('STORAGE_BACKEND', 'gcs').strip().lower()
+    if kind == 'memory':
+        with _memory_backends_lock:
+            backend = _memory_backends.get(bucket_name)
+            if backend is None:
+                backend = _memory_backends[bucket_name] = MemoryBackend(bucket_name)
+    elif kind == 'local':
+        root = os.environ.get('STORAGE_LOCAL_ROOT', '.local_storage')
+        backend = LocalFileBackend(os.path.join(root, bucket_name), bucket_name)
+    elif kind == 'gcs':
+        backend = GCSBackend(get_shared_gcs_client(), bucket_name)
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {kind}")
+
+    latency_ms = float(os.environ.get('STORAGE_LATENCY_MS', 0) or 0)
+    jitter_ms = float(os.environ.get('STORAGE_LATENCY_JITTER_MS', 0) or 0)
+    if latency_ms or jitter_ms:
+        backend = LatencyBackend(backend, latency_ms / 1000.0, jitter_ms / 1000.0)
+    return InstrumentedBackend(backend)
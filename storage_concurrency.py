@@ -0,0 +1,69 @@
+"""
+Optimistic concurrency for JSON documents in GCS.
+
+Readers fetch a document together with its generation in one request (see
+storage_backend.StorageBackend.get); writers upload with
+if_generation_match so a write only lands if nobody else wrote in between, and
+retry the whole read-modify-write with jittered backoff when they lose the race.
+This works across threads, processes and App Engine instances, and readers
+never block. Generation 0 means "create only if the blob does not exist yet".
+"""
+
+import json
+import random
+import time
+
+from google.api_core.exceptions import PreconditionFailed
+
+MAX_WRITE_ATTEMPTS = 10
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 2.0
+
+
+class WriteConflictError(Exception):
+    """A document kept changing underneath us for MAX_WRITE_ATTEMPTS tries."""
+
+
+def backoff_sleep(attempt: int):
+    delay = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt))
+    time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+def read_json_with_generation(backend, blob_name: str, default_factory):
+    """Return (data, generation); a missing blob gives (default_factory(), 0)."""
+    found = backend.get(blob_name)
+    if found is None:
+        return default_factory(), 0
+    content, generation = found
+    return json.loads(content), generation
+
+
+def write_json_if_generation(backend, blob_name: str, data, generation: int):
+    """Upload data only if the blob is still at generation. Raises PreconditionFailed otherwise."""
+    return backend.put(
+        blob_name,
+        json.dumps(data, default=str).encode('utf-8'),
+        content_type='application/json',
+        if_generation_match=generation
+    )
+
+
+def update_json(backend, blob_name: str, mutate, default_factory):
+    """
+    Read-modify-write one JSON blob under a generation precondition.
+
+    mutate(data) edits data in place and returns a result. A falsy result means
+    "nothing to change": no write happens and the result is returned as is.
+    mutate may run several times, so it must not have side effects outside data.
+    """
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        data, generation = read_json_with_generation(backend, blob_name, default_factory)
+        result = mutate(data)
+        if not result:
+            return result
+        try:
+            write_json_if_generation(backend, blob_name, data, generation)
+            return result
+        except PreconditionFailed:
+            backoff_sleep(attempt)
+    raise WriteConflictError(f"Gave up writing {blob_name} after {MAX_WRITE_ATTEMPTS} conflicts")
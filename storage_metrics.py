@@ -0,0 +1,249 @@
+"""
+Storage call accounting: every backend operation is counted and timed by kind.
+
+InstrumentedBackend (wrapped around every backend by create_storage_backend)
+reports each call here. Calls are attributed to the current request through a
+context variable opened by begin_request/end_request in app.py, and are also
+added to process-wide totals and per-endpoint aggregates. Worker threads that
+do storage I/O for a request should run through bind_request_stats so their
+calls are charged to that request.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+
+from http_client import pool_metric_values
+from metrics import CallbackMetric, Counter, Histogram
+from storage_backend import StorageBackend, gcs_pool_stats
+
+logger = logging.getLogger(__name__)
+
+STORAGE_OP_KINDS = ('list', 'exists', 'get', 'put', 'delete', 'make_public')
+
+STORAGE_OPERATION_SECONDS = Histogram('storage_operation_seconds', 'Storage backend operation latency by kind.',
+                                      ('kind',))
+# mode: single (one request) or resumable (chunked)
+STORAGE_UPLOAD_BYTES = Counter('storage_upload_bytes_total', 'Bytes written by upload_stream.', ('mode',))
+STORAGE_UPLOAD_THROUGHPUT = Histogram('storage_upload_throughput_bytes_per_second', 'Throughput of each upload_stream call.',
+                                      ('mode',), buckets=tuple(mb * 1024 * 1024 for mb in
+                                                               (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100)))
+
+
+# Connection pool of the shared GCS client (empty with the memory/local backends).
+GCS_POOL_MAX = CallbackMetric('storage_http_pool_max_connections', 'Keep-alive connections allowed per host.',
+                              ('host',), pool_metric_values(gcs_pool_stats, 'max_size'))
+GCS_POOL_IN_USE = CallbackMetric('storage_http_pool_in_use_connections', 'Connections checked out right now.',
+                                 ('host',), pool_metric_values(gcs_pool_stats, 'in_use'))
+GCS_POOL_IDLE = CallbackMetric('storage_http_pool_idle_connections', 'Open connections waiting in the pool.',
+                               ('host',), pool_metric_values(gcs_pool_stats, 'idle'))
+GCS_POOL_OPENED = CallbackMetric('storage_http_connections_opened_total', 'New connections opened.',
+                                 ('host',), pool_metric_values(gcs_pool_stats, 'connections_opened'), kind='counter')
+GCS_POOL_REQUESTS = CallbackMetric('storage_http_requests_total', 'HTTP requests sent.',
+                                   ('host',), pool_metric_values(gcs_pool_stats, 'requests'), kind='counter')
+GCS_POOL_REUSED = CallbackMetric('storage_http_connections_reused_total',
+                                 'Requests served on an already-open keep-alive connection.',
+                                 ('host',), pool_metric_values(gcs_pool_stats, 'reused'), kind='counter')
+
+
+class StorageCallStats:
+    """Counts and seconds per operation kind; safe to update from several threads."""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(STORAGE_OP_KINDS, 0)
+        self.seconds = dict.fromkeys(STORAGE_OP_KINDS, 0.0)
+        self._lock = threading.Lock()
+
+    def add(self, kind, seconds):
+        with self._lock:
+            self.counts[kind] += 1
+            self.seconds[kind] += seconds
+
+    @property
+    def total_calls(self):
+        return sum(self.counts.values())
+
+    @property
+    def total_seconds(self):
+        return sum(self.seconds.values())
+
+    def as_dict(self):
+        """{kind: {'count', 'ms'}} for the kinds that were used."""
+        with self._lock:
+            return {kind: {'count': count, 'ms': round(self.seconds[kind] * 1000, 3)}
+                    for kind, count in self.counts.items() if count}
+
+
+_request_stats = contextvars.ContextVar('storage_request_stats', default=None)
+_process_stats = StorageCallStats()
+# endpoint -> {'requests': n, 'calls': {kind: n}, 'seconds': {kind: s}}
+_endpoint_stats = {}
+_endpoint_stats_lock = threading.Lock()
+
+
+def record(kind, seconds):
+    _process_stats.add(kind, seconds)
+    STORAGE_OPERATION_SECONDS.observe(seconds, kind=kind)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add(kind, seconds)
+
+
+def begin_request():
+    """Start attributing storage calls to a new request; returns a token for end_request."""
+    return _request_stats.set(StorageCallStats())
+
+
+def current_request_stats():
+    return _request_stats.get()
+
+
+def end_request(token, endpoint=None):
+    """Stop attributing calls, fold the request into the aggregates and return its stats."""
+    stats = _request_stats.get()
+    _request_stats.reset(token)
+    if stats is not None and endpoint:
+        with _endpoint_stats_lock:
+            aggregate = _endpoint_stats.setdefault(endpoint, {
+                'requests': 0,
+                'calls': dict.fromkeys(STORAGE_OP_KINDS, 0),
+                'seconds': dict.fromkeys(STORAGE_OP_KINDS, 0.0),
+            })
+            aggregate['requests'] += 1
+            for kind in STORAGE_OP_KINDS:
+                aggregate['calls'][kind] += stats.counts[kind]
+                aggregate['seconds'][kind] += stats.seconds[kind]
+    return stats
+
+
+def bind_request_stats(fn):
+    """Wrap fn so calls it makes from a worker thread are charged to the calling request."""
+    stats = _request_stats.get()
+
+    def run(*args, **kwargs):
+        token = _request_stats.set(stats)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _request_stats.reset(token)
+    return run
+
+
+def process_totals():
+    """Process-wide {kind: {'count', 'ms'}} since start-up."""
+    return _process_stats.as_dict()
+
+
+def endpoint_totals():
+    """Per-endpoint request counts and storage calls/seconds by kind since start-up."""
+    with _endpoint_stats_lock:
+        return {endpoint: {'requests': aggregate['requests'],
+                           'calls': dict(aggregate['calls']),
+                           'seconds': dict(aggregate['seconds'])}
+                for endpoint, aggregate in _endpoint_stats.items()}
+
+
+def server_timing_header(stats):
+    """Server-Timing value: one total entry plus one entry per kind used."""
+    entries = [f'storage;dur={stats.total_seconds * 1000:.1f};desc="{stats.total_calls} calls"']
+    for kind, values in stats.as_dict().items():
+        entries.append(f'storage-{kind.replace("_", "-")};dur={values["ms"]:.1f};desc="{values["count"]}"')
+    return ', '.join(entries)
+
+
+def log_request(method, path, endpoint, status, duration_seconds, stats):
+    """One structured (JSON) line per request with its storage usage."""
+    logger.info(json.dumps({
+        'event': 'request_storage',
+        'method': method,
+        'path': path,
+        'endpoint': endpoint,
+        'status': status,
+        'duration_ms': round(duration_seconds * 1000, 3),
+        'storage_calls': stats.total_calls,
+        'storage_ms': round(stats.total_seconds * 1000, 3),
+        'storage': stats.as_dict(),
+    }, sort_keys=True))
+
+
+class InstrumentedBackend(StorageBackend):
+    """Times every operation of the wrapped backend and reports it to record()."""
+
+    def __init__(self, inner: StorageBackend):
+        self.inner = inner
+        self.kind = inner.kind
+        self.bucket_name = inner.bucket_name
+        self.public_base_url = inner.public_base_url
+
+    def _timed(self, kind, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            record(kind, time.perf_counter() - started)
+
+    def get(self, name):
+        return self._timed('get', self.inner.get, name)
+
+    def stat(self, name):
+        return self._timed('exists', self.inner.stat, name)
+
+    def exists(self, name):
+        return self._timed('exists', self.inner.exists, name)
+
+    def put(self, name, data, content_type=None, if_generation_match=None):
+        return self._timed('put', self.inner.put, name, data, content_type, if_generation_match)
+
+    def put_file(self, name, file_obj, content_type=None):
+        return self._timed('put', self.inner.put_file, name, file_obj, content_type)
+
+    def upload_stream(self, name, source, content_type=None, public=False):
+        started = time.perf_counter()
+        try:
+            result = self.inner.upload_stream(name, source, content_type, public)
+        finally:
+            seconds = time.perf_counter() - started
+            record('put', seconds)
+        mode = 'resumable' if result.resumable else 'single'
+        STORAGE_UPLOAD_BYTES.inc(result.size, mode=mode)
+        if seconds > 0:
+            STORAGE_UPLOAD_THROUGHPUT.observe(result.size / seconds, mode=mode)
+        return result
+
+    def list(self, prefix='', max_results=None):
+        # Listing is lazy (GCS pages on demand), so time the iteration, not just the call.
+        elapsed = 0.0
+        started = time.perf_counter()
+        try:
+            iterator = iter(self.inner.list(prefix, max_results))
+            elapsed += time.perf_counter() - started
+            while True:
+                started = time.perf_counter()
+                try:
+                    info = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - started
+                    return
+                elapsed += time.perf_counter() - started
+                yield info
+        finally:
+            record('list', elapsed)
+
+    def delete(self, name, if_generation_match=None):
+        return self._timed('delete', self.inner.delete, name, if_generation_match)
+
+    def delete_many(self, names):
+        # One batched request, whatever the number of names.
+        return self._timed('delete', self.inner.delete_many, names)
+
+    def make_public(self, name):
+        return self._timed('make_public', self.inner.make_public, name)
+
+    def public_url(self, name):
+        return self.inner.public_url(name)
+
+    def create_upload_session(self, name, content_type=None, size=None, origin=None):
+        # One initiation request; the upload itself goes from the browser to the store.
+        return self._timed('put', self.inner.create_upload_session, name, content_type, size, origin)
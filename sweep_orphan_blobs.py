@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Maintenance: delete uploaded blobs that nothing references any more.
+
+Streams through uploads/, incoming/ (browser-uploaded originals), blog_images/ and
+cis_news_images/ and cross-references every object against gallery items (including
+inactive ones), blog posts ([IMAGE:...] markers) and CIS news image URLs. Unreferenced
+blobs older than the grace period are deleted in batches, which also clears originals
+from abandoned upload forms.
+
+Any failure while reading references aborts the sweep before anything is deleted, and
+a delete run is refused if no references were found or more than MAX_ORPHAN_RATIO of
+the scanned blobs look orphaned (--force overrides the ratio check).
+
+Run from repo root:
+    python sweep_orphan_blobs.py                 # dry run, report only
+    python sweep_orphan_blobs.py --delete        # actually delete
+    python sweep_orphan_blobs.py --grace-days 14
+    python sweep_orphan_blobs.py --delete --force
+Requires same GCS credentials as the main app.
+"""
+
+import argparse
+import json
+import re
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cloud_storage import CloudStorageManager
+from storage_concurrency import read_json_with_generation
+
+SWEEP_PREFIXES = ('uploads/', 'incoming/', 'blog_images/', 'cis_news_images/')
+DEFAULT_GRACE_DAYS = 7
+# Refuse to delete when more than this share of the scanned blobs look orphaned;
+# that is far more likely a bad read than a real clean-up (override with --force).
+MAX_ORPHAN_RATIO = 0.5
+BLOG_IMAGE_MARKER = re.compile(r'\[IMAGE:([^\]]+)\]')
+
+
+class SweepAborted(Exception):
+    """A source of references could not be read completely; nothing was deleted."""
+
+
+def _read_json(backend, name, default_factory):
+    """Parsed blob, or default_factory() if it does not exist. Read and parse errors propagate."""
+    data, generation = read_json_with_generation(backend, name, default_factory)
+    return data
+
+
+def _iter_json_blobs(backend, prefix):
+    for info in backend.list(prefix):
+        if not info.name.endswith('.json'):
+            continue
+        found = backend.get(info.name)
+        if found is None:
+            continue  # deleted since the listing, so it references nothing
+        yield json.loads(found[0])
+
+
+def collect_referenced_paths(cloud_storage):
+    """
+    Blob paths referenced by any gallery item (active or not), blog post or CIS news item.
+
+    Reads go straight to the backend so that a failed list, get or parse raises
+    SweepAborted instead of silently shrinking the referenced set.
+    """
+    from blog_storage import BlogStorage
+    from cis_news_storage import CisNewsStorage
+
+    backend = cloud_storage.backend
+    blog_storage = BlogStorage(backend=backend)
+    news_storage = CisNewsStorage(backend=backend)
+    referenced = set()
+
+    def add_url(url):
+        path = cloud_storage.blob_path_from_url((url or '').strip())
+        if path:
+            referenced.add(path)
+
+    try:
+        for item in _iter_json_blobs(backend, 'gallery/'):
+            referenced.update(cloud_storage.gallery_item_media_paths(item))
+
+        # Every post blob plus the legacy single-file layout, which is kept as a backup.
+        posts = list(_iter_json_blobs(backend, blog_storage.post_prefix))
+        posts += _read_json(backend, blog_storage.blog_blob_name, list) or []
+        for post in posts:
+            for url in BLOG_IMAGE_MARKER.findall(post.get('content') or ''):
+                add_url(url)
+
+        for news_item in _read_json(backend, news_storage.blob_name, list) or []:
+            add_url(news_item.get('image_url'))
+    except Exception as e:
+        raise SweepAborted(f"Could not read every reference source: {e}") from e
+    return referenced
+
+
+def sweep_orphan_blobs(dry_run=True, grace_days=DEFAULT_GRACE_DAYS, cloud_storage=None,
+                       max_orphan_ratio=MAX_ORPHAN_RATIO):
+    """
+    Also run by the app as a background job (see app.py), with its own manager passed in.
+
+    Raises SweepAborted if the references cannot be read. A delete run is refused
+    (reported, nothing deleted) when no references were found at all or more than
+    max_orphan_ratio of the scanned blobs would go; pass max_orphan_ratio=1 to force.
+    """
+    cloud_storage = cloud_storage or CloudStorageManager()
+    if not cloud_storage._storage_available:
+        print("Storage unavailable; nothing to sweep")
+        return {'scanned': 0, 'orphaned': 0, 'bytes': 0, 'deleted': 0}
+
+    print("Collecting referenced media...")
+    referenced = collect_referenced_paths(cloud_storage)
+    print(f"  {len(referenced)} referenced blobs")
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=grace_days)
+    scanned = 0
+    reclaimed_bytes = 0
+    orphans = []
+
+    for prefix in SWEEP_PREFIXES:
+        # list_blobs pages lazily; only orphan names are kept.
+        for blob in cloud_storage.backend.list(prefix):
+            scanned += 1
+            if blob.name in referenced:
+                continue
+            if blob.time_created and blob.time_created > cutoff:
+                continue
+            reclaimed_bytes += blob.size or 0
+            print(f"  {'[dry run] ' if dry_run else ''}orphan: {blob.name} ({(blob.size or 0) / 1024:.1f}KB)")
+            orphans.append(blob.name)
+
+    refused = None
+    if orphans and not referenced:
+        refused = "no referenced media was found"
+    elif scanned and len(orphans) / scanned > max_orphan_ratio:
+        refused = (f"{len(orphans)} of {scanned} scanned blobs look orphaned "
+                   f"(limit {max_orphan_ratio:.0%})")
+
+    deleted = 0
+    if not dry_run and not refused:
+        deleted = cloud_storage.delete_blobs(orphans)
+
+    print(f"\n{'='*60}")
+    print(f"Summary{' (dry run)' if dry_run else ''}:")
+    print(f"  Blobs scanned: {scanned}")
+    print(f"  Unreferenced blobs older than {grace_days} days: {len(orphans)}")
+    print(f"  Bytes {'reclaimable' if dry_run or refused else 'reclaimed'}: {reclaimed_bytes} ({reclaimed_bytes / 1024 / 1024:.1f}MB)")
+    if refused:
+        print(f"  ⚠️ Not deleting: {refused}. Check the bucket, then rerun with --force if this is expected.")
+    print(f"{'='*60}")
+
+    result = {'scanned': scanned, 'orphaned': len(orphans), 'bytes': reclaimed_bytes, 'deleted': deleted}
+    if refused:
+        result['refused'] = refused
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--delete', action='store_true', help='delete orphans (default is a dry run)')
+    parser.add_argument('--grace-days', type=int, default=DEFAULT_GRACE_DAYS,
+                        help='keep unreferenced blobs newer than this (uploads in progress)')
+    parser.add_argument('--force', action='store_true',
+                        help=f'delete even if more than {MAX_ORPHAN_RATIO:.0%} of blobs look orphaned')
+    args = parser.parse_args()
+    try:
+        sweep_orphan_blobs(dry_run=not args.delete, grace_days=args.grace_days,
+                           max_orphan_ratio=1.0 if args.force else MAX_ORPHAN_RATIO)
+    except Exception as e:
+        print(f"\n✗ Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
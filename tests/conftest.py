@@ -0,0 +1,14 @@
+"""
+Shared setup for the pytest suite: run from the repo root with `python -m pytest`.
+
+The app modules build storage singletons at import time, so the in-memory backend
+is selected before anything from the project is imported.
+"""
+
+import os
+import sys
+
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+os.environ.setdefault('STORAGE_BUCKET', 'test-bucket')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+import blog_search
+from blog_storage import BlogStorage
+from storage_backend import MemoryBackend
+
+
+class CountingBackend(MemoryBackend):
+    """MemoryBackend that counts full reads per object name."""
+
+    def __init__(self, bucket_name):
+        super().__init__(bucket_name)
+        self.gets = {}
+
+    def get(self, name):
+        self.gets[name] = self.gets.get(name, 0) + 1
+        return super().get(name)
+
+
+@pytest.fixture
+def blog(monkeypatch):
+    # The parsed manifest, post and search index caches are class-level; start each test empty.
+    monkeypatch.setattr(BlogStorage, '_manifest_cache', None)
+    monkeypatch.setattr(BlogStorage, '_search_index_cache', None)
+    monkeypatch.setattr(BlogStorage, '_post_cache', {})
+    storage = BlogStorage(backend=CountingBackend('blog-search-test'))
+    storage.add_blog_post('Privacy online', 'Privacy matters. Data is personal.', 'a@x.org', 'Ada')
+    storage.add_blog_post('AI in schools', 'Schools must teach the ethics of AI.\n\nPrivacy matters for students too.',
+                          'b@x.org', 'Ben', tags=['Ethics'])
+    storage.add_blog_post('Robots', 'Robots do chores.', 'c@x.org', 'Cy')
+    return storage
+
+
+def test_index_holds_term_statistics_not_body_text(blog):
+    raw = blog.backend.get(blog.search_index_blob_name)[0].decode('utf-8')
+    index = json.loads(raw)
+
+    assert index['version'] == blog_search.SEARCH_INDEX_VERSION
+    assert all('passages' not in entry for entry in index['docs'].values())
+    assert 'Data is personal' not in raw
+
+
+def test_parsed_index_is_reused_until_it_changes(blog):
+    name = blog.search_index_blob_name
+    blog.search_blog_posts('privacy')
+    reads = blog.backend.gets.get(name, 0)
+
+    blog.search_blog_posts('robots')
+    assert blog.backend.gets.get(name, 0) == reads
+
+    blog.add_blog_post('More privacy', 'Privacy again.', 'd@x.org', 'Di')
+    results = blog.search_blog_posts('privacy')['posts']
+    assert blog.backend.gets.get(name, 0) > reads
+    assert 'More privacy' in [post['title'] for post in results]
+
+
+def test_snippets_come_from_post_bodies(blog):
+    results = blog.search_blog_posts('privacy', weights=blog_search.DEFAULT_FIELD_WEIGHTS)['posts']
+    snippets = {post['title']: str(post['snippet']) for post in results}
+
+    assert snippets['AI in schools'].endswith('<mark>Privacy</mark> matters for students too.')
+    assert snippets['Privacy online'] == '<mark>Privacy</mark> matters. Data is personal.'
+
+
+def test_exact_phrase_checks_the_body(blog):
+    titles = [post['title'] for post in blog.search_blog_posts('ethics of ai', exact=True)['posts']]
+    assert titles == ['AI in schools']
+    assert blog.search_blog_posts('of ethics', exact=True)['total'] == 0
+    # Exact phrases are not prefix-expanded.
+    assert blog.search_blog_posts('teach the eth', exact=True)['total'] == 0
+
+
+def test_rebuild_does_not_overwrite_a_concurrent_update(blog):
+    name = blog.search_index_blob_name
+    stale_generation = blog.backend.stat(name).generation
+    blog.add_blog_post('Fresh', 'Brand new words.', 'e@x.org', 'Ed')
+
+    assert blog.rebuild_search_index(if_generation_match=stale_generation) is None
+    assert [post['title'] for post in blog.search_blog_posts('brand')['posts']] == ['Fresh']
+
+
+def test_outdated_index_is_rebuilt_on_read(blog):
+    name = blog.search_index_blob_name
+    old = json.loads(blog.backend.get(name)[0])
+    old.pop('version')
+    blog.backend.put(name, json.dumps(old).encode('utf-8'))
+
+    assert blog.search_blog_posts('robots')['posts'][0]['title'] == 'Robots'
+    assert json.loads(blog.backend.get(name)[0])['version'] == blog_search.SEARCH_INDEX_VERSION
+
+
+def test_last_word_matches_as_a_prefix(blog):
+    results = blog.search_blog_posts('priv', weights=blog_search.DEFAULT_FIELD_WEIGHTS)
+
+    assert results['total'] == 2
+    assert {post['title'] for post in results['posts']} == {'Privacy online', 'AI in schools'}
+    assert '<mark>Privacy</mark>' in str(results['posts'][0]['snippet'])
+    # Only the last word is a prefix; earlier words must match whole.
+    assert [post['title'] for post in blog.search_blog_posts('priv robots')['posts']] == ['Robots']
+    assert {post['title'] for post in blog.search_blog_posts('robots onl')['posts']} == {'Robots', 'Privacy online'}
+
+
+def test_total_counts_every_match_and_pages_follow_the_ranking(blog):
+    for i in range(25):
+        blog.add_blog_post(f'Ethics note {i}', 'Short note on ethics.', 'n@x.org', 'Nia')
+    ranked = blog.search_blog_posts('ethics', per_page=100)['posts']
+
+    first = blog.search_blog_posts('ethics', page=1, per_page=10)
+    third = blog.search_blog_posts('ethics', page=3, per_page=10)
+    assert first['total'] == third['total'] == 26 == len(ranked)
+    assert first['pages'] == 3
+    assert [post['id'] for post in first['posts'] + blog.search_blog_posts('ethics', page=2, per_page=10)['posts']
+            + third['posts']] == [post['id'] for post in ranked]
+    # Past the end clamps to the last page, like the unfiltered listing.
+    assert blog.search_blog_posts('ethics', page=9, per_page=10)['page'] == 3
@@ -0,0 +1,167 @@
+import json
+
+import pytest
+
+from cloud_storage import GALLERY_INDEX_PATH, CloudStorageManager
+from storage_backend import MemoryBackend
+
+
+@pytest.fixture
+def storage():
+    manager = CloudStorageManager(backend=MemoryBackend('gallery-index-test'))
+    for i in range(30):
+        manager.create_gallery_item(
+            title=f"Project {i} {'privacy' if i % 3 == 0 else 'robots'}", description='A student project',
+            image_filename=None, image_url=None, created_by='admin',
+            creators=[{'name': f'Student {i}', 'school': 'Oak High' if i % 2 else 'Elm School'}],
+            tags=['AI' if i % 5 == 0 else 'Ethics'],
+        )
+    return manager
+
+
+def test_query_covers_items_beyond_the_first_page(storage):
+    page = storage.get_gallery_page(limit=4, query='privacy')
+
+    assert page['total'] == 10
+    assert len(page['items']) == 4 and page['next_cursor']
+    rest = storage.get_gallery_page(cursor=page['next_cursor'], limit=24, query='privacy')
+    titles = [item['title'] for item in page['items'] + rest['items']]
+    assert len(titles) == 10 and all('privacy' in title for title in titles)
+
+
+def test_query_words_combine_with_index_filters(storage):
+    assert storage.count_gallery_items(query='PRIV oak') == 5
+    assert storage.count_gallery_items(query='student', tag='ai', school='elm school') == 3
+    assert storage.count_gallery_items(query='nothing matches') == 0
+
+
+def test_counts_come_from_the_index(storage):
+    assert storage.get_gallery_index_counts('by_tag') == {'ai': 6, 'ethics': 24}
+    assert storage.get_gallery_course_counts() == {'individual': 30}
+
+
+class FlakyBackend(MemoryBackend):
+    """MemoryBackend whose reads fail for names under fail_prefix (only once if fail_once)."""
+
+    fail_prefix = None
+    fail_once = False
+
+    def get(self, name):
+        if self.fail_prefix and name.startswith(self.fail_prefix):
+            if self.fail_once:
+                self.fail_prefix = None
+            raise ConnectionError(f"transient failure reading {name}")
+        return super().get(name)
+
+
+@pytest.fixture
+def flaky():
+    manager = CloudStorageManager(backend=FlakyBackend('gallery-index-flaky'))
+    for i in range(3):
+        manager.create_gallery_item(title=f'Item {i}', description='', image_filename=None, image_url=None,
+                                    created_by='admin', tags=['AI'])
+    return manager
+
+
+def index_generation(manager):
+    return manager.backend.stat(GALLERY_INDEX_PATH).generation
+
+
+def test_read_error_serves_the_cached_index_without_rebuilding(flaky):
+    generation = index_generation(flaky)
+    flaky.backend.fail_prefix = GALLERY_INDEX_PATH
+    flaky._gallery_index_loaded_at = 0.0  # cache expired
+
+    assert flaky.get_gallery_page()['total'] == 3
+    assert index_generation(flaky) == generation
+
+
+def test_read_error_without_a_cache_propagates_without_rebuilding(flaky):
+    generation = index_generation(flaky)
+    flaky.backend.fail_prefix = GALLERY_INDEX_PATH
+    flaky._gallery_index_cache = None
+
+    with pytest.raises(ConnectionError):
+        flaky.get_gallery_page()
+    assert index_generation(flaky) == generation
+
+
+def test_rebuild_aborts_when_an_item_cannot_be_read(flaky):
+    flaky.backend.delete(GALLERY_INDEX_PATH)
+    flaky._gallery_index_cache = None
+    flaky.backend.fail_prefix = 'gallery/'
+
+    with pytest.raises(ConnectionError):
+        flaky.get_gallery_page()
+    assert flaky.backend.stat(GALLERY_INDEX_PATH) is None
+
+
+def test_rebuild_does_not_overwrite_a_concurrent_update(flaky):
+    stale_generation = index_generation(flaky)
+    flaky.create_gallery_item(title='Added meanwhile', description='', image_filename=None, image_url=None,
+                              created_by='admin')
+    # The index now holds four items at a newer generation; this fifth blob bypasses it.
+    flaky.backend.put('gallery/unindexed.json', json.dumps({'id': 'unindexed', 'title': 'Written behind its back'}))
+
+    index = flaky.rebuild_gallery_index(if_generation_match=stale_generation)
+
+    assert 'unindexed' not in index['items'] and len(index['items']) == 4
+    stored = json.loads(flaky.backend.get(GALLERY_INDEX_PATH)[0])
+    assert len(stored['items']) == 4
+
+
+def test_missing_index_is_created_once(flaky):
+    flaky.backend.delete(GALLERY_INDEX_PATH)
+    flaky._gallery_index_cache = None
+
+    assert flaky.get_gallery_page()['total'] == 3
+    generation = index_generation(flaky)
+    flaky._gallery_index_loaded_at = 0.0
+    assert flaky.get_gallery_page()['total'] == 3
+    assert index_generation(flaky) == generation
+
+
+def test_failed_item_read_is_not_remembered_as_missing(flaky):
+    item_id = flaky.get_gallery_page()['items'][0]['id']
+    flaky.backend.fail_prefix = f'gallery/{item_id}.json'
+    flaky.backend.fail_once = True
+
+    with pytest.raises(ConnectionError):
+        flaky.get_gallery_item_by_id(item_id)
+    assert flaky.get_gallery_item_by_id(item_id)['id'] == item_id
+    # A genuine miss is still remembered.
+    assert flaky.get_gallery_item_by_id('no-such-item') is None
+    assert flaky._is_known_missing('no-such-item')
+
+
+class RacingBackend(MemoryBackend):
+    """MemoryBackend that runs before_put(name) once, just ahead of the first write to that name."""
+
+    before_put = None
+
+    def put(self, name, data, content_type=None, if_generation_match=None):
+        hook, self.before_put = self.before_put, None
+        if hook:
+            hook(name)
+        return super().put(name, data, content_type=content_type, if_generation_match=if_generation_match)
+
+
+def test_bulk_move_keeps_a_concurrent_item_write():
+    manager = CloudStorageManager(backend=RacingBackend('gallery-move-test'))
+    item = manager.create_gallery_item(title='Raced', description='', image_filename=None, image_url=None,
+                                       created_by='admin', tags=['AI'])
+    path = f"gallery/{item['id']}.json"
+
+    def thumbnail_job(name):
+        stored = json.loads(manager.backend.get(name)[0])
+        stored['thumbnail_url'] = 'https://example.org/thumb.png'
+        manager.backend.put(name, json.dumps(stored).encode('utf-8'))
+
+    manager.backend.before_put = thumbnail_job
+
+    assert manager.move_multiple_gallery_items_to_course([item['id'], 'missing'], 'course-1') == {
+        item['id']: True, 'missing': False}
+    stored = json.loads(manager.backend.get(path)[0])
+    assert stored['course_id'] == 'course-1' and stored['tags'] == []
+    assert stored['thumbnail_url'] == 'https://example.org/thumb.png'
+    assert manager.get_gallery_course_counts() == {'course-1': 1}
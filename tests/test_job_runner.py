@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+
+import pytest
+
+import job_runner
+from job_runner import JOB_PREFIX, JobRunner, _key_path
+from storage_backend import MemoryBackend
+
+
+class RacingBackend(MemoryBackend):
+    """
+    MemoryBackend that runs before_put(name) once, ahead of the first write to that name,
+    and marks the job at finishes_on_read succeeded right after it is first read.
+    """
+
+    before_put = None
+    finishes_on_read = None
+
+    def put(self, name, data, content_type=None, if_generation_match=None):
+        hook, self.before_put = self.before_put, None
+        if hook:
+            hook(name)
+        return super().put(name, data, content_type=content_type, if_generation_match=if_generation_match)
+
+    def get(self, name):
+        found = super().get(name)
+        if found and name == self.finishes_on_read:
+            self.finishes_on_read = None
+            job = json.loads(found[0])
+            job['status'] = 'succeeded'
+            super().put(name, json.dumps(job).encode('utf-8'))
+        return found
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(job_runner, 'backoff_sleep', lambda attempt: None)
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def make_runner(backend, release):
+    runner = JobRunner(backend, workers=1)
+    runner.register('slow', lambda payload: release.wait(10) and payload)
+    return runner
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def stored_job(backend, job_id):
+    found = backend.get(f"{JOB_PREFIX}{job_id}.json")
+    return json.loads(found[0]) if found else None
+
+
+def test_same_key_returns_the_active_job(release):
+    runner = make_runner(MemoryBackend('job-runner-test'), release)
+
+    first = runner.submit('slow', {'n': 1}, dedup_key='export:1')
+    assert runner.submit('slow', {'n': 2}, dedup_key='export:1')['id'] == first['id']
+
+
+def test_lost_claim_to_a_finishing_holder_is_retried(release):
+    backend = RacingBackend('job-runner-test')
+    runner = make_runner(backend, release)
+
+    def other_instance_claims(name):
+        # Between our key check and our claim, another instance claims the key for a job
+        # that then finishes before we look it up.
+        holder = {'id': 'holder', 'kind': 'slow', 'status': 'running'}
+        backend.put(f"{JOB_PREFIX}holder.json", json.dumps(holder).encode('utf-8'))
+        backend.put(name, json.dumps({'dedup_key': 'export:1', 'job_id': 'holder'}).encode('utf-8'))
+        backend.finishes_on_read = f"{JOB_PREFIX}holder.json"
+
+    backend.before_put = other_instance_claims
+
+    job = runner.submit('slow', {'n': 1}, dedup_key='export:1')
+
+    assert job['id'] != 'holder'
+    assert json.loads(backend.get(_key_path('export:1'))[0])['job_id'] == job['id']
+    assert stored_job(backend, job['id'])['dedup_key'] == 'export:1'
+
+
+class FailingWritesBackend(MemoryBackend):
+    """MemoryBackend whose next failures[name] writes to name raise a transient error."""
+
+    def __init__(self, bucket_name):
+        super().__init__(bucket_name)
+        self.failures = {}
+
+    def put(self, name, data, content_type=None, if_generation_match=None):
+        if self.failures.get(name, 0) > 0:
+            self.failures[name] -= 1
+            raise ConnectionError(f"transient failure writing {name}")
+        return super().put(name, data, content_type=content_type, if_generation_match=if_generation_match)
+
+
+def run_until_handler_waits(runner, backend):
+    job = runner.submit('slow', {'n': 1}, dedup_key='export:1')
+    assert wait_for(lambda: (stored_job(backend, job['id']) or {}).get('status') == 'running')
+    return job['id']
+
+
+def test_transient_error_on_the_final_write_is_retried(release):
+    backend = FailingWritesBackend('job-runner-test')
+    runner = make_runner(backend, release)
+    job_id = run_until_handler_waits(runner, backend)
+
+    backend.failures[f"{JOB_PREFIX}{job_id}.json"] = job_runner.JOB_PERSIST_ATTEMPTS - 1
+    release.set()
+
+    assert wait_for(lambda: stored_job(backend, job_id)['status'] == 'succeeded')
+    assert wait_for(lambda: backend.get(_key_path('export:1')) is None)
+
+
+def test_unrecorded_end_is_retried_by_rescan_and_never_rerun(monkeypatch, release):
+    monkeypatch.setattr(job_runner, 'JOB_LEASE_SECONDS', 0)
+    backend = FailingWritesBackend('job-runner-test')
+    runs = []
+    runner = JobRunner(backend, workers=1)
+    runner.register('slow', lambda payload: runs.append(payload) or release.wait(10) and payload)
+    job_id = run_until_handler_waits(runner, backend)
+
+    backend.failures[f"{JOB_PREFIX}{job_id}.json"] = 100
+    release.set()
+    assert wait_for(lambda: runner.get(job_id)['status'] == 'succeeded')
+    assert stored_job(backend, job_id)['status'] == 'running'
+
+    # The stored lease has expired, but this instance knows the job is done.
+    runner._rescan()
+    assert len(runs) == 1 and runner.depth('queued') == runner.depth('running') == 0
+
+    backend.failures.clear()
+    runner._rescan()
+    assert stored_job(backend, job_id)['status'] == 'succeeded'
+    assert backend.get(_key_path('export:1')) is None
+    assert len(runs) == 1
@@ -0,0 +1,205 @@
+import json
+import socketserver
+import threading
+import time
+
+import pytest
+
+import mail_queue
+from mail_queue import MAIL_FAILED_PREFIX, MAIL_PENDING_PREFIX, MailQueue
+from storage_backend import MemoryBackend
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """
+    Minimal SMTP server on localhost: no TLS or AUTH, replies to each message's DATA
+    from data_replies (250 once it runs out), and records what it received.
+    gate holds every new connection's greeting until it is set.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.gate = threading.Event()
+        self.gate.set()
+        self.data_replies = []
+        self.connections = 0
+        self.data_attempts = []  # (time, reply) per message body received
+        self.messages = []
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        server = self.server
+        server.gate.wait()
+        with server.lock:
+            server.connections += 1
+        self.reply('220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 stub')
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    body.append(data_line)
+                with server.lock:
+                    reply = server.data_replies.pop(0) if server.data_replies else '250 OK queued'
+                    server.data_attempts.append((time.time(), reply))
+                    if reply.startswith('250'):
+                        server.messages.append(b''.join(body).decode('utf-8', 'replace'))
+                self.reply(reply)
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+@pytest.fixture
+def smtp():
+    server = SMTPStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.gate.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def backend():
+    return MemoryBackend('mail-queue-test')
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(mail_queue, 'MAIL_RETRY_BASE_SECONDS', 0.2)
+    monkeypatch.setattr(mail_queue, 'MAIL_MAX_ATTEMPTS', 3)
+
+
+def make_queue(backend, smtp):
+    return MailQueue(backend, 'club@example.org', password=None, host='127.0.0.1', port=smtp.port, starttls=False)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def stored(backend, prefix, message_id):
+    found = backend.get(f"{prefix}{message_id}.json")
+    return json.loads(found[0]) if found else None
+
+
+def counter_value(counter):
+    return sum(counter._values.values())
+
+
+def test_enqueue_persists_and_returns_without_waiting_for_smtp(backend, smtp):
+    smtp.gate.clear()
+    queue = make_queue(backend, smtp)
+
+    started = time.time()
+    message_id = queue.enqueue('member@example.org', 'Hello', 'Body text')
+
+    assert time.time() - started < 0.5
+    assert stored(backend, MAIL_PENDING_PREFIX, message_id)['subject'] == 'Hello'
+    assert smtp.messages == [] and smtp.connections == 0
+
+    smtp.gate.set()
+    assert wait_for(lambda: len(smtp.messages) == 1)
+    assert 'Subject: Hello' in smtp.messages[0]
+    assert wait_for(lambda: stored(backend, MAIL_PENDING_PREFIX, message_id) is None)
+
+
+def test_a_batch_shares_one_connection(backend, smtp):
+    connections_before = counter_value(mail_queue.MAIL_SMTP_CONNECTIONS)
+    smtp.gate.clear()
+    queue = make_queue(backend, smtp)
+    for i in range(5):
+        queue.enqueue('member@example.org', f'Message {i}', 'Body')
+
+    smtp.gate.set()
+    assert wait_for(lambda: len(smtp.messages) == 5)
+    assert smtp.connections == 1
+    assert counter_value(mail_queue.MAIL_SMTP_CONNECTIONS) - connections_before == 1
+    assert wait_for(lambda: queue.depth() == 0)
+
+
+def test_temporary_rejection_is_retried_with_backoff(backend, smtp, fast_retries):
+    smtp.data_replies = ['451 Try again later']
+    queue = make_queue(backend, smtp)
+    message_id = queue.enqueue('member@example.org', 'Retry me', 'Body')
+
+    assert wait_for(lambda: len(smtp.data_attempts) == 1)
+    assert wait_for(lambda: (stored(backend, MAIL_PENDING_PREFIX, message_id) or {}).get('attempts') == 1)
+    record = stored(backend, MAIL_PENDING_PREFIX, message_id)
+    assert '451' in record['last_error']
+
+    assert wait_for(lambda: len(smtp.messages) == 1)
+    (first, _), (second, reply) = smtp.data_attempts
+    assert reply.startswith('250')
+    # First retry waits MAIL_RETRY_BASE_SECONDS, jittered by 0.5-1.5x.
+    assert second - first >= 0.1
+    assert wait_for(lambda: stored(backend, MAIL_PENDING_PREFIX, message_id) is None)
+
+
+def test_message_moves_to_failed_after_max_attempts(backend, smtp, fast_retries):
+    smtp.data_replies = ['451 Mailbox busy'] * 10
+    queue = make_queue(backend, smtp)
+    message_id = queue.enqueue('member@example.org', 'Never delivered', 'Body')
+
+    assert wait_for(lambda: stored(backend, MAIL_FAILED_PREFIX, message_id) is not None)
+    failed = stored(backend, MAIL_FAILED_PREFIX, message_id)
+    assert failed['attempts'] == mail_queue.MAIL_MAX_ATTEMPTS == 3
+    assert '451' in failed['last_error']
+    assert stored(backend, MAIL_PENDING_PREFIX, message_id) is None
+    assert len(smtp.data_attempts) == 3 and smtp.messages == []
+    assert queue.depth() == 0
+
+
+def test_expired_lease_from_another_instance_is_adopted(backend, smtp):
+    now = time.time()
+
+    def left_behind(message_id, leased_until):
+        record = {'id': message_id, 'to': 'member@example.org', 'subject': message_id, 'body': 'Body',
+                  'enqueued_at': now - 600, 'attempts': 0, 'next_attempt_at': now - 600,
+                  'leased_until': leased_until, 'last_error': None}
+        backend.put(f"{MAIL_PENDING_PREFIX}{message_id}.json", json.dumps(record).encode('utf-8'))
+
+    left_behind('expired', now - 1)
+    left_behind('still-leased', now + 600)
+
+    queue = make_queue(backend, smtp)
+    queue.start()
+
+    assert wait_for(lambda: len(smtp.messages) == 1)
+    assert 'Subject: expired' in smtp.messages[0]
+    assert wait_for(lambda: stored(backend, MAIL_PENDING_PREFIX, 'expired') is None)
+    # The other instance still owns its message; it is neither sent nor touched.
+    time.sleep(0.2)
+    assert len(smtp.messages) == 1
+    assert stored(backend, MAIL_PENDING_PREFIX, 'still-leased')['leased_until'] == now + 600
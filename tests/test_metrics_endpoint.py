@@ -0,0 +1,46 @@
+import pytest
+
+from app import app
+from cloud_user import CloudUser
+
+
+@pytest.fixture
+def client(monkeypatch):
+    users = {
+        'admin': CloudUser({'id': 'admin', 'email': 'admin@x.org', 'is_admin': True, 'created_at': ''}),
+        'member': CloudUser({'id': 'member', 'email': 'member@x.org', 'is_admin': False, 'created_at': ''}),
+    }
+    monkeypatch.setattr(CloudUser, 'get', staticmethod(users.get))
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    return app.test_client()
+
+
+def log_in(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = user_id
+        session['_fresh'] = True
+
+
+def test_without_a_token_only_admins_may_scrape(client):
+    assert client.get('/metrics').status_code == 403
+    log_in(client, 'member')
+    assert client.get('/metrics').status_code == 403
+    log_in(client, 'admin')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+
+@pytest.mark.parametrize('authorization', [None, 'Bearer wrong', 'Bearer s3cret-but-longer', 's3cret',
+                                           'Bearer s3crét'])
+def test_token_must_match_exactly(client, monkeypatch, authorization):
+    monkeypatch.setenv('METRICS_TOKEN', 's3cret')
+    headers = {'Authorization': authorization} if authorization else {}
+
+    assert client.get('/metrics', headers=headers).status_code == 401
+
+
+def test_matching_token_is_accepted(client, monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 's3cret')
+
+    assert client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
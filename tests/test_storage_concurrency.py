@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+from google.api_core.exceptions import PreconditionFailed
+
+import storage_concurrency
+from blog_storage import BlogStorage
+from cis_news_storage import CisNewsStorage
+from storage_backend import LatencyBackend, LocalFileBackend, MemoryBackend
+
+WRITERS = 8
+
+
+@pytest.fixture(params=['memory', 'local'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        inner = MemoryBackend('concurrency-test')
+    else:
+        inner = LocalFileBackend(str(tmp_path / 'bucket'))
+    # A short, jittered round trip makes the writers' read-modify-write cycles overlap.
+    return LatencyBackend(inner, 0.001, 0.002)
+
+
+@pytest.fixture(autouse=True)
+def empty_blog_caches(monkeypatch):
+    # The parsed manifest, post and search index caches are class-level; start each test empty.
+    monkeypatch.setattr(BlogStorage, '_manifest_cache', None)
+    monkeypatch.setattr(BlogStorage, '_search_index_cache', None)
+    monkeypatch.setattr(BlogStorage, '_post_cache', {})
+
+
+def run_concurrently(target, count=WRITERS):
+    """Start count threads on target(i) together; return their results in order."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+    errors = []
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    return results
+
+
+def test_concurrent_blog_writes_are_all_kept_with_unique_slugs(backend):
+    blog = BlogStorage(backend=backend)
+    existing = [blog.add_blog_post(f'Existing {i}', 'Before.', 'a@x.org', 'Ada') for i in range(WRITERS)]
+
+    def write(i):
+        added = blog.add_blog_post('Same title', f'Body {i}', f'w{i}@x.org', f'Writer {i}')
+        # Every rename competes for the same slug as well.
+        updated = blog.update_blog_post(existing[i]['id'], 'Renamed post', f'Edited {i}', 'Ada')
+        return added, updated
+
+    results = run_concurrently(write)
+
+    assert all(added and updated for added, updated in results)
+    summaries = blog.get_blog_post_summaries()
+    assert len(summaries) == 2 * WRITERS
+    slugs = [summary['slug'] for summary in summaries]
+    assert len(set(slugs)) == len(slugs)
+
+    for i, (added, updated) in enumerate(results):
+        stored = blog.get_blog_post_by_id(added['id'])
+        assert stored['content'] == f'Body {i}' and stored['slug'] == added['slug']
+        stored = blog.get_blog_post_by_id(existing[i]['id'])
+        assert stored['content'] == f'Edited {i}' and stored['slug'] == updated['slug']
+        assert blog.get_blog_post_by_slug(updated['slug'])['id'] == existing[i]['id']
+
+    # The search index saw every add and update as well.
+    assert blog.search_blog_posts('same title', per_page=100)['total'] == WRITERS
+    assert blog.search_blog_posts('edited', per_page=100, weights={'body': 1.0})['total'] == WRITERS
+
+
+def test_concurrent_news_writes_are_all_kept(backend):
+    news = CisNewsStorage(backend=backend)
+    doomed = [news.add_item(f'Old {i}', 'Old body', None, 'a@x.org') for i in range(WRITERS)]
+
+    def write(i):
+        added = news.add_item(f'News {i}', f'Body {i}', None, f'w{i}@x.org')
+        return added, news.delete_item(doomed[i]['id'])
+
+    results = run_concurrently(write)
+
+    assert all(added and deleted for added, deleted in results)
+    items = news.get_all_items()
+    assert sorted(item['title'] for item in items) == sorted(f'News {i}' for i in range(WRITERS))
+    assert len({item['id'] for item in items}) == WRITERS
+
+
+class ManifestWriteFailsBackend(MemoryBackend):
+    """MemoryBackend whose writes to the blog manifest raise error."""
+
+    error = None
+
+    def put(self, name, data, content_type=None, if_generation_match=None):
+        if self.error and name == 'blog/manifest.json':
+            raise self.error
+        return super().put(name, data, content_type=content_type, if_generation_match=if_generation_match)
+
+
+@pytest.mark.parametrize('error', [PreconditionFailed('conflict'), ConnectionError('transient')])
+def test_failed_manifest_write_leaves_no_post_blob(monkeypatch, error):
+    monkeypatch.setattr(storage_concurrency, 'backoff_sleep', lambda attempt: None)
+    backend = ManifestWriteFailsBackend('manifest-failure-test')
+    blog = BlogStorage(backend=backend)
+    kept = blog.add_blog_post('Kept', 'Before.', 'a@x.org', 'Ada')
+    backend.error = error
+
+    assert blog.add_blog_post('Lost', 'Never listed.', 'b@x.org', 'Ben') is None
+    assert [info.name for info in backend.list(blog.post_prefix)] == [blog._post_blob_name(kept['id'])]
+    assert list(BlogStorage._post_cache) == [kept['id']]
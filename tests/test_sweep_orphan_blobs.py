@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from cloud_storage import CloudStorageManager
+from storage_backend import MemoryBackend
+from sweep_orphan_blobs import SweepAborted, sweep_orphan_blobs
+
+
+class FlakyBackend(MemoryBackend):
+    """MemoryBackend whose reads fail for names under fail_prefix."""
+
+    fail_prefix = None
+
+    def get(self, name):
+        if self.fail_prefix and name.startswith(self.fail_prefix):
+            raise ConnectionError(f"transient failure reading {name}")
+        return super().get(name)
+
+
+@pytest.fixture
+def storage():
+    backend = FlakyBackend('sweep-test')
+    manager = CloudStorageManager(backend=backend)
+    url = backend.public_url
+
+    backend.put('uploads/live.jpg', b'img')
+    backend.put('uploads/inactive.jpg', b'img')
+    backend.put('blog_images/post.jpg', b'img')
+    backend.put('cis_news_images/news.jpg', b'img')
+    backend.put('uploads/orphan.jpg', b'img')
+
+    backend.put('gallery/live.json', json.dumps({'id': 'live', 'image_url': url('uploads/live.jpg')}))
+    backend.put('gallery/old.json', json.dumps({'id': 'old', 'is_active': False,
+                                                'image_url': url('uploads/inactive.jpg')}))
+    backend.put('blog/posts/p1.json', json.dumps({'id': 'p1', 'content': f"[IMAGE:{url('blog_images/post.jpg')}]"}))
+    backend.put('cis_news.json', json.dumps([{'id': 'n1', 'image_url': url('cis_news_images/news.jpg')}]))
+    return manager
+
+
+def blob_names(manager):
+    return {info.name for info in manager.backend.list('')}
+
+
+def test_deletes_only_unreferenced_blobs(storage):
+    result = sweep_orphan_blobs(dry_run=False, grace_days=0, cloud_storage=storage)
+
+    assert result['deleted'] == 1
+    remaining = blob_names(storage)
+    assert 'uploads/orphan.jpg' not in remaining
+    # Media of an inactive item is still referenced.
+    assert {'uploads/live.jpg', 'uploads/inactive.jpg', 'blog_images/post.jpg',
+            'cis_news_images/news.jpg'} <= remaining
+
+
+@pytest.mark.parametrize('fail_prefix', ['gallery/', 'blog/posts/', 'cis_news.json'])
+def test_read_failure_aborts_without_deleting(storage, fail_prefix):
+    before = blob_names(storage)
+    storage.backend.fail_prefix = fail_prefix
+
+    with pytest.raises(SweepAborted):
+        sweep_orphan_blobs(dry_run=False, grace_days=0, cloud_storage=storage)
+
+    assert blob_names(storage) == before
+
+
+def test_refuses_when_most_blobs_look_orphaned(storage):
+    for i in range(10):
+        storage.backend.put(f'uploads/unknown-{i}.jpg', b'img')
+    before = blob_names(storage)
+
+    result = sweep_orphan_blobs(dry_run=False, grace_days=0, cloud_storage=storage)
+
+    assert result['refused'] and result['deleted'] == 0
+    assert blob_names(storage) == before
+
+    forced = sweep_orphan_blobs(dry_run=False, grace_days=0, cloud_storage=storage, max_orphan_ratio=1.0)
+    assert forced['deleted'] == 11
+
+
+def test_refuses_when_nothing_is_referenced():
+    backend = MemoryBackend('sweep-empty')
+    manager = CloudStorageManager(backend=backend)
+    backend.put('uploads/a.jpg', b'img')
+
+    result = sweep_orphan_blobs(dry_run=False, grace_days=0, cloud_storage=manager, max_orphan_ratio=1.0)
+
+    assert result['refused'] and result['deleted'] == 0
+    assert blob_names(manager) == {'uploads/a.jpg'}
@@ -7,23 +7,35 @@ Used when admins add gallery videos so the UI can show a preview tile.
 
 import os
 import io
-import requests
+import time
 from PIL import Image
 import logging
 import tempfile
 
+import http_client
+from metrics import Counter, Histogram
+
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# path: youtube, vimeo, opencv, moviepy, generic (fallback placeholder) or failed
+THUMBNAIL_OUTCOMES = Counter('video_thumbnail_extractions_total',
+                             'Video thumbnails produced, by the path that produced them.', ('path',))
+THUMBNAIL_SECONDS = Histogram('video_thumbnail_seconds', 'Time to produce one video thumbnail.')
+
 class VideoThumbnailExtractor:
     """Returns a PNG (BytesIO) suitable for upload as video thumbnail."""
 
-    def __init__(self):
-        self.timeout = 30
-        
     def extract_thumbnail_from_url(self, video_url: str) -> io.BytesIO:
         """Dispatch by URL host/type; never raises — falls back to generic placeholder on error."""
+        started = time.perf_counter()
+        try:
+            return self._extract_thumbnail(video_url)
+        finally:
+            THUMBNAIL_SECONDS.observe(time.perf_counter() - started)
+    
+    def _extract_thumbnail(self, video_url: str) -> io.BytesIO:
         try:
             if 'youtube.com' in video_url or 'youtu.be' in video_url:
                 return self._extract_youtube_thumbnail(video_url)
@@ -76,17 +88,13 @@ class VideoThumbnailExtractor:
         temp_video_path = None
         try:
             # Download video to temporary file
-            response = requests.get(video_url, timeout=self.timeout, stream=True)
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
+                temp_video_path = temp_file.name
+                response = http_client.download_to_file(video_url, temp_file, use='video')
             if response.status_code != 200:
                 logger.warning(f"Failed to download video from {video_url}: HTTP {response.status_code}")
                 return self._create_generic_video_thumbnail(video_url)
             
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
-                temp_video_path = temp_file.name
-                for chunk in response.iter_content(chunk_size=8192):
-                    temp_file.write(chunk)
-            
             # Open video with OpenCV
             cap = cv2.VideoCapture(temp_video_path)
             if not cap.isOpened():
@@ -148,6 +156,7 @@ class VideoThumbnailExtractor:
             thumbnail_data.seek(0)
             
             logger.info(f"Successfully extracted frame at {time_seconds}s from video file: {video_url}")
+            THUMBNAIL_OUTCOMES.inc(path='opencv')
             return thumbnail_data
             
         except Exception as e:
@@ -168,17 +177,13 @@ class VideoThumbnailExtractor:
         temp_video_path = None
         try:
             # Download video to temporary file
-            response = requests.get(video_url, timeout=self.timeout, stream=True)
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
+                temp_video_path = temp_file.name
+                response = http_client.download_to_file(video_url, temp_file, use='video')
             if response.status_code != 200:
                 logger.warning(f"Failed to download video from {video_url}: HTTP {response.status_code}")
                 return self._create_generic_video_thumbnail(video_url)
             
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
-                temp_video_path = temp_file.name
-                for chunk in response.iter_content(chunk_size=8192):
-                    temp_file.write(chunk)
-            
             # Open video with MoviePy
             clip = VideoFileClip(temp_video_path)
             
@@ -203,6 +208,7 @@ class VideoThumbnailExtractor:
             thumbnail_data.seek(0)
             
             logger.info(f"Successfully extracted frame at {frame_time}s from video file using MoviePy: {video_url}")
+            THUMBNAIL_OUTCOMES.inc(path='moviepy')
             return thumbnail_data
             
         except Exception as e:
@@ -231,7 +237,7 @@ class VideoThumbnailExtractor:
             
             for thumbnail_url in thumbnail_urls:
                 try:
-                    response = requests.get(thumbnail_url, timeout=self.timeout)
+                    response = http_client.fetch(thumbnail_url, use='thumbnail')
                     if response.status_code == 200:
                         thumbnail_data = io.BytesIO(response.content)
                         thumbnail_data.seek(0)
@@ -240,6 +246,7 @@ class VideoThumbnailExtractor:
                             Image.open(thumbnail_data)
                             thumbnail_data.seek(0)
                             logger.info(f"Successfully extracted YouTube thumbnail from {video_url}")
+                            THUMBNAIL_OUTCOMES.inc(path='youtube')
                             return thumbnail_data
                         except Exception:
                             continue
@@ -263,14 +270,14 @@ class VideoThumbnailExtractor:
             api_url = f"https://vimeo.com/api/v2/video/{video_id}.json"
             
             try:
-                response = requests.get(api_url, timeout=self.timeout)
+                response = http_client.fetch(api_url, use='api')
                 if response.status_code == 200:
                     data = response.json()
                     if data and len(data) > 0:
                         thumbnail_url = data[0].get('thumbnail_large') or data[0].get('thumbnail_medium')
                         
                         if thumbnail_url:
-                            thumb_response = requests.get(thumbnail_url, timeout=self.timeout)
+                            thumb_response = http_client.fetch(thumbnail_url, use='thumbnail')
                             if thumb_response.status_code == 200:
                                 thumbnail_data = io.BytesIO(thumb_response.content)
                                 thumbnail_data.seek(0)
@@ -279,6 +286,7 @@ class VideoThumbnailExtractor:
                                     Image.open(thumbnail_data)
                                     thumbnail_data.seek(0)
                                     logger.info(f"Successfully extracted Vimeo thumbnail from {video_url}")
+                                    THUMBNAIL_OUTCOMES.inc(path='vimeo')
                                     return thumbnail_data
                                 except Exception:
                                     pass
@@ -336,7 +344,7 @@ class VideoThumbnailExtractor:
             
             draw.ellipse([center_x - radius, center_y - radius, 
                          center_x + radius, center_y + radius], 
-                        fill='rgba(255, 255, 255, 0.9)', outline='white', width=3)
+                        fill=(230, 230, 230), outline='white', width=3)
             
             triangle_size = 30
             triangle_points = [
@@ -365,8 +373,10 @@ class VideoThumbnailExtractor:
             thumbnail_data.seek(0)
             
             logger.info(f"Created generic video thumbnail for {video_url}")
+            THUMBNAIL_OUTCOMES.inc(path='generic')
             return thumbnail_data
             
         except Exception as e:
             logger.error(f"Error creating generic thumbnail: {e}")
+            THUMBNAIL_OUTCOMES.inc(path='failed')
             return None
\ No newline at end of file